@@ -10,22 +10,42 @@ import {
   View,
 } from "react-native";
 import {
+  getCaptureHint,
   identifyImage,
   sendFrameForDetection,
   startRealtimeDetection,
   stopRealtimeDetection,
 } from "../services/api";
 
+// Maior resolução de foto da câmera ("LxA") cujo maior lado não passa de
+// maxSize; se todas passarem, a menor delas. Presets sem dimensões (iOS) são ignorados
+const choosePictureSize = (sizes: string[], maxSize: number) => {
+  const candidates = sizes
+    .map((size) => {
+      const [width, height] = size.split("x").map(Number);
+      return { size, longest: Math.max(width, height) };
+    })
+    .filter((candidate) => candidate.longest > 0)
+    .sort((a, b) => a.longest - b.longest);
+  if (candidates.length === 0) {
+    return undefined;
+  }
+  const fitting = candidates.filter((candidate) => candidate.longest <= maxSize);
+  return (fitting.length > 0 ? fitting[fitting.length - 1] : candidates[0]).size;
+};
+
 export default function CameraScreen() {
   const cameraRef = useRef<CameraView>(null);
   const [isLoading, setIsLoading] = useState(false);
   const [result, setResult] = useState("");
   const [isRealtimeMode, setIsRealtimeMode] = useState(false);
   const [lastSpokenResult, setLastSpokenResult] = useState("");
-  const intervalRef = useRef<number | null>(null);
+  const intervalRef = useRef<ReturnType<typeof setTimeout> | null>(null);
   const isStreamingRef = useRef<boolean>(false); // Ref para controle imediato do streaming
   const lastDetectedObjectsRef = useRef<string[]>([]); // Para comparação mais inteligente
   const lastAnnouncementTimeRef = useRef<number>(0); // Para controlar frequência de anúncios
+  const pictureSizesRef = useRef<string[] | null>(null); // Resoluções de foto da câmera
+  const [pictureSize, setPictureSize] = useState<string | undefined>(); // Resolução no modo tempo real
 
   const [permission, requestPermission] = useCameraPermissions();
 
@@ -258,6 +278,26 @@ export default function CameraScreen() {
     [isRealtimeMode, hasSignificantChange, labelTranslations]
   );
 
+  // No modo tempo real, a resolução da foto segue o max_size recomendado
+  // pelo servidor (capture_hint); vale a partir da próxima captura
+  const applyHintPictureSize = async () => {
+    if (!cameraRef.current) {
+      return;
+    }
+    if (pictureSizesRef.current === null) {
+      try {
+        pictureSizesRef.current =
+          await cameraRef.current.getAvailablePictureSizesAsync();
+      } catch (error) {
+        console.warn("⚠️ Não foi possível listar as resoluções da câmera:", error);
+        pictureSizesRef.current = [];
+      }
+    }
+    setPictureSize(
+      choosePictureSize(pictureSizesRef.current, getCaptureHint().max_size)
+    );
+  };
+
   // Função para capturar frame durante streaming (sem useCallback para evitar closure stale)
   const captureFrameForStreaming = async () => {
     console.log("=== DEBUG CAPTURA ===");
@@ -279,9 +319,10 @@ export default function CameraScreen() {
 
     try {
       console.log("📸 Capturando frame para streaming...");
+      await applyHintPictureSize();
 
       const photo = await cameraRef.current.takePictureAsync({
-        quality: 0.5, // Qualidade menor para melhor performance
+        quality: getCaptureHint().jpeg_quality, // Qualidade recomendada pelo servidor
         base64: true,
         skipProcessing: true, // Pula processamento desnecessário
       });
@@ -300,6 +341,21 @@ export default function CameraScreen() {
     }
   };
 
+  // Agenda a próxima captura no intervalo recomendado pelo servidor, que
+  // aumenta quando ele está sobrecarregado e diminui quando está livre
+  const scheduleNextCapture = (delay: number) => {
+    intervalRef.current = setTimeout(async () => {
+      if (!isStreamingRef.current) {
+        return;
+      }
+      console.log("⏰ Executando captura agendada...");
+      await captureFrameForStreaming();
+      if (isStreamingRef.current) {
+        scheduleNextCapture(getCaptureHint().interval_ms);
+      }
+    }, delay);
+  };
+
   // Função para alternar modo tempo real
   const toggleRealtimeMode = useCallback(async () => {
     console.log("=== TOGGLE REALTIME MODE ===");
@@ -312,11 +368,12 @@ export default function CameraScreen() {
       isStreamingRef.current = false; // Parar imediatamente via ref
       stopRealtimeDetection();
       if (intervalRef.current) {
-        console.log("⏹️ Parando interval:", intervalRef.current);
-        clearInterval(intervalRef.current);
+        console.log("⏹️ Parando captura agendada:", intervalRef.current);
+        clearTimeout(intervalRef.current);
         intervalRef.current = null;
       }
       setIsRealtimeMode(false);
+      setPictureSize(undefined); // Modo foto volta à resolução padrão
       setResult("");
       setLastSpokenResult("");
       lastDetectedObjectsRef.current = []; // Limpar histórico de objetos
@@ -344,20 +401,10 @@ export default function CameraScreen() {
         Speech.speak("Conectado! Direcionando a câmera para objetos");
         console.log("✅ Streaming de detecção iniciado");
 
-        // Capturar frames a cada 2 segundos
-        console.log("⏱️ Configurando interval para captura...");
-        intervalRef.current = setInterval(() => {
-          console.log("⏰ Executando captura via interval...");
-          captureFrameForStreaming();
-        }, 2000);
-        console.log("✅ Interval configurado:", intervalRef.current);
-
-        // Capturar o primeiro frame imediatamente
+        // Capturar o primeiro frame logo; os seguintes seguem o intervalo
+        // recomendado pelo servidor (capture_hint)
         console.log("🎬 Agendando primeira captura...");
-        setTimeout(() => {
-          console.log("🎬 Executando primeira captura...");
-          captureFrameForStreaming();
-        }, 500);
+        scheduleNextCapture(500);
       } catch (error) {
         console.error("❌ Erro ao iniciar streaming:", error);
         isStreamingRef.current = false; // Reverter ref em caso de erro
@@ -376,7 +423,7 @@ export default function CameraScreen() {
       lastDetectedObjectsRef.current = []; // Limpar histórico
       lastAnnouncementTimeRef.current = 0; // Resetar timestamp
       if (intervalRef.current) {
-        clearInterval(intervalRef.current);
+        clearTimeout(intervalRef.current);
       }
       stopRealtimeDetection();
     };
@@ -436,7 +483,12 @@ export default function CameraScreen() {
 
   return (
     <View style={styles.container}>
-      <CameraView style={styles.camera} facing="back" ref={cameraRef} />
+      <CameraView
+        style={styles.camera}
+        facing="back"
+        ref={cameraRef}
+        pictureSize={pictureSize}
+      />
 
       <View style={styles.controlsContainer}>
         {/* Toggle para modo tempo real */}
@@ -186,6 +186,33 @@ export const disconnectSocket = () => {
 let isStreaming = false;
 let streamingCallback: ((data: { detections: any[] }) => void) | null = null;
 
+// Recomendação de captura enviada pelo servidor conforme a carga
+// (evento "capture_hint" e campo capture_hint de detection_results)
+export type CaptureHint = {
+  interval_ms: number;
+  max_size: number;
+  jpeg_quality: number;
+  level: "idle" | "normal" | "busy" | "saturated";
+};
+
+// Valores usados até o servidor enviar a primeira recomendação
+const DEFAULT_CAPTURE_HINT: CaptureHint = {
+  interval_ms: 2000,
+  max_size: 640,
+  jpeg_quality: 0.5,
+  level: "normal",
+};
+
+let captureHint: CaptureHint = DEFAULT_CAPTURE_HINT;
+
+const updateCaptureHint = (hint?: CaptureHint) => {
+  if (hint && typeof hint.interval_ms === "number") {
+    captureHint = hint;
+  }
+};
+
+export const getCaptureHint = (): CaptureHint => captureHint;
+
 // Inicia streaming de detecção em tempo real
 export const startRealtimeDetection = async (
   onDetection: (data: { detections: any[] }) => void
@@ -261,17 +288,29 @@ const startStreamingListener = (
 
   // Remove listeners antigos se existirem
   socketInstance.off("detection_results");
+  socketInstance.off("capture_hint");
+  captureHint = DEFAULT_CAPTURE_HINT;
 
-  // Escuta os resultados de detecção em tempo real
-  socketInstance.on("detection_results", (data: { detections: any[] }) => {
-    console.log("🎯 Resultado de detecção recebido:", data);
+  // O servidor avisa quando a recomendação de captura muda
+  socketInstance.on("capture_hint", (hint: CaptureHint) => {
+    console.log("🎚️ Recomendação de captura:", hint);
+    updateCaptureHint(hint);
+  });
 
-    if (isStreaming && streamingCallback) {
-      streamingCallback(data);
-    } else {
-      console.warn("⚠️ Streaming inativo ou callback ausente");
+  // Escuta os resultados de detecção em tempo real
+  socketInstance.on(
+    "detection_results",
+    (data: { detections: any[]; capture_hint?: CaptureHint }) => {
+      console.log("🎯 Resultado de detecção recebido:", data);
+      updateCaptureHint(data.capture_hint);
+
+      if (isStreaming && streamingCallback) {
+        streamingCallback(data);
+      } else {
+        console.warn("⚠️ Streaming inativo ou callback ausente");
+      }
     }
-  });
+  );
 
   // Adiciona listener para erros
   socketInstance.on("detection_error", (error: any) => {
@@ -300,6 +339,7 @@ export const stopRealtimeDetection = (): void => {
 
   if (socket) {
     socket.off("detection_results");
+    socket.off("capture_hint");
     console.log("Streaming de detecção parado");
   }
 };
@@ -0,0 +1,45 @@
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+import main
+
+async def run_batch(path, output):
+    """
+    Processa uma pasta ou um zip de imagens no próprio processo, com o mesmo
+    pipeline do endpoint /batch/process (pool de inferência e YOLO em lote),
+    e escreve os resultados em NDJSON na ordem em que ficam prontos.
+    """
+    await main.start_inference()
+    if main.server_state != "ok":
+        sys.exit("Não foi possível carregar o modelo")
+
+    sources = main.iter_in_thread(main.iter_batch_path(path))
+    out = open(output, "w", encoding="utf-8") if output else sys.stdout
+    try:
+        async for result in main.run_image_batch(sources):
+            out.write(json.dumps(result, ensure_ascii=False) + "\n")
+            out.flush()
+            if "summary" in result:
+                summary = result["summary"]
+                print(
+                    f"{summary['images']} imagens em {summary['elapsed_seconds']}s "
+                    f"({summary['images_per_second']} imagens/s, {summary['errors']} erros)",
+                    file=sys.stderr
+                )
+    finally:
+        if output:
+            out.close()
+        main.executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processa um lote de imagens (YOLO + QR) e gera NDJSON")
+    parser.add_argument("path", help="Pasta com imagens ou arquivo .zip")
+    parser.add_argument("--output", help="Arquivo NDJSON de saída (padrão: saída padrão)")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        parser.error(f"{args.path} não encontrado")
+    asyncio.run(run_batch(args.path, args.output))
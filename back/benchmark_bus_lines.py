@@ -0,0 +1,131 @@
+import argparse
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+
+from bus_lines import BusLineStore
+
+def create_synthetic_network(path, num_lines, num_stops, stops_per_line, trips_per_line, num_companies):
+    """
+    Gera uma rede de ônibus sintética do tamanho de uma cidade grande
+    (milhares de linhas, dezenas de milhares de paradas) em JSON ou JSON Lines,
+    conforme a extensão de path.
+    """
+    rng = random.Random(42)
+    stops = [f"Parada {index:05d}" for index in range(num_stops)]
+    companies = [f"Empresa {index:03d}" for index in range(num_companies)]
+
+    lines = []
+    for index in range(num_lines):
+        first_trip = rng.randint(4 * 60, 7 * 60)
+        headway = rng.randint(5, 30)
+        lines.append({
+            "numero": str(1000 + index),
+            "nome": f"Linha {1000 + index}",
+            "empresa": rng.choice(companies),
+            "tarifa": 5.25,
+            "horarios": [
+                f"{(first_trip + trip * headway) // 60 % 24:02d}:{(first_trip + trip * headway) % 60:02d}"
+                for trip in range(trips_per_line)
+            ],
+            "pontos_principais": rng.sample(stops, stops_per_line)
+        })
+
+    with open(path, "w", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            f.writelines(json.dumps(line, ensure_ascii=False) + "\n" for line in lines)
+        else:
+            json.dump(lines, f, ensure_ascii=False)
+    return lines
+
+def measure_lookups(lookup, keys, runs):
+    """Mede a latência (µs) de cada consulta"""
+    timings = []
+    for _ in range(runs):
+        for key in keys:
+            start = time.perf_counter()
+            lookup(key)
+            timings.append((time.perf_counter() - start) * 1_000_000)
+    return timings
+
+def summarize(timings):
+    return {
+        "p50_us": round(statistics.median(timings), 2),
+        "p95_us": round(statistics.quantiles(timings, n=20)[-1], 2),
+        "p99_us": round(statistics.quantiles(timings, n=100)[-1], 2),
+        "max_us": round(max(timings), 2)
+    }
+
+def measure_lookups_during_reload(store, keys):
+    """
+    Recarrega a base em outra thread (como o watch faz) enquanto consulta por
+    número, para medir o impacto da recarga nas consultas.
+    """
+    done = threading.Event()
+
+    def reload():
+        store.load()
+        done.set()
+
+    thread = threading.Thread(target=reload)
+    thread.start()
+    timings = []
+    while not done.is_set():
+        timings.extend(measure_lookups(store.get, keys, 1))
+    thread.join()
+    return timings
+
+def run_benchmark(args):
+    path = os.path.join(tempfile.gettempdir(), f"visao_assistida_linhas_{args.lines}.{args.format}")
+    print(f"Gerando rede sintética: {args.lines} linhas, {args.stops} paradas...")
+    lines = create_synthetic_network(path, args.lines, args.stops, args.stops_per_line, args.trips_per_line, args.companies)
+
+    store = BusLineStore(path)
+    store.load()
+    stats = store.stats()
+
+    rng = random.Random(7)
+    numbers = [line["numero"] for line in rng.sample(lines, min(1000, len(lines)))]
+    stop_names = [rng.choice(line["pontos_principais"]) for line in rng.sample(lines, min(1000, len(lines)))]
+    companies = [line["empresa"] for line in rng.sample(lines, min(200, len(lines)))]
+
+    report = {
+        "lines": stats["lines"],
+        "stops": stats["stops"],
+        "companies": stats["companies"],
+        "file_size_mb": round(os.path.getsize(path) / 1024 / 1024, 1),
+        "load_time_ms": stats["load_time_ms"],
+        "by_number": summarize(measure_lookups(store.get, numbers, args.runs)),
+        "by_stop": summarize(measure_lookups(store.lines_at_stop, stop_names, args.runs)),
+        "by_company": summarize(measure_lookups(store.lines_by_company, companies, args.runs)),
+        "missing_number": summarize(measure_lookups(store.get, ["INEXISTENTE"] * 1000, args.runs)),
+        "by_number_during_reload": summarize(measure_lookups_during_reload(store, numbers))
+    }
+
+    print(f"\nLinhas: {report['lines']} | paradas: {report['stops']} | empresas: {report['companies']}")
+    print(f"Arquivo: {report['file_size_mb']} MB | carga + indexação: {report['load_time_ms']} ms")
+    print(f"\n{'consulta':<26} {'p50 µs':>8} {'p95 µs':>8} {'p99 µs':>8} {'máx µs':>10}")
+    for name in ("by_number", "by_stop", "by_company", "missing_number", "by_number_during_reload"):
+        entry = report[name]
+        print(f"{name:<26} {entry['p50_us']:>8} {entry['p95_us']:>8} {entry['p99_us']:>8} {entry['max_us']:>10}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nRelatório salvo em {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mede carga e latência de consulta da base de linhas de ônibus")
+    parser.add_argument("--lines", type=int, default=10000, help="Número de linhas da rede sintética")
+    parser.add_argument("--stops", type=int, default=40000, help="Número de paradas da rede sintética")
+    parser.add_argument("--stops-per-line", type=int, default=40, help="Paradas por linha")
+    parser.add_argument("--trips-per-line", type=int, default=60, help="Horários por linha")
+    parser.add_argument("--companies", type=int, default=50, help="Número de empresas")
+    parser.add_argument("--format", choices=("json", "jsonl"), default="jsonl", help="Formato do arquivo gerado")
+    parser.add_argument("--runs", type=int, default=5, help="Repetições de cada conjunto de consultas")
+    parser.add_argument("--output", help="Arquivo JSON para salvar o relatório")
+    run_benchmark(parser.parse_args())
@@ -0,0 +1,159 @@
+import argparse
+import glob
+import json
+import os
+import resource
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+import numpy as np
+
+from main import REALTIME_MAX_SIZE, decode_image_payload, preprocess_image_for_realtime
+
+# Dimensões de uma foto de 12 MP de celular
+SYNTHETIC_SIZE = (4000, 3000)
+
+def create_synthetic_photo(path):
+    """
+    Gera um JPEG de 12 MP parecido com uma foto de rua (gradiente, formas e
+    ruído leve), já que as imagens de exemplo do repositório são pequenas.
+    """
+    width, height = SYNTHETIC_SIZE
+    x = np.linspace(0, 255, width, dtype=np.float32)
+    y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+    image = np.dstack([(x + y) / 2, np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width))])
+    image = image.astype(np.uint8)
+
+    rng = np.random.default_rng(42)
+    for _ in range(60):
+        x1, y1 = int(rng.integers(0, width - 400)), int(rng.integers(0, height - 400))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(image, (x1, y1), (x1 + int(rng.integers(50, 400)), y1 + int(rng.integers(50, 400))), color, -1)
+
+    noise = rng.normal(0, 6, image.shape).astype(np.int16)
+    image = np.clip(image.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+    cv2.imwrite(path, image, [cv2.IMWRITE_JPEG_QUALITY, 90])
+
+def decode_full_resolution(data):
+    """Caminho antigo: decodifica em resolução total e redimensiona com INTER_LINEAR"""
+    frame = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_COLOR)
+    height, width = frame.shape[:2]
+    scale = REALTIME_MAX_SIZE / max(height, width)
+    if scale < 1:
+        frame = cv2.resize(frame, (int(width * scale), int(height * scale)))
+    return frame
+
+def decode_reduced(data):
+    """Caminho novo: decodificação em resolução reduzida + INTER_AREA só se necessário"""
+    frame = decode_image_payload(data, max_size=REALTIME_MAX_SIZE)
+    return preprocess_image_for_realtime(frame)
+
+MODES = {
+    "full": decode_full_resolution,
+    "reduced": decode_reduced,
+}
+
+def measure_time(data, mode, runs):
+    """Mede o tempo de decodificação + redimensionamento (ms)"""
+    decode = MODES[mode]
+    decode(data)  # aquecimento
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        frame = decode(data)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings, frame.shape
+
+def measure_peak_rss(path, mode):
+    """
+    Executa uma decodificação em um subprocesso e devolve quanto o pico de
+    memória (RSS) cresceu, isolando o pico de cada modo.
+    """
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--peak-rss", mode, path],
+        stderr=subprocess.DEVNULL
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])["peak_rss_delta_mb"]
+
+def read_memory_status(field):
+    """Lê um campo de memória (em KB) de /proc/self/status"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return None
+
+def peak_rss_worker(mode, path):
+    """Modo subprocesso: decodifica uma vez e imprime o crescimento do pico de RSS"""
+    with open(path, "rb") as f:
+        data = f.read()
+
+    try:
+        # Zera o pico (VmHWM) para não contar a memória usada nos imports
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        before = read_memory_status("VmRSS")
+        MODES[mode](data)
+        after = read_memory_status("VmHWM")
+    except OSError:
+        # Fora do Linux: usa ru_maxrss, que não pode ser zerado
+        before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        MODES[mode](data)
+        after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    print(json.dumps({"peak_rss_delta_mb": round((after - before) / 1024, 1)}))
+
+def run_benchmark(runs, output):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    images = sorted(glob.glob(os.path.join(base_dir, "*.png")))
+
+    synthetic_path = os.path.join(tempfile.gettempdir(), "visao_assistida_12mp.jpg")
+    if not os.path.exists(synthetic_path):
+        print("Gerando foto sintética de 12 MP...")
+        create_synthetic_photo(synthetic_path)
+    images.append(synthetic_path)
+
+    report = []
+    print(f"{'imagem':<28} {'modo':<8} {'saída':<12} {'mediana ms':>10} {'p95 ms':>8} {'pico RSS MB':>12}")
+    print("-" * 84)
+
+    for path in images:
+        with open(path, "rb") as f:
+            data = f.read()
+
+        for mode in MODES:
+            timings, shape = measure_time(data, mode, runs)
+            p95 = statistics.quantiles(timings, n=20)[-1] if len(timings) > 1 else timings[0]
+            peak_rss = measure_peak_rss(path, mode)
+            entry = {
+                "image": os.path.basename(path),
+                "mode": mode,
+                "output_shape": list(shape[:2]),
+                "median_ms": round(statistics.median(timings), 2),
+                "p95_ms": round(p95, 2),
+                "peak_rss_delta_mb": peak_rss
+            }
+            report.append(entry)
+            output_size = f"{shape[1]}x{shape[0]}"
+            print(f"{entry['image']:<28} {mode:<8} {output_size:<12} {entry['median_ms']:>10} {entry['p95_ms']:>8} {peak_rss:>12}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nRelatório salvo em {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara decodificação em resolução total x reduzida")
+    parser.add_argument("--runs", type=int, default=20, help="Repetições por imagem e modo")
+    parser.add_argument("--output", help="Arquivo JSON para salvar o relatório")
+    parser.add_argument("--peak-rss", nargs=2, metavar=("MODO", "IMAGEM"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.peak_rss:
+        peak_rss_worker(*args.peak_rss)
+    else:
+        run_benchmark(args.runs, args.output)
@@ -0,0 +1,170 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import cv2
+
+from quantize_model import list_images
+
+CONFIDENCE_THRESHOLD = 0.5
+
+def read_memory_status(field):
+    """Lê um campo de memória (em KB) de /proc/self/status"""
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith(field + ":"):
+                return int(line.split()[1])
+    return None
+
+def run_model_worker(model_path, images_dir, confidence):
+    """
+    Modo subprocesso: carrega um modelo, roda todas as imagens e imprime em
+    JSON as classes detectadas por imagem, as latências e o uso de memória.
+    Cada modelo roda em um processo próprio para isolar a medição de memória.
+    """
+    from ultralytics import YOLO
+
+    rss_start = read_memory_status("VmRSS")
+    model = YOLO(model_path, task="detect")
+    names = model.names
+    image_paths = list_images(images_dir)
+
+    # Aquecimento fora da medição
+    warmup = cv2.imread(image_paths[0], cv2.IMREAD_COLOR)
+    model(warmup, conf=confidence, verbose=False)
+    rss_loaded = read_memory_status("VmRSS")
+
+    latencies = []
+    detections = {}
+    for path in image_paths:
+        image = cv2.imread(path, cv2.IMREAD_COLOR)
+        if image is None:
+            continue
+        start = time.perf_counter()
+        result = model(image, conf=confidence, verbose=False)[0]
+        latencies.append((time.perf_counter() - start) * 1000)
+
+        data = result.boxes.cpu().numpy().data
+        classes = {}
+        for confidence_value, cls_id in zip(data[:, -2].tolist(), data[:, -1].astype(int).tolist()):
+            label = names[cls_id]
+            classes[label] = max(classes.get(label, 0.0), confidence_value)
+        detections[os.path.basename(path)] = classes
+
+    print(json.dumps({
+        "model": model_path,
+        "latencies_ms": latencies,
+        "detections": detections,
+        "rss_model_mb": round((rss_loaded - rss_start) / 1024, 1),
+        "peak_rss_mb": round(read_memory_status("VmHWM") / 1024, 1)
+    }))
+
+def run_model(model_path, images_dir, confidence):
+    output = subprocess.check_output(
+        [sys.executable, os.path.abspath(__file__), "--worker", model_path, images_dir, "--conf", str(confidence)],
+        stderr=subprocess.DEVNULL
+    )
+    return json.loads(output.decode().strip().splitlines()[-1])
+
+def summarize_latency(latencies):
+    p95 = statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]
+    return {
+        "mean_ms": round(statistics.mean(latencies), 2),
+        "p50_ms": round(statistics.median(latencies), 2),
+        "p95_ms": round(p95, 2)
+    }
+
+def compare_classes(fp32_detections, int8_detections):
+    """
+    Concordância por classe: entre as imagens em que algum dos modelos vê a
+    classe acima do limiar, em quantas os dois modelos concordam.
+    """
+    per_class = {}
+    for image, fp32_classes in fp32_detections.items():
+        int8_classes = int8_detections.get(image, {})
+        for label in set(fp32_classes) | set(int8_classes):
+            stats = per_class.setdefault(label, {"both": 0, "fp32_only": 0, "int8_only": 0})
+            if label in fp32_classes and label in int8_classes:
+                stats["both"] += 1
+            elif label in fp32_classes:
+                stats["fp32_only"] += 1
+            else:
+                stats["int8_only"] += 1
+
+    for stats in per_class.values():
+        total = stats["both"] + stats["fp32_only"] + stats["int8_only"]
+        stats["agreement"] = round(stats["both"] / total, 3)
+    return dict(sorted(per_class.items()))
+
+def run_comparison(fp32_path, int8_path, images_dir, confidence, output):
+    print(f"Rodando FP32 ({fp32_path})...")
+    fp32 = run_model(fp32_path, images_dir, confidence)
+    print(f"Rodando INT8 ({int8_path})...")
+    int8 = run_model(int8_path, images_dir, confidence)
+
+    per_class = compare_classes(fp32["detections"], int8["detections"])
+    images_agree = sum(
+        1 for image, classes in fp32["detections"].items()
+        if set(classes) == set(int8["detections"].get(image, {}))
+    )
+
+    report = {
+        "images": len(fp32["detections"]),
+        "confidence_threshold": confidence,
+        "images_with_same_classes": images_agree,
+        "per_class": per_class,
+        "fp32": {
+            "latency": summarize_latency(fp32["latencies_ms"]),
+            "rss_model_mb": fp32["rss_model_mb"],
+            "peak_rss_mb": fp32["peak_rss_mb"],
+            "model_size_mb": round(os.path.getsize(fp32_path) / 1024 / 1024, 1)
+        },
+        "int8": {
+            "latency": summarize_latency(int8["latencies_ms"]),
+            "rss_model_mb": int8["rss_model_mb"],
+            "peak_rss_mb": int8["peak_rss_mb"],
+            "model_size_mb": round(os.path.getsize(int8_path) / 1024 / 1024, 1)
+        }
+    }
+
+    print("\n" + "=" * 60)
+    print(f"Imagens: {report['images']} | mesmas classes nas duas versões: {images_agree}")
+    print(f"\n{'classe':<20} {'ambos':>6} {'só fp32':>8} {'só int8':>8} {'concordância':>13}")
+    for label, stats in per_class.items():
+        print(f"{label:<20} {stats['both']:>6} {stats['fp32_only']:>8} {stats['int8_only']:>8} {stats['agreement']:>13.1%}")
+
+    print(f"\n{'modelo':<8} {'média ms':>9} {'p50 ms':>8} {'p95 ms':>8} {'RSS modelo MB':>14} {'pico RSS MB':>12} {'arquivo MB':>11}")
+    for name in ("fp32", "int8"):
+        entry = report[name]
+        latency = entry["latency"]
+        print(f"{name:<8} {latency['mean_ms']:>9} {latency['p50_ms']:>8} {latency['p95_ms']:>8} "
+              f"{entry['rss_model_mb']:>14} {entry['peak_rss_mb']:>12} {entry['model_size_mb']:>11}")
+
+    speedup = report["fp32"]["latency"]["mean_ms"] / report["int8"]["latency"]["mean_ms"]
+    print(f"\nSpeedup INT8: {speedup:.2f}x")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"Relatório salvo em {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara os modelos FP32 e INT8 em um conjunto local de imagens")
+    parser.add_argument("images_dir", nargs="?", help="Pasta com as imagens de avaliação")
+    parser.add_argument("--fp32", default=os.path.join("model_cache", "yolov8n.onnx"), help="Modelo ONNX FP32")
+    parser.add_argument("--int8", default=os.path.join("model_cache", "yolov8n_int8.onnx"), help="Modelo ONNX INT8")
+    parser.add_argument("--conf", type=float, default=CONFIDENCE_THRESHOLD, help="Limiar de confiança")
+    parser.add_argument("--output", help="Arquivo JSON para salvar o relatório")
+    parser.add_argument("--worker", nargs=2, metavar=("MODELO", "IMAGENS"), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        run_model_worker(*args.worker, args.conf)
+    elif not args.images_dir:
+        parser.error("informe a pasta de imagens")
+    else:
+        run_comparison(args.fp32, args.int8, args.images_dir, args.conf, args.output)
@@ -0,0 +1,445 @@
+import argparse
+import asyncio
+import glob
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+import aiohttp
+import cv2
+import numpy as np
+import socketio
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+# Tamanho dos quadros sintéticos, como os enviados pelo app
+FRAME_SIZE = (1280, 720)
+SERVER_START_TIMEOUT = 300  # segundos para o modelo carregar e aquecer
+
+def create_street_frame(rng, qr_image=None):
+    """
+    Gera um quadro parecido com uma rua (céu, prédios, asfalto, veículos e
+    ruído leve), com um QR code colado em um poste quando qr_image é dado.
+    """
+    width, height = FRAME_SIZE
+    frame = np.empty((height, width, 3), np.uint8)
+    frame[:] = np.linspace(235, 150, height, dtype=np.float32)[:, None, None].astype(np.uint8)
+    horizon = int(height * rng.uniform(0.45, 0.6))
+    frame[horizon:] = int(rng.integers(50, 90))
+
+    for _ in range(int(rng.integers(4, 9))):
+        x1 = int(rng.integers(0, width - 150))
+        building_top = int(rng.integers(60, horizon - 40))
+        color = tuple(int(c) for c in rng.integers(80, 200, 3))
+        cv2.rectangle(frame, (x1, building_top), (x1 + int(rng.integers(80, 250)), horizon), color, -1)
+    for _ in range(int(rng.integers(1, 4))):
+        x1 = int(rng.integers(0, width - 260))
+        y1 = int(rng.integers(horizon, height - 120))
+        color = tuple(int(c) for c in rng.integers(0, 255, 3))
+        cv2.rectangle(frame, (x1, y1), (x1 + int(rng.integers(140, 260)), y1 + int(rng.integers(70, 120))), color, -1)
+
+    if qr_image is not None:
+        size = int(rng.integers(160, 280))
+        qr = cv2.resize(qr_image, (size, size), interpolation=cv2.INTER_AREA)
+        x1 = int(rng.integers(40, width - size - 40))
+        y1 = int(rng.integers(40, max(41, horizon - size)))
+        frame[y1:y1 + size, x1:x1 + size] = qr
+
+    noise = rng.normal(0, 5, frame.shape).astype(np.int16)
+    return np.clip(frame.astype(np.int16) + noise, 0, 255).astype(np.uint8)
+
+def load_frames(num_synthetic, quality):
+    """
+    JPEGs enviados pelos clientes: um quadro de rua com cada QR code de
+    exemplo (ufmg_linha_*.png) e num_synthetic quadros de rua sem QR code.
+    """
+    rng = np.random.default_rng(42)
+    qr_images = [cv2.imread(path) for path in sorted(glob.glob(os.path.join(BASE_DIR, "ufmg_linha_*.png")))]
+    frames = [create_street_frame(rng, qr) for qr in qr_images]
+    frames += [create_street_frame(rng) for _ in range(num_synthetic)]
+    encoded = [cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, quality])[1].tobytes() for frame in frames]
+    return encoded, len(qr_images)
+
+def load_qr_images():
+    """Imagens de exemplo enviadas ao /process-qrcode, como estão no repositório"""
+    images = []
+    for path in sorted(glob.glob(os.path.join(BASE_DIR, "ufmg_linha_*.png"))):
+        with open(path, "rb") as f:
+            images.append(f.read())
+    return images
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def read_proc_usage(pid):
+    """
+    CPU (segundos de usuário + sistema) e RSS (MB) do servidor somados aos
+    dos seus filhos (o pool de processos), via /proc (Linux). None fora do Linux.
+    """
+    pids = [pid]
+    try:
+        for entry in os.listdir("/proc"):
+            if entry.isdigit():
+                try:
+                    with open(f"/proc/{entry}/stat") as f:
+                        # O nome do processo pode ter espaços: os campos começam depois do ")"
+                        fields = f.read().rsplit(")", 1)[1].split()
+                except OSError:
+                    continue
+                if int(fields[1]) == pid:
+                    pids.append(int(entry))
+    except OSError:
+        return None
+
+    ticks = os.sysconf("SC_CLK_TCK")
+    cpu_seconds = 0.0
+    rss_mb = 0.0
+    for child in pids:
+        try:
+            with open(f"/proc/{child}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            cpu_seconds += (int(fields[11]) + int(fields[12])) / ticks
+            with open(f"/proc/{child}/status") as f:
+                for line in f:
+                    if line.startswith("VmRSS:"):
+                        rss_mb += int(line.split()[1]) / 1024
+        except OSError:
+            continue
+    return {"cpu_seconds": cpu_seconds, "rss_mb": rss_mb, "processes": len(pids)}
+
+class ResourceSampler:
+    """Amostra CPU e RSS do servidor durante a rodada, para o pico de memória"""
+
+    def __init__(self, pid, interval=0.5):
+        self.pid = pid
+        self.interval = interval
+        self.start = None
+        self.peak_rss_mb = 0.0
+        self.last = None
+
+    async def run(self):
+        while True:
+            usage = read_proc_usage(self.pid) if self.pid else None
+            if usage is None:
+                return
+            self.start = self.start or usage
+            self.last = usage
+            self.peak_rss_mb = max(self.peak_rss_mb, usage["rss_mb"])
+            await asyncio.sleep(self.interval)
+
+    def report(self, elapsed):
+        if self.start is None or self.last is None:
+            return None
+        cpu_seconds = self.last["cpu_seconds"] - self.start["cpu_seconds"]
+        return {
+            "cpu_seconds": round(cpu_seconds, 2),
+            "cpu_percent": round(cpu_seconds / elapsed * 100, 1) if elapsed > 0 else 0.0,
+            "rss_start_mb": round(self.start["rss_mb"], 1),
+            "rss_peak_mb": round(self.peak_rss_mb, 1),
+            "rss_end_mb": round(self.last["rss_mb"], 1),
+            "processes": self.last["processes"]
+        }
+
+def latency_summary(latencies):
+    """Percentis de latência em ms"""
+    if not latencies:
+        return {"latency_p50_ms": None, "latency_p95_ms": None, "latency_p99_ms": None}
+    ordered = sorted(latencies)
+    def percentile(q):
+        return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))] * 1000, 1)
+    return {
+        "latency_p50_ms": round(statistics.median(ordered) * 1000, 1),
+        "latency_p95_ms": percentile(0.95),
+        "latency_p99_ms": percentile(0.99)
+    }
+
+class FrameClient:
+    """
+    Cliente Socket.IO simulado: emite process_frame em uma taxa fixa e mede a
+    latência de cada quadro pelo frame_seq do resultado (o servidor numera os
+    quadros de cada cliente na ordem em que chegam).
+    """
+
+    def __init__(self, url, frames, fps, offset):
+        self.url = url
+        self.frames = frames
+        self.fps = fps
+        self.offset = offset
+        self.sio = socketio.AsyncClient(reconnection=False)
+        self.sent_at = {}  # frame_seq -> (enviado_em, enviado depois do aquecimento)
+        self.measuring = False
+        self.sent = 0
+        self.latencies = []
+        self.results = 0
+        self.superseded = 0
+        self.dropped = 0
+        self.errors = 0
+        self.sio.on("detection_results", self._on_results)
+        self.sio.on("frame_superseded", self._on_superseded)
+        self.sio.on("frame_dropped", self._on_dropped)
+        self.sio.on("detection_error", self._on_error)
+
+    async def _on_results(self, data):
+        sent_at, measured = self.sent_at.pop(data.get("frame_seq"), (None, False))
+        if measured:
+            self.results += 1
+            self.latencies.append(time.perf_counter() - sent_at)
+
+    async def _on_superseded(self, data):
+        _, measured = self.sent_at.pop(data.get("frame_seq"), (None, False))
+        if measured:
+            self.superseded += 1
+
+    async def _on_dropped(self, data):
+        # Quadro descartado pelo servidor: respondido, não conta como "sem resposta"
+        self.sent_at.pop(data.get("frame_seq"), None)
+        if self.measuring:
+            self.dropped += 1
+
+    async def _on_error(self, data):
+        if self.measuring:
+            self.errors += 1
+
+    async def run(self, warmup, duration):
+        await self.sio.connect(self.url, transports=["websocket"])
+        interval = 1 / self.fps
+        seq = 0
+        start = time.perf_counter()
+        next_frame_at = start
+        while time.perf_counter() - start < warmup + duration:
+            self.measuring = time.perf_counter() - start >= warmup
+            seq += 1
+            self.sent += self.measuring
+            self.sent_at[seq] = (time.perf_counter(), self.measuring)
+            await self.sio.emit("process_frame", self.frames[(self.offset + seq) % len(self.frames)])
+            next_frame_at += interval
+            await asyncio.sleep(max(0.0, next_frame_at - time.perf_counter()))
+
+    async def drain(self, timeout):
+        """Espera os resultados dos últimos quadros enviados"""
+        deadline = time.perf_counter() + timeout
+        while self.sent_at and time.perf_counter() < deadline:
+            await asyncio.sleep(0.05)
+        self.unanswered = sum(1 for _, measured in self.sent_at.values() if measured)
+        await self.sio.disconnect()
+
+async def qrcode_worker(session, url, images, offset, warmup, duration, stats):
+    """Envia imagens ao /process-qrcode em sequência (uma requisição por vez por worker)"""
+    start = time.perf_counter()
+    index = offset
+    while time.perf_counter() - start < warmup + duration:
+        measuring = time.perf_counter() - start >= warmup
+        data = images[index % len(images)]
+        index += 1
+        sent_at = time.perf_counter()
+        try:
+            async with session.post(f"{url}/process-qrcode", data=data, headers={"Content-Type": "image/png"}) as response:
+                body = await response.json()
+                status = response.status
+        except aiohttp.ClientError:
+            status, body = None, {}
+        if not measuring:
+            continue
+        if status == 200:
+            stats["ok"] += 1
+            stats["qr_codes"] += body.get("total_qr_codes", 0)
+            stats["latencies"].append(time.perf_counter() - sent_at)
+        elif status == 503:
+            stats["busy"] += 1
+            # Servidor ocupado: espera um pouco, como o app faria
+            await asyncio.sleep(0.05)
+        else:
+            stats["errors"] += 1
+
+async def run_load(url, args, server_pid):
+    frames, qr_frames = load_frames(args.synthetic_frames, args.jpeg_quality)
+    qr_images = load_qr_images()
+    clients = [FrameClient(url, frames, args.fps, index * 3) for index in range(args.clients)]
+    qr_stats = {"ok": 0, "busy": 0, "errors": 0, "qr_codes": 0, "latencies": []}
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(f"{url}/config") as response:
+            server_config = await response.json()
+
+        sampler = ResourceSampler(server_pid)
+        sampler_task = asyncio.create_task(sampler.run())
+        tasks = [client.run(args.warmup, args.duration) for client in clients]
+        tasks += [
+            qrcode_worker(session, url, qr_images, index, args.warmup, args.duration, qr_stats)
+            for index in range(args.qr_concurrency)
+        ]
+        load = asyncio.gather(*tasks)
+
+        # CPU e RSS cobrem só o período medido (sem o aquecimento)
+        await asyncio.sleep(args.warmup)
+        sampler.start = None
+        measure_start = time.perf_counter()
+        await load
+        elapsed = time.perf_counter() - measure_start
+        await asyncio.gather(*(client.drain(args.drain) for client in clients))
+        sampler_task.cancel()
+
+        async with session.get(f"{url}/config") as response:
+            stage_latency = (await response.json()).get("stage_latency")
+
+    latencies = [latency for client in clients for latency in client.latencies]
+    sent = sum(client.sent for client in clients)
+    results = sum(client.results for client in clients)
+    return {
+        "config": {
+            "clients": args.clients,
+            "fps_per_client": args.fps,
+            "qr_concurrency": args.qr_concurrency,
+            "duration_seconds": args.duration,
+            "warmup_seconds": args.warmup,
+            "frames": len(frames),
+            "frames_with_qr": qr_frames,
+            "frame_bytes_avg": round(statistics.mean(len(frame) for frame in frames)),
+            "server": {
+                key: server_config.get(key)
+                for key in ("inference_backend", "model_precision", "inference_pool", "max_workers", "max_pending_inferences")
+            }
+        },
+        "frames": {
+            "sent": sent,
+            "results": results,
+            "superseded": sum(client.superseded for client in clients),
+            "dropped": sum(client.dropped for client in clients),
+            "errors": sum(client.errors for client in clients),
+            "unanswered": sum(client.unanswered for client in clients),
+            "offered_fps": round(sent / elapsed, 2),
+            "throughput_fps": round(results / elapsed, 2),
+            **latency_summary(latencies)
+        },
+        "qrcode": {
+            "requests": qr_stats["ok"] + qr_stats["busy"] + qr_stats["errors"],
+            "ok": qr_stats["ok"],
+            "busy": qr_stats["busy"],
+            "errors": qr_stats["errors"],
+            "qr_codes": qr_stats["qr_codes"],
+            "throughput_rps": round(qr_stats["ok"] / elapsed, 2),
+            **latency_summary(qr_stats["latencies"])
+        },
+        "server_resources": sampler.report(elapsed),
+        "stage_latency": stage_latency
+    }
+
+def start_server(port, log_path=None):
+    """
+    Sobe o servidor local em um subprocesso (as variáveis de ambiente, como
+    INFERENCE_POOL ou BATCH_MAX_SIZE, são repassadas) e espera o /health.
+    """
+    log = open(log_path, "w") if log_path else subprocess.DEVNULL
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        cwd=BASE_DIR,
+        stdout=log,
+        stderr=log
+    )
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.time() + SERVER_START_TIMEOUT
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError("O servidor terminou antes de ficar pronto (use --server-log para ver o erro)")
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=1) as response:
+                if response.status == 200:
+                    return process, url
+        except OSError:
+            pass
+        time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError("O servidor não ficou pronto a tempo")
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+COMPARED_METRICS = (
+    ("frames", "throughput_fps", "quadros/s"),
+    ("frames", "latency_p50_ms", "p50 quadros (ms)"),
+    ("frames", "latency_p99_ms", "p99 quadros (ms)"),
+    ("frames", "superseded", "quadros substituídos"),
+    ("qrcode", "throughput_rps", "QR req/s"),
+    ("qrcode", "latency_p50_ms", "p50 QR (ms)"),
+    ("qrcode", "latency_p99_ms", "p99 QR (ms)"),
+    ("server_resources", "cpu_percent", "CPU (%)"),
+    ("server_resources", "rss_peak_mb", "pico de RSS (MB)"),
+)
+
+def print_report(report, baseline=None):
+    frames = report["frames"]
+    qrcode = report["qrcode"]
+    print(f"\nCommit {report['commit']} | {report['config']['clients']} clientes a {report['config']['fps_per_client']} FPS "
+          f"+ {report['config']['qr_concurrency']} clientes de /process-qrcode, {report['config']['duration_seconds']}s")
+    print(f"Quadros: {frames['sent']} enviados, {frames['results']} resultados, {frames['superseded']} substituídos, "
+          f"{frames['dropped']} descartados, {frames['errors']} erros, {frames['unanswered']} sem resposta")
+    print(f"/process-qrcode: {qrcode['requests']} pedidos, {qrcode['ok']} ok, {qrcode['busy']} recusados (503), "
+          f"{qrcode['errors']} erros, {qrcode['qr_codes']} QR codes lidos")
+    if baseline is None:
+        for section, key, label in COMPARED_METRICS:
+            value = (report.get(section) or {}).get(key)
+            print(f"{label:<24} {value if value is not None else '-':>10}")
+        return
+
+    if baseline.get("config") != report["config"]:
+        print("\nAviso: a rodada base usou outra configuração (clientes, FPS, duração ou servidor)")
+    print(f"\n{'':<24} {'base':>10} {'atual':>10} {'variação':>10}   (base: commit {baseline.get('commit')})")
+    for section, key, label in COMPARED_METRICS:
+        old = (baseline.get(section) or {}).get(key)
+        new = (report.get(section) or {}).get(key)
+        change = f"{(new - old) / old * 100:+.1f}%" if old and new is not None else "-"
+        print(f"{label:<24} {old if old is not None else '-':>10} {new if new is not None else '-':>10} {change:>10}")
+
+async def main_async(args):
+    process = None
+    url = args.url
+    server_pid = args.server_pid
+    if url is None:
+        print("Subindo o servidor local...")
+        process, url = start_server(args.port or free_port(), args.server_log)
+        server_pid = process.pid
+    try:
+        report = await run_load(url.rstrip("/"), args, server_pid)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait(timeout=30)
+
+    report = {"commit": git_commit(), "timestamp": time.time(), **report}
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(report, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nRelatório salvo em {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Teste de carga: clientes Socket.IO simulados (process_frame) e requisições ao /process-qrcode")
+    parser.add_argument("--url", help="Servidor já rodando (padrão: sobe o servidor local em um subprocesso)")
+    parser.add_argument("--server-pid", type=int, help="PID do servidor passado em --url, para medir CPU e RSS")
+    parser.add_argument("--port", type=int, help="Porta do servidor local (padrão: uma porta livre)")
+    parser.add_argument("--server-log", help="Arquivo para a saída do servidor local")
+    parser.add_argument("--clients", type=int, default=4, help="Clientes Socket.IO simulados")
+    parser.add_argument("--fps", type=float, default=5, help="Quadros por segundo de cada cliente")
+    parser.add_argument("--qr-concurrency", type=int, default=1, help="Requisições simultâneas ao /process-qrcode (0 desliga)")
+    parser.add_argument("--duration", type=float, default=30, help="Duração medida, em segundos")
+    parser.add_argument("--warmup", type=float, default=5, help="Aquecimento antes da medição, em segundos")
+    parser.add_argument("--drain", type=float, default=10, help="Tempo máximo de espera pelos últimos resultados")
+    parser.add_argument("--synthetic-frames", type=int, default=24, help="Quadros de rua sintéticos sem QR code")
+    parser.add_argument("--jpeg-quality", type=int, default=80, help="Qualidade JPEG dos quadros enviados")
+    parser.add_argument("--output", help="Arquivo JSON para salvar o relatório")
+    parser.add_argument("--compare", help="Relatório JSON de outro commit para comparar")
+    asyncio.run(main_async(parser.parse_args()))
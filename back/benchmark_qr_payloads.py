@@ -0,0 +1,99 @@
+import argparse
+import json
+import os
+import statistics
+import time
+
+from bus_lines import BusLineStore, line_not_found, parse_qr_payload
+from generate_qr_examples import bus_example_payloads
+from generate_ufmg_qr_codes import ufmg_payloads
+
+def resolve_legacy(store, qr_data):
+    """Caminho antigo: testa os formatos em sequência e refaz o parse a cada leitura"""
+    bus_number = None
+    if qr_data.isdigit() or qr_data.replace('-', '').replace('_', '').isalnum():
+        bus_number = qr_data.upper()
+    elif qr_data.startswith('{'):
+        try:
+            qr_json = json.loads(qr_data)
+            bus_number = qr_json.get('linha', qr_json.get('numero', qr_json.get('line')))
+        except json.JSONDecodeError:
+            pass
+    elif 'linha=' in qr_data or 'bus=' in qr_data:
+        for param in qr_data.split('&'):
+            if 'linha=' in param:
+                bus_number = param.split('=')[1]
+                break
+            elif 'bus=' in param:
+                bus_number = param.split('=')[1]
+                break
+    line = store.get(bus_number) if bus_number else None
+    return line if line is not None else line_not_found(bus_number, qr_data)
+
+def resolve_parser(store, qr_data):
+    """Parser novo sem memo"""
+    number = parse_qr_payload(qr_data)
+    line = store.get(number) if number else None
+    return line if line is not None else line_not_found(number, qr_data)
+
+def resolve_memo(store, qr_data):
+    """Parser novo com o memo LRU do índice"""
+    return store.resolve_qr_payload(qr_data)
+
+MODES = {
+    "legacy": resolve_legacy,
+    "parser": resolve_parser,
+    "memo": resolve_memo,
+}
+
+def measure(store, resolve, payloads, runs):
+    """Mede a latência (µs) de cada resolução de payload"""
+    for payload in payloads:
+        resolve(store, payload)  # aquecimento (e preenchimento do memo)
+    timings = []
+    for _ in range(runs):
+        for payload in payloads:
+            start = time.perf_counter()
+            resolve(store, payload)
+            timings.append((time.perf_counter() - start) * 1_000_000)
+    return timings
+
+def run_benchmark(runs, output):
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    store = BusLineStore(os.path.join(base_dir, "bus_lines.json"))
+    store.load()
+    payloads = ufmg_payloads() + bus_example_payloads()
+
+    print(f"{len(payloads)} payloads de generate_ufmg_qr_codes.py e generate_qr_examples.py\n")
+    print(f"{'payload':<45} {'legacy':>8} {'parser':>8} {'memo':>8}   linha")
+    report = {"payloads": [], "total": {}}
+    for payload in payloads:
+        medians = {}
+        for mode, resolve in MODES.items():
+            medians[mode] = round(statistics.median(measure(store, resolve, [payload], runs)), 2)
+        number = resolve_memo(store, payload).get("numero")
+        report["payloads"].append({"payload": payload, "numero": number, "median_us": medians})
+        print(f"{payload[:45]:<45} {medians['legacy']:>8} {medians['parser']:>8} {medians['memo']:>8}   {number}")
+
+    print(f"\n{'modo':<8} {'p50 µs':>8} {'p95 µs':>8} {'leituras/s':>12}")
+    for mode, resolve in MODES.items():
+        timings = measure(store, resolve, payloads, runs)
+        entry = {
+            "p50_us": round(statistics.median(timings), 2),
+            "p95_us": round(statistics.quantiles(timings, n=20)[-1], 2),
+            "reads_per_second": round(len(timings) / (sum(timings) / 1_000_000))
+        }
+        report["total"][mode] = entry
+        print(f"{mode:<8} {entry['p50_us']:>8} {entry['p95_us']:>8} {entry['reads_per_second']:>12}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nRelatório salvo em {output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara a resolução de payloads de QR code (antiga, parser novo e memo)")
+    parser.add_argument("--runs", type=int, default=2000, help="Repetições por payload")
+    parser.add_argument("--output", help="Arquivo JSON para salvar o relatório")
+    args = parser.parse_args()
+    run_benchmark(args.runs, args.output)
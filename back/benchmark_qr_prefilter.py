@@ -0,0 +1,116 @@
+import argparse
+import glob
+import json
+import os
+import statistics
+import time
+
+import cv2
+import numpy as np
+
+from benchmark_load import create_street_frame
+from main import REALTIME_MAX_SIZE, decode_qr_codes, find_qr_candidates, preprocess_image_for_realtime, scan_qr_codes, to_grayscale
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def paste_qr(frame, qr_image, size, rng):
+    """Cola o QR code com size px de lado em uma posição aleatória do quadro"""
+    height, width = frame.shape[:2]
+    qr = cv2.resize(qr_image, (size, size), interpolation=cv2.INTER_AREA)
+    x1 = int(rng.integers(20, width - size - 20))
+    y1 = int(rng.integers(20, height - size - 20))
+    frame[y1:y1 + size, x1:x1 + size] = qr
+    return frame
+
+def build_frames(qr_sizes, num_empty, max_size):
+    """
+    Quadros de rua sintéticos (1280x720, como os do app) com cada QR code de
+    exemplo (ufmg_linha_*.png) em cada tamanho, e num_empty quadros sem QR
+    code. Os quadros passam pela mesma redução do tempo real (max_size).
+    """
+    rng = np.random.default_rng(7)
+    samples = [(os.path.basename(path), cv2.imread(path)) for path in sorted(glob.glob(os.path.join(BASE_DIR, "ufmg_linha_*.png")))]
+    frames = []
+    for size in qr_sizes:
+        for name, qr_image in samples:
+            frames.append({"qr_size": size, "image": name, "frame": paste_qr(create_street_frame(rng), qr_image, size, rng)})
+    frames += [{"qr_size": None, "image": None, "frame": create_street_frame(rng)} for _ in range(num_empty)]
+
+    for item in frames:
+        frame = preprocess_image_for_realtime(item["frame"]) if max_size else item["frame"]
+        item["gray"] = to_grayscale(frame)
+    return frames, len(samples)
+
+MODES = {
+    # Varredura antiga: pyzbar no quadro inteiro
+    "ungated": lambda gray: decode_qr_codes(gray),
+    # Pré-filtro: padrões de localização e pyzbar só nos candidatos
+    "gated": lambda gray: scan_qr_codes(gray)[0],
+}
+
+def measure(frames, scan, runs):
+    """Latência mediana (ms) e códigos lidos de cada quadro"""
+    results = []
+    for item in frames:
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            codes = scan(item["gray"])
+            timings.append((time.perf_counter() - start) * 1000)
+        results.append((statistics.median(timings), len(codes) > 0))
+    return results
+
+def summarize(frames, results, qr_sizes):
+    with_qr = [(result, item) for result, item in zip(results, frames) if item["qr_size"] is not None]
+    without_qr = [result for result, item in zip(results, frames) if item["qr_size"] is None]
+    return {
+        "median_ms_without_qr": round(statistics.median(ms for ms, _ in without_qr), 2),
+        "median_ms_with_qr": round(statistics.median(ms for (ms, _), _ in with_qr), 2),
+        "hit_rate_by_size": {
+            size: round(statistics.mean(found for (_, found), item in with_qr if item["qr_size"] == size), 3)
+            for size in qr_sizes
+        }
+    }
+
+def run_benchmark(args):
+    qr_sizes = [int(size) for size in args.qr_sizes.split(",")]
+    frames, num_samples = build_frames(qr_sizes, args.empty_frames, args.max_size)
+    height, width = frames[0]["gray"].shape
+    print(f"{num_samples} QR codes de exemplo × {len(qr_sizes)} tamanhos e {args.empty_frames} quadros sem QR code, varridos em {width}x{height}\n")
+
+    gate_timings = []
+    false_candidates = 0
+    for item in frames:
+        start = time.perf_counter()
+        candidates = find_qr_candidates(item["gray"])
+        gate_timings.append((time.perf_counter() - start) * 1000)
+        false_candidates += item["qr_size"] is None and bool(candidates)
+
+    report = {"frame_size": [width, height], "qr_sizes_px": qr_sizes, "modes": {}}
+    report["gate"] = {
+        "median_ms": round(statistics.median(gate_timings), 2),
+        "empty_frames_with_candidates": false_candidates
+    }
+    for mode, scan in MODES.items():
+        report["modes"][mode] = summarize(frames, measure(frames, scan, args.runs), qr_sizes)
+
+    print(f"{'modo':<9} {'sem QR ms':>10} {'com QR ms':>10}   taxa de leitura por tamanho do QR (px no quadro de 1280)")
+    for mode, entry in report["modes"].items():
+        hits = "  ".join(f"{size}px: {rate:.0%}" for size, rate in entry["hit_rate_by_size"].items())
+        print(f"{mode:<9} {entry['median_ms_without_qr']:>10} {entry['median_ms_with_qr']:>10}   {hits}")
+    print(f"\nBusca de candidatos: {report['gate']['median_ms']} ms por quadro; {false_candidates} de {args.empty_frames} quadros sem QR code tiveram candidatos")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Relatório salvo em {args.output}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compara a varredura de QR code com e sem o pré-filtro (tempo e taxa de leitura)")
+    parser.add_argument("--qr-sizes", default="48,72,97,160,240", help="Lados dos QR codes, em px no quadro de 1280x720")
+    parser.add_argument("--empty-frames", type=int, default=40, help="Quadros sem QR code")
+    parser.add_argument("--max-size", type=int, default=REALTIME_MAX_SIZE, help="Redução do tempo real antes da varredura (0: resolução original)")
+    parser.add_argument("--runs", type=int, default=5, help="Repetições por quadro")
+    parser.add_argument("--output", help="Arquivo JSON para salvar o relatório")
+    args = parser.parse_args()
+    run_benchmark(args)
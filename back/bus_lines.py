@@ -0,0 +1,342 @@
+import asyncio
+import bisect
+import csv
+import gc
+import json
+import logging
+import os
+import time
+import heapq
+import unicodedata
+from collections import OrderedDict, defaultdict
+from datetime import datetime
+from functools import lru_cache
+from urllib.parse import parse_qs, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MINUTES_PER_DAY = 24 * 60
+
+# Chaves que identificam a linha em QR codes JSON e URL, em ordem de prioridade
+QR_LINE_KEYS = ("linha", "numero", "line", "bus")
+# Payloads de QR code resolvidos guardados por índice (LRU)
+QR_PAYLOAD_MEMO_SIZE = 1024
+
+# Colunas do CSV de linhas; horarios e pontos_principais separados por ";"
+CSV_LIST_SEPARATOR = ";"
+CSV_LIST_FIELDS = ("horarios", "pontos_principais")
+
+def normalize_line_number(number):
+    """Normaliza o número da linha como get_bus_line_info o extrai do QR code"""
+    return str(number).strip().upper()
+
+@lru_cache(maxsize=200000)
+def normalize_text(text):
+    """Normaliza nomes de paradas e empresas para busca (sem acentos, caixa ou espaços extras)"""
+    text = unicodedata.normalize("NFKD", str(text))
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    return " ".join(text.casefold().split())
+
+def parse_departure(value):
+    """Converte um horário "HH:MM" em minutos desde a meia-noite (None se inválido)"""
+    try:
+        hours, minutes = str(value).strip().split(":")
+        hours, minutes = int(hours), int(minutes)
+    except ValueError:
+        return None
+    if not (0 <= hours < 24 and 0 <= minutes < 60):
+        return None
+    return hours * 60 + minutes
+
+def format_departure(minutes):
+    return f"{minutes // 60 % 24:02d}:{minutes % 60:02d}"
+
+def minutes_since_midnight(moment=None):
+    """Minutos desde a meia-noite do momento informado (ou de agora)"""
+    moment = moment or datetime.now()
+    return moment.hour * 60 + moment.minute
+
+def parse_qr_payload(qr_data):
+    """
+    Extrai o número da linha do texto de um QR code. Formatos aceitos:
+    JSON com uma das chaves de QR_LINE_KEYS, URL ou query string com um
+    desses parâmetros (ex.: http://businfo.com?linha=101) e o número da linha
+    puro (letras, dígitos, "-" e "_"). Retorna None se nenhum formato servir.
+    """
+    payload = qr_data.strip()
+    if not payload:
+        return None
+
+    # Formato JSON
+    if payload.startswith("{"):
+        try:
+            data = json.loads(payload)
+        except json.JSONDecodeError:
+            return None
+        if not isinstance(data, dict):
+            return None
+        for key in QR_LINE_KEYS:
+            value = data.get(key)
+            if isinstance(value, (str, int)) and not isinstance(value, bool) and str(value).strip():
+                return normalize_line_number(value)
+        return None
+
+    # Formato URL (parâmetros depois do "?") ou query string pura
+    if "=" in payload:
+        parts = urlsplit(payload)
+        query = parts.query if (parts.scheme or parts.netloc or "?" in payload) else payload
+        params = parse_qs(query)
+        for key in QR_LINE_KEYS:
+            if params.get(key) and params[key][0].strip():
+                return normalize_line_number(params[key][0])
+        return None
+
+    # Apenas o número da linha
+    if payload.replace("-", "").replace("_", "").isalnum():
+        return normalize_line_number(payload)
+    return None
+
+def line_not_found(number, qr_data):
+    """Informação básica de uma linha que não está na base"""
+    return {
+        "numero": number or qr_data,
+        "nome": "Linha não encontrada na base de dados",
+        "empresa": "Consulte a empresa de transporte",
+        "tarifa": "Consulte valor atual",
+        "horarios": ["Consulte horários"],
+        "pontos_principais": ["Informações não disponíveis"],
+        "qr_data_original": qr_data
+    }
+
+def parse_fare(value):
+    """Converte a tarifa do CSV para número quando possível"""
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return value
+    return int(number) if number.is_integer() else number
+
+def read_bus_lines(path):
+    """
+    Lê as linhas de ônibus de um arquivo JSON (lista de linhas ou objeto
+    indexado pelo número), JSON Lines (uma linha de ônibus por linha do
+    arquivo) ou CSV (uma linha por registro, com as colunas numero, nome,
+    empresa, tarifa, horarios e pontos_principais). JSON Lines e CSV são
+    lidos registro a registro, sem segurar o GIL pelo arquivo inteiro, e
+    são os formatos indicados para a rede completa da cidade.
+    """
+    if path.lower().endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            return [json.loads(row) for row in f if row.strip()]
+
+    if path.lower().endswith(".csv"):
+        with open(path, newline="", encoding="utf-8") as f:
+            lines = []
+            for row in csv.DictReader(f):
+                for field in CSV_LIST_FIELDS:
+                    value = row.get(field) or ""
+                    row[field] = [item.strip() for item in value.split(CSV_LIST_SEPARATOR) if item.strip()]
+                row["tarifa"] = parse_fare(row.get("tarifa"))
+                lines.append(row)
+            return lines
+
+    with open(path, encoding="utf-8") as f:
+        data = json.load(f)
+    return list(data.values()) if isinstance(data, dict) else data
+
+class BusLineIndex:
+    """
+    Conjunto imutável de linhas com índices por número, parada e empresa.
+    Uma recarga monta um índice novo e troca a referência, então as consultas
+    nunca veem um índice pela metade e não precisam de lock.
+    """
+
+    def __init__(self, lines):
+        self.by_number = {}
+        self.by_stop = defaultdict(list)
+        self.by_company = defaultdict(list)
+        self.departures = {}  # número -> partidas em minutos desde a meia-noite, ordenadas
+        # Payloads de QR code já resolvidos neste índice: uma recarga cria um
+        # índice novo e, com ele, um memo vazio
+        self.qr_memo = OrderedDict()
+
+        for line in lines:
+            number = normalize_line_number(line["numero"])
+            self.by_number[number] = line
+
+            # Quadro de horários ordenado e sem repetições; horários inválidos são descartados
+            departures = sorted({minutes for minutes in map(parse_departure, line.get("horarios", [])) if minutes is not None})
+            self.departures[number] = departures
+            line["horarios"] = [format_departure(minutes) for minutes in departures]
+
+            self.by_company[normalize_text(line.get("empresa", ""))].append(number)
+            for stop in dict.fromkeys(normalize_text(stop) for stop in line.get("pontos_principais", [])):
+                self.by_stop[stop].append(number)
+
+        # Congela os índices: consultas a chaves inexistentes não criam entradas
+        self.by_stop = dict(self.by_stop)
+        self.by_company = dict(self.by_company)
+
+    def __len__(self):
+        return len(self.by_number)
+
+class BusLineStore:
+    """
+    Base de linhas de ônibus carregada de um arquivo local e recarregada
+    quando o arquivo muda. A leitura e a indexação rodam fora do event loop
+    (ver watch), e as consultas usam sempre o último índice completo.
+    """
+
+    def __init__(self, path, timezone=None):
+        self.path = path
+        self.timezone = timezone  # fuso dos quadros de horários (None: hora local do servidor)
+        self.index = BusLineIndex([])
+        self._file_signature = None
+        self.loaded_at = None
+        self.load_time_ms = None
+        self.reloads = 0
+        self.reload_errors = 0
+        self.qr_memo_hits = 0
+        self.qr_memo_misses = 0
+
+    def _signature(self):
+        stat = os.stat(self.path)
+        return stat.st_mtime_ns, stat.st_size
+
+    def load(self):
+        """Lê e indexa o arquivo, trocando o índice atual ao final"""
+        signature = self._signature()
+        start = time.perf_counter()
+
+        # A leitura cria centenas de milhares de objetos, o que dispararia
+        # coletas completas do GC (que seguram o GIL e pausam as consultas
+        # das outras threads); os objetos são liberados por contagem de
+        # referências, então o GC pode ficar desligado durante a carga
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            index = BusLineIndex(read_bus_lines(self.path))
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+        self.index = index
+        self._file_signature = signature
+        self.loaded_at = time.time()
+        self.load_time_ms = round((time.perf_counter() - start) * 1000, 1)
+        logger.info(f"{len(index)} linhas de ônibus carregadas de {self.path} em {self.load_time_ms} ms")
+
+    def reload_if_changed(self):
+        """Recarrega o arquivo se a data de modificação ou o tamanho mudaram"""
+        signature = self._signature()
+        if signature == self._file_signature:
+            return False
+        # Um arquivo inválido só é lido de novo quando mudar outra vez
+        self._file_signature = signature
+        self.load()
+        self.reloads += 1
+        return True
+
+    async def watch(self, interval):
+        """Verifica o arquivo a cada interval segundos e recarrega em uma thread"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reload_if_changed)
+            except Exception as e:
+                # Arquivo ausente ou inválido: mantém o último índice carregado
+                self.reload_errors += 1
+                logger.error(f"Erro ao recarregar as linhas de ônibus de {self.path}: {e}")
+
+    def get(self, number):
+        return self.index.by_number.get(normalize_line_number(number))
+
+    def resolve_qr_payload(self, qr_data):
+        """
+        Informações da linha de um QR code, com memo LRU por payload (os
+        mesmos poucos QR codes são lidos milhares de vezes). Linhas fora da
+        base retornam a informação básica de line_not_found.
+        """
+        index = self.index
+        memo = index.qr_memo
+        info = memo.get(qr_data)
+        if info is not None:
+            memo.move_to_end(qr_data)
+            self.qr_memo_hits += 1
+            return info
+
+        self.qr_memo_misses += 1
+        number = parse_qr_payload(qr_data)
+        info = index.by_number.get(number) if number else None
+        if info is None:
+            info = line_not_found(number, qr_data)
+
+        memo[qr_data] = info
+        if len(memo) > QR_PAYLOAD_MEMO_SIZE:
+            memo.popitem(last=False)
+        return info
+
+    def lines_at_stop(self, stop):
+        index = self.index
+        return [index.by_number[number] for number in index.by_stop.get(normalize_text(stop), [])]
+
+    def lines_by_company(self, company):
+        index = self.index
+        return [index.by_number[number] for number in index.by_company.get(normalize_text(company), [])]
+
+    def current_minutes(self):
+        return minutes_since_midnight(datetime.now(self.timezone))
+
+    def next_departures(self, number, now=None, count=3):
+        """
+        Próximas count partidas da linha a partir de now (minutos desde a
+        meia-noite), por busca binária no quadro ordenado. Quando as partidas
+        do dia acabam, continua nas do dia seguinte. Cada partida traz o
+        horário e a espera em minutos.
+        """
+        departures = self.index.departures.get(normalize_line_number(number))
+        if not departures:
+            return []
+        now = self.current_minutes() if now is None else now
+        return list(self._iter_departures(departures, now, count))
+
+    def next_departures_at_stop(self, stop, now=None, count=5):
+        """Próximas count partidas de todas as linhas que passam pela parada, da mais próxima à mais distante"""
+        index = self.index
+        now = self.current_minutes() if now is None else now
+        per_line = []
+        for number in index.by_stop.get(normalize_text(stop), []):
+            line = index.by_number[number]
+            per_line.append([
+                {"numero": line["numero"], "nome": line.get("nome"), **departure}
+                for departure in self._iter_departures(index.departures[number], now, count)
+            ])
+        upcoming = heapq.merge(*per_line, key=lambda departure: departure["minutos"])
+        return [departure for departure, _ in zip(upcoming, range(count))]
+
+    @staticmethod
+    def _iter_departures(departures, now, count):
+        if not departures:
+            return
+        position = bisect.bisect_left(departures, now)
+        for offset in range(min(count, len(departures) * 2)):
+            day, slot = divmod(position + offset, len(departures))
+            if day > 1:
+                break
+            minutes = departures[slot] + day * MINUTES_PER_DAY
+            yield {"horario": format_departure(minutes), "minutos": minutes - now}
+
+    def stats(self):
+        return {
+            "path": self.path,
+            "lines": len(self.index),
+            "stops": len(self.index.by_stop),
+            "companies": len(self.index.by_company),
+            "loaded_at": self.loaded_at,
+            "load_time_ms": self.load_time_ms,
+            "reloads": self.reloads,
+            "reload_errors": self.reload_errors,
+            "qr_memo_entries": len(self.index.qr_memo),
+            "qr_memo_hits": self.qr_memo_hits,
+            "qr_memo_misses": self.qr_memo_misses
+        }
@@ -0,0 +1,102 @@
+import time
+from collections import OrderedDict, defaultdict
+
+class ResultCache:
+    """
+    Cache de resultados por cliente, chaveado pelo hash perceptual do quadro.
+    Um quadro é considerado igual a uma entrada se a distância de Hamming entre
+    os hashes for no máximo max_distance. Remoção LRU (global e por cliente)
+    e expiração por TTL.
+    """
+
+    def __init__(self, max_entries, max_entries_per_client, ttl, max_distance):
+        self.max_entries = max_entries
+        self.max_entries_per_client = max_entries_per_client
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self._lru = OrderedDict()  # (sid, hash) -> (armazenado_em, resultados)
+        self._clients = defaultdict(OrderedDict)  # sid -> hashes em ordem LRU
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self):
+        return len(self._lru)
+
+    def get(self, sid, frame_hash):
+        """Busca o resultado de um quadro parecido já processado para o cliente"""
+        now = time.time()
+        best_hash = None
+        best_distance = self.max_distance + 1
+        
+        for cached_hash in list(self._clients.get(sid, ())):
+            stored_at, _ = self._lru[(sid, cached_hash)]
+            if now - stored_at > self.ttl:
+                self._remove(sid, cached_hash)
+                self.expirations += 1
+                continue
+            distance = (cached_hash ^ frame_hash).bit_count()
+            if distance < best_distance:
+                best_hash, best_distance = cached_hash, distance
+        
+        if best_hash is None:
+            self.misses += 1
+            return None
+        
+        self.hits += 1
+        self._lru.move_to_end((sid, best_hash))
+        self._clients[sid].move_to_end(best_hash)
+        return self._lru[(sid, best_hash)][1]
+
+    def put(self, sid, frame_hash, results):
+        """Armazena o resultado de um quadro, removendo as entradas menos usadas"""
+        key = (sid, frame_hash)
+        if key in self._lru:
+            self._remove(sid, frame_hash)
+        
+        client_entries = self._clients[sid]
+        while len(client_entries) >= self.max_entries_per_client:
+            self._remove(sid, next(iter(client_entries)))
+            self.evictions += 1
+        
+        while len(self._lru) >= self.max_entries:
+            oldest_sid, oldest_hash = next(iter(self._lru))
+            self._remove(oldest_sid, oldest_hash)
+            self.evictions += 1
+        
+        self._lru[key] = (time.time(), results)
+        self._clients[sid][frame_hash] = None
+
+    def drop_client(self, sid):
+        """Remove todas as entradas de um cliente (ex.: ao desconectar)"""
+        for cached_hash in list(self._clients.get(sid, ())):
+            self._remove(sid, cached_hash)
+
+    def client_state(self, sid):
+        """Entradas do cliente, para estimar a memória da sessão"""
+        return [self._lru.get((sid, cached_hash)) for cached_hash in self._clients.get(sid, ())]
+
+    def clear(self):
+        self._lru.clear()
+        self._clients.clear()
+
+    def _remove(self, sid, frame_hash):
+        del self._lru[(sid, frame_hash)]
+        client_entries = self._clients[sid]
+        del client_entries[frame_hash]
+        if not client_entries:
+            del self._clients[sid]
+
+    def stats(self):
+        """Contadores do cache para o /health"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._lru),
+            "clients": len(self._clients),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 3) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
@@ -0,0 +1,137 @@
+import time
+from collections import defaultdict
+
+class CaptureAdvisor:
+    """
+    Recomenda a cada cliente como capturar os quadros: intervalo entre
+    capturas, resolução máxima e qualidade JPEG. A recomendação sai da
+    ocupação do pool de inferência, do tempo de processamento e da espera na
+    fila dos últimos quadros do cliente (médias móveis) e dos quadros
+    substituídos (o cliente envia mais rápido do que é atendido). Assim o
+    cliente desacelera antes de o pool saturar e acelera quando está ocioso.
+    Um nível de carga maior vale na hora; um menor só depois de
+    recovery_frames quadros seguidos, para a recomendação não oscilar.
+    """
+
+    def __init__(self, levels, min_interval, max_interval, push_interval, recovery_frames, default_service_time, smoothing=0.3):
+        self.levels = levels  # nível -> (folga, qualidade JPEG, maior lado), do mais leve ao mais pesado
+        self.default_service_time = default_service_time  # segundos por quadro antes de haver medições
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.push_interval = push_interval
+        self.recovery_frames = recovery_frames
+        self.smoothing = smoothing
+        self._clients = {}  # sid -> estado
+        self.hints_pushed = 0
+
+    def _state(self, sid):
+        state = self._clients.get(sid)
+        if state is None:
+            state = self._clients[sid] = {
+                "service": None,  # tempo de processamento (s), média móvel
+                "wait": 0.0,  # espera na caixa de entrada e no pool (s), média móvel
+                "superseded": 0,
+                "level": "normal",
+                "candidate": None,  # nível menor aguardando recovery_frames
+                "candidate_frames": 0,
+                "last_hint": None,
+                "pushed_at": 0.0
+            }
+        return state
+
+    def observe_frame(self, sid, processing_time, queue_wait, pressure):
+        """Registra um quadro processado do cliente (pressure: ocupação do pool, de 0 a 1)"""
+        state = self._state(sid)
+        alpha = self.smoothing
+        if state["service"] is None:
+            state["service"] = processing_time
+        else:
+            state["service"] = alpha * processing_time + (1 - alpha) * state["service"]
+        state["wait"] = alpha * queue_wait + (1 - alpha) * state["wait"]
+        # Cada quadro processado compensa uma substituição: o cliente continua
+        # "busy" enquanto tiver mais quadros substituídos do que atendidos
+        state["superseded"] = max(0, state["superseded"] - 1)
+        self._update_level(state, pressure, recovering=True)
+
+    def observe_superseded(self, sid, pressure):
+        state = self._state(sid)
+        state["superseded"] += 1
+        self._update_level(state, pressure, recovering=False)
+
+    def _update_level(self, state, pressure, recovering):
+        levels = list(self.levels)
+        level = self.load_level(state, pressure)
+        if levels.index(level) > levels.index(state["level"]):
+            state["level"] = level
+            state["candidate"] = None
+        elif levels.index(level) < levels.index(state["level"]) and recovering:
+            if state["candidate"] != level:
+                state["candidate"], state["candidate_frames"] = level, 0
+            state["candidate_frames"] += 1
+            if state["candidate_frames"] >= self.recovery_frames:
+                state["level"] = level
+                state["candidate"] = None
+        elif recovering:
+            state["candidate"] = None
+
+    @staticmethod
+    def load_level(state, pressure):
+        service = state["service"]
+        wait = state["wait"]
+        if pressure >= 0.9 or (service and wait > 2 * service):
+            return "saturated"
+        if pressure >= 0.6 or state["superseded"] or (service and wait > 0.5 * service):
+            return "busy"
+        if service and pressure < 0.25 and wait < 0.2 * service:
+            return "idle"
+        return "normal"
+
+    def has_service_time(self, sid):
+        state = self._clients.get(sid)
+        return state is not None and state["service"] is not None
+
+    def hint(self, sid, fallback_service=None):
+        """Recomendação atual para o cliente (fallback_service: tempo por quadro antes da primeira medição)"""
+        state = self._state(sid)
+        level = state["level"]
+        headroom, quality, max_size = self.levels[level]
+        service = state["service"] if state["service"] is not None else (fallback_service or self.default_service_time)
+        interval = min(self.max_interval, max(self.min_interval, service * 1000 * headroom))
+        return {"interval_ms": round(interval), "max_size": max_size, "jpeg_quality": quality, "level": level}
+
+    def should_push(self, sid, hint):
+        """
+        Indica se a recomendação mudou o bastante para enviar 'capture_hint'
+        (outro nível ou intervalo 25% diferente do último enviado), no máximo
+        uma vez por push_interval; a piora para "saturated" é enviada na hora.
+        """
+        state = self._state(sid)
+        last = state["last_hint"]
+        now = time.monotonic()
+        if last is not None:
+            changed = hint["level"] != last["level"] or abs(hint["interval_ms"] - last["interval_ms"]) > 0.25 * last["interval_ms"]
+            if not changed:
+                return False
+            if now - state["pushed_at"] < self.push_interval and hint["level"] != "saturated":
+                return False
+        state["last_hint"] = hint
+        state["pushed_at"] = now
+        self.hints_pushed += 1
+        return True
+
+    def drop_client(self, sid):
+        self._clients.pop(sid, None)
+
+    def client_state(self, sid):
+        return self._clients.get(sid)
+
+    def stats(self):
+        levels = defaultdict(int)
+        for state in self._clients.values():
+            if state["last_hint"] is not None:
+                levels[state["last_hint"]["level"]] += 1
+        return {
+            "clients": len(self._clients),
+            "hints_pushed": self.hints_pushed,
+            "clients_by_level": dict(levels)
+        }
@@ -0,0 +1,168 @@
+from tracking import box_iou
+
+class DeltaEncoder:
+    """
+    Codifica os resultados de cada cliente que ativou o protocolo delta.
+    Cada detecção recebe um id estável: 'qr:<dados>' para QR codes,
+    'obj:<track_id>' no modo de rastreamento e, fora dele, 'det:<n>',
+    associando as detecções às do quadro anterior por classe e IoU. O encoder
+    guarda o último estado enviado de cada detecção, que é o que o cliente
+    conhece, para montar as diferenças e os quadros-chave.
+    """
+    
+    def __init__(self, keyframe_interval, box_tolerance, confidence_tolerance, iou_threshold):
+        self.keyframe_interval = keyframe_interval
+        self.box_tolerance = box_tolerance
+        self.confidence_tolerance = confidence_tolerance
+        self.iou_threshold = iou_threshold  # IoU mínimo para manter o id de uma detecção fora do rastreamento
+        self._clients = {}
+        self.keyframes_sent = 0
+        self.deltas_sent = 0
+    
+    def enable(self, sid):
+        self._clients.setdefault(sid, {
+            'sent': {},  # id -> último estado enviado da detecção
+            'known': {},  # id -> campos conhecidos (ex.: onibusInfo), até o objeto sumir
+            'next_id': 1,
+            'messages_since_keyframe': 0,
+            'force_keyframe': True,
+            'delta_seq': 0
+        })
+    
+    def disable(self, sid):
+        self._clients.pop(sid, None)
+    
+    drop_client = disable
+    
+    def client_state(self, sid):
+        return self._clients.get(sid)
+    
+    def is_enabled(self, sid):
+        return sid in self._clients
+    
+    def request_keyframe(self, sid):
+        if sid in self._clients:
+            self._clients[sid]['force_keyframe'] = True
+    
+    def _assign_ids(self, state, detections):
+        """Atribui ids estáveis às detecções do quadro"""
+        identified = {}
+        pending = []
+        for detection in detections:
+            if 'qr_data' in detection:
+                identified[f"qr:{detection['qr_data']}"] = detection
+            elif 'track_id' in detection:
+                identified[f"obj:{detection['track_id']}"] = detection
+            else:
+                pending.append(detection)
+        
+        # Sem track_id: associa às detecções enviadas antes (mesma classe, maior IoU)
+        previous = {
+            detection_id: sent for detection_id, sent in state['sent'].items()
+            if detection_id.startswith("det:")
+        }
+        pairs = sorted(
+            (
+                (box_iou(sent['box'], detection['box']), detection_id, index)
+                for detection_id, sent in previous.items()
+                for index, detection in enumerate(pending)
+                if sent.get('label') == detection['label']
+            ),
+            reverse=True
+        )
+        matched = {}
+        for iou, detection_id, index in pairs:
+            if iou < self.iou_threshold:
+                break
+            if detection_id in identified or index in matched:
+                continue
+            matched[index] = detection_id
+            identified[detection_id] = pending[index]
+        
+        for index, detection in enumerate(pending):
+            if index not in matched:
+                identified[f"det:{state['next_id']}"] = detection
+                state['next_id'] += 1
+        return identified
+    
+    def _changed_fields(self, sent, detection):
+        """Campos da detecção que mudaram além das tolerâncias em relação ao estado enviado"""
+        changed = {}
+        for key, value in detection.items():
+            previous = sent.get(key)
+            if key == 'box' and previous is not None:
+                if max(abs(a - b) for a, b in zip(previous, value)) <= self.box_tolerance:
+                    continue
+            elif key == 'confidence' and previous is not None:
+                if abs(previous - value) <= self.confidence_tolerance:
+                    continue
+            elif previous == value:
+                continue
+            changed[key] = value
+        return changed
+    
+    def encode(self, sid, results):
+        """
+        Monta a mensagem 'detection_delta' de um resultado: quadro-chave com
+        todas as detecções ('detections') ou delta com 'added', 'changed'
+        (só os campos alterados) e 'removed' (ids).
+        """
+        state = self._clients[sid]
+        identified = self._assign_ids(state, results['detections'])
+        sent = state['sent']
+        
+        # Campos omitidos pelos rastreadores (ex.: onibusInfo de um QR code já
+        # anunciado) são completados com o que já se sabe da detecção
+        known = state['known']
+        for detection_id in [f"qr:{data}" for data in results.get('qr_lost', [])]:
+            known.pop(detection_id, None)
+        for detection_id in [f"obj:{track_id}" for track_id in results.get('objects_lost', [])]:
+            known.pop(detection_id, None)
+        for detection_id, detection in identified.items():
+            known[detection_id] = {**known.get(detection_id, {}), **detection}
+            identified[detection_id] = known[detection_id]
+        for detection_id in [detection_id for detection_id in known if detection_id.startswith("det:")]:
+            if detection_id not in identified:
+                del known[detection_id]
+        
+        keyframe = state['force_keyframe'] or state['messages_since_keyframe'] + 1 >= self.keyframe_interval
+        state['delta_seq'] += 1
+        message = {key: value for key, value in results.items() if key != 'detections'}
+        message.update(delta_seq=state['delta_seq'], keyframe=keyframe)
+        
+        if keyframe:
+            state['sent'] = {detection_id: dict(detection) for detection_id, detection in identified.items()}
+            message['detections'] = [
+                {'id': detection_id, **detection} for detection_id, detection in state['sent'].items()
+            ]
+            state['messages_since_keyframe'] = 0
+            state['force_keyframe'] = False
+            self.keyframes_sent += 1
+            return message
+        
+        added, changed = [], []
+        for detection_id, detection in identified.items():
+            if detection_id not in sent:
+                sent[detection_id] = dict(detection)
+                added.append({'id': detection_id, **detection})
+                continue
+            fields = self._changed_fields(sent[detection_id], detection)
+            if fields:
+                sent[detection_id].update(fields)
+                changed.append({'id': detection_id, **fields})
+        
+        removed = [detection_id for detection_id in sent if detection_id not in identified]
+        for detection_id in removed:
+            del sent[detection_id]
+        
+        message.update(added=added, changed=changed, removed=removed)
+        state['messages_since_keyframe'] += 1
+        self.deltas_sent += 1
+        return message
+    
+    def stats(self):
+        return {
+            "clients": len(self._clients),
+            "keyframes_sent": self.keyframes_sent,
+            "deltas_sent": self.deltas_sent
+        }
@@ -1,39 +1,41 @@
-import qrcode
 import json
 from PIL import Image
 import io
 import base64
 
+# Exemplos de dados para QR codes
+BUS_EXAMPLES = [
+    # Formato 1: Apenas número
+    "001",
+    
+    # Formato 2: JSON
+    {
+        "linha": "002",
+        "empresa": "Express Bus"
+    },
+    
+    # Formato 3: URL
+    "http://businfo.com?linha=101",
+    
+    # Formato 4: Número com letra
+    "201A"
+]
+
+def bus_example_payloads():
+    """Textos gravados nos QR codes de exemplo"""
+    # Converte dados para string se necessário
+    return [
+        json.dumps(bus_data, ensure_ascii=False) if isinstance(bus_data, dict) else str(bus_data)
+        for bus_data in BUS_EXAMPLES
+    ]
+
 def create_bus_qr_codes():
     """
     Cria QR codes de exemplo para linhas de ônibus
     """
+    import qrcode
     
-    # Exemplos de dados para QR codes
-    bus_examples = [
-        # Formato 1: Apenas número
-        "001",
-        
-        # Formato 2: JSON
-        {
-            "linha": "002",
-            "empresa": "Express Bus"
-        },
-        
-        # Formato 3: URL
-        "http://businfo.com?linha=101",
-        
-        # Formato 4: Número com letra
-        "201A"
-    ]
-    
-    for i, bus_data in enumerate(bus_examples):
-        # Converte dados para string se necessário
-        if isinstance(bus_data, dict):
-            qr_text = json.dumps(bus_data, ensure_ascii=False)
-        else:
-            qr_text = str(bus_data)
-        
+    for i, qr_text in enumerate(bus_example_payloads()):
         # Cria o QR code
         qr = qrcode.QRCode(
             version=1,
@@ -1,25 +1,37 @@
-import qrcode
 import json
 from PIL import Image
 import io
 import base64
 
+# Dados das linhas de ônibus da UFMG
+UFMG_LINES = [
+    "1",  # Linha 1 - Antônio Carlos - Fafich
+    "2",  # Linha 2 - Antônio Carlos - FACE
+    "3",  # Linha 3 - Carlos Luz - Fafich
+    "4",  # Linha 4 - BH Tec
+]
+
+# Dados das linhas em formato JSON
+UFMG_LINES_JSON = [
+    {"linha": "1", "universidade": "UFMG"},
+    {"linha": "2", "universidade": "UFMG"},
+    {"linha": "3", "universidade": "UFMG"},
+    {"linha": "4", "universidade": "UFMG"},
+]
+
+def ufmg_payloads():
+    """Textos gravados nos QR codes da UFMG (número da linha e JSON)"""
+    return UFMG_LINES + [json.dumps(line_data, ensure_ascii=False) for line_data in UFMG_LINES_JSON]
+
 def create_ufmg_bus_qr_codes():
     """
     Cria QR codes para as linhas de ônibus da UFMG
     """
-    
-    # Dados das linhas de ônibus da UFMG
-    ufmg_lines = [
-        "1",  # Linha 1 - Antônio Carlos - Fafich
-        "2",  # Linha 2 - Antônio Carlos - FACE
-        "3",  # Linha 3 - Carlos Luz - Fafich
-        "4",  # Linha 4 - BH Tec
-    ]
+    import qrcode
     
     print("Gerando QR codes das linhas de ônibus da UFMG...\n")
     
-    for line_number in ufmg_lines:
+    for line_number in UFMG_LINES:
         # Cria o QR code com apenas o número da linha
         qr = qrcode.QRCode(
             version=1,
@@ -54,18 +66,11 @@ def create_json_format_qr_codes():
     """
     Cria QR codes no formato JSON para as linhas da UFMG
     """
-    
-    # Dados das linhas em formato JSON
-    ufmg_lines_json = [
-        {"linha": "1", "universidade": "UFMG"},
-        {"linha": "2", "universidade": "UFMG"},
-        {"linha": "3", "universidade": "UFMG"},
-        {"linha": "4", "universidade": "UFMG"},
-    ]
+    import qrcode
     
     print("\nGerando QR codes no formato JSON...\n")
     
-    for i, line_data in enumerate(ufmg_lines_json, 1):
+    for i, line_data in enumerate(UFMG_LINES_JSON, 1):
         # Converte para JSON
         qr_text = json.dumps(line_data, ensure_ascii=False)
         
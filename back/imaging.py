@@ -0,0 +1,57 @@
+import cv2
+
+# Marcadores JPEG "Start Of Frame", que trazem as dimensões da imagem
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7, 0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+REDUCED_DECODE_MODES = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2),
+)
+
+def read_jpeg_size(buffer):
+    """
+    Lê (largura, altura) do header de um JPEG sem decodificar a imagem.
+    Retorna None se o buffer não for um JPEG ou o header não for encontrado.
+    """
+    view = memoryview(buffer)
+    if len(view) < 4 or view[0] != 0xFF or view[1] != 0xD8:
+        return None
+    
+    pos = 2
+    while pos + 9 < len(view):
+        if view[pos] != 0xFF:
+            return None
+        marker = view[pos + 1]
+        # Bytes de preenchimento 0xFF antes do marcador
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if marker in JPEG_SOF_MARKERS:
+            height = (view[pos + 5] << 8) | view[pos + 6]
+            width = (view[pos + 7] << 8) | view[pos + 8]
+            return width, height
+        segment_length = (view[pos + 2] << 8) | view[pos + 3]
+        pos += 2 + segment_length
+    
+    return None
+
+def choose_decode_mode(buffer, max_size):
+    """
+    Escolhe o modo de decodificação do OpenCV: para JPEGs grandes, usa a
+    decodificação em resolução reduzida (1/2, 1/4 ou 1/8) que ainda fica
+    com o maior lado >= max_size, evitando decodificar pixels descartados.
+    """
+    if max_size is None:
+        return cv2.IMREAD_COLOR
+    
+    size = read_jpeg_size(buffer)
+    if size is None:
+        return cv2.IMREAD_COLOR
+    
+    longest_side = max(size)
+    for factor, mode in REDUCED_DECODE_MODES:
+        if longest_side // factor >= max_size:
+            return mode
+    
+    return cv2.IMREAD_COLOR
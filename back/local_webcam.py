@@ -1,91 +1,231 @@
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+from collections import deque
+
 import cv2
-from ultralytics import YOLO
-
-# Carrega o modelo YOLOv8 pré-treinado. 
-# 'yolov8n.pt' é o modelo "nano", o mais rápido.
-# Para maior precisão (e menor velocidade), você pode usar 'yolov8s.pt' ou 'yolov8m.pt'.
-model = YOLO('yolov8n.pt')
-
-# O modelo foi treinado no dataset COCO, que possui 80 classes de objetos.
-# Vamos pegar os nomes dessas classes para podermos filtrar o que nos interessa.
-class_names = model.names
-
-# Estes são os IDs das classes que você quer detectar no dataset COCO:
-# 0: 'person', 1: 'bicycle', 2: 'car', 3: 'motorcycle', 5: 'bus', 7: 'truck', 6: 'train', 
-# 9: 'traffic light', 10: 'fire hydrant', 11: 'stop sign', 13: 'bench', 15: 'cat', 16: 'dog'
-classes_de_interesse = {
-    # Categorias de Veículos
-    1, 2, 3, 4, 5, 6, 7, 8,
-    # Categorias de Exterior
-    9, 10, 11, 12, 13,
-    # Categorias de Animais
-    14, 15, 16, 17, 18, 19, 20, 21, 22, 23,
-    # Categorias de Acessórios
-    24, 25, 26, 27, 28,
-    # Categorias de Esportes
-    29, 30, 31, 32, 33, 34, 35, 36, 37, 38,
-    # Categorias de Cozinha e Comida
-    39, 40, 41, 42, 43, 44, 45, 46, 47, 48, 49, 50, 51, 52, 53, 54, 55,
-    # Categorias de Mobília
-    56, 57, 58, 59, 60, 61, 62,
-    # Categorias de Eletrônicos
-    63, 64, 65, 66, 67, 68, 69, 70, 71, 72,
-    # Categorias de Objetos Internos
-    0, 73, 74, 75, 76, 77, 78, 79
-}
-
-# Inicia a captura de vídeo pela webcam (0 é geralmente a câmera padrão).
-cap = cv2.VideoCapture(0)
-
-# Verifica se a câmera foi aberta corretamente.
-if not cap.isOpened():
-    print("Erro: Não foi possível abrir a câmera.")
-    exit()
-
-# Loop principal para processar cada quadro do vídeo.
-while True:
-    # Lê um quadro da câmera.
-    success, frame = cap.read()
-    if not success:
-        print("Erro: Não foi possível ler o quadro da câmera.")
-        break
-
-    # Usa o modelo YOLO para detectar objetos no quadro.
-    results = model(frame, stream=True)
-
-    # Itera sobre cada objeto detectado no quadro.
-    for r in results:
-        boxes = r.boxes
-        for box in boxes:
-            # Pega o ID da classe do objeto (ex: 2 para 'car').
-            cls_id = int(box.cls[0])
-
-            # Verifica se a classe detectada é uma das que nos interessa.
-            if cls_id in classes_de_interesse:
-                # Obtém as coordenadas da caixa que delimita o objeto.
-                x1, y1, x2, y2 = map(int, box.xyxy[0])
-                
-                # Obtém o nome da classe e a confiança da detecção.
-                label = class_names[cls_id]
-                confidence = float(box.conf[0])
-                
-                # Para o backend, o mais importante é a informação textual.
-                # Esta lógica é onde você irá futuramente adicionar o alerta sonoro.
-                if confidence > 0.5: # Apenas considera detecções com mais de 50% de confiança.
-                    print(f"Objeto detectado: {label} com confiança de {confidence:.2f}")
-
-                # Desenha a caixa e o rótulo no quadro (para visualização e depuração).
-                cv2.rectangle(frame, (x1, y1), (x2, y2), (0, 255, 0), 2)
-                cv2.putText(frame, f'{label} {confidence:.2f}', (x1, y1 - 10),
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-
-    # Mostra o quadro processado em uma janela.
-    cv2.imshow("Detecção de Objetos - Pressione 'q' para sair", frame)
-
-    # Encerra o loop se a tecla 'q' for pressionada.
-    if cv2.waitKey(1) & 0xFF == ord('q'):
-        break
-
-# Libera a câmera e fecha todas as janelas.
-cap.release()
-cv2.destroyAllWindows()
\ No newline at end of file
+
+# Usa o mesmo modelo e o mesmo pipeline do servidor (YOLO no lote
+# compartilhado, QR codes com rastreamento, cache de resultados e, com
+# OBJECT_TRACKING=1, o rastreamento de objetos), no backend escolhido por
+# INFERENCE_BACKEND ("torch", "onnxruntime" ou "openvino").
+import main
+
+# Quadros guardados entre a captura e o processamento. Fila pequena: para
+# câmeras ao vivo vale mais processar o quadro mais recente do que todos
+INGEST_QUEUE_SIZE = 2
+
+def parse_source(value):
+    """Índice da câmera (ex.: "0"), arquivo de vídeo ou URL de stream (rtsp://, http://...)"""
+    return int(value) if value.isdigit() else value
+
+class FrameGrabber:
+    """
+    Thread de captura de uma fonte de vídeo. Lê os quadros no ritmo da fonte
+    e os guarda em uma fila limitada: se o processamento atrasar, o quadro
+    mais antigo é descartado, então a captura nunca trava a câmera e o
+    processamento sempre pega quadros recentes. Os quadros pulados por
+    skip_frames só são capturados (grab), sem decodificação.
+    """
+
+    def __init__(self, source, queue_size=INGEST_QUEUE_SIZE, skip_frames=0, realtime=True):
+        self.source = source
+        self.capture = cv2.VideoCapture(source)
+        if not self.capture.isOpened():
+            raise RuntimeError(f"Não foi possível abrir a fonte de vídeo {source}")
+
+        self.is_file = isinstance(source, str) and os.path.isfile(source)
+        self.fps = self.capture.get(cv2.CAP_PROP_FPS) or None
+        self.skip_frames = skip_frames
+        # Arquivos são lidos no ritmo do vídeo (como uma câmera) ou, sem
+        # realtime, o mais rápido possível e sem descartar quadros
+        self.realtime = realtime or not self.is_file
+        self.frames = deque()
+        self.queue_size = queue_size
+        self.condition = threading.Condition()
+        self.stopped = False
+        self.finished = False
+        self.frames_read = 0
+        self.frames_skipped = 0
+        self.frames_dropped = 0
+        self.thread = threading.Thread(target=self._run, name=f"captura-{source}", daemon=True)
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        with self.condition:
+            self.stopped = True
+            self.condition.notify_all()
+
+    def _run(self):
+        interval = 1 / self.fps if (self.fps and self.is_file and self.realtime) else 0
+        next_frame_at = time.perf_counter()
+        index = -1
+        try:
+            while not self.stopped:
+                if interval:
+                    delay = next_frame_at - time.perf_counter()
+                    if delay > 0:
+                        time.sleep(delay)
+                    next_frame_at += interval
+
+                if not self.capture.grab():
+                    break
+                index += 1
+                self.frames_read += 1
+                if index % (self.skip_frames + 1):
+                    self.frames_skipped += 1
+                    continue
+
+                success, frame = self.capture.retrieve()
+                if not success:
+                    break
+                item = {
+                    'frame_index': index,
+                    'captured_at': time.time(),
+                    'position_ms': self.capture.get(cv2.CAP_PROP_POS_MSEC) if self.is_file else None,
+                    'frame': frame
+                }
+
+                with self.condition:
+                    if not self.realtime:
+                        # Processamento offline de um arquivo: espera vaga na fila
+                        self.condition.wait_for(lambda: len(self.frames) < self.queue_size or self.stopped)
+                    elif len(self.frames) >= self.queue_size:
+                        self.frames.popleft()
+                        self.frames_dropped += 1
+                    self.frames.append(item)
+                    self.condition.notify_all()
+        finally:
+            self.capture.release()
+            with self.condition:
+                self.finished = True
+                self.condition.notify_all()
+
+    def get(self):
+        """Próximo quadro da fila (bloqueia); None quando a fonte acabou"""
+        with self.condition:
+            self.condition.wait_for(lambda: self.frames or self.finished or self.stopped)
+            if not self.frames or self.stopped:
+                return None
+            item = self.frames.popleft()
+            self.condition.notify_all()
+            return item
+
+async def ingest_source(sid, grabber, args, write):
+    """
+    Processa os quadros de uma fonte com o pipeline do servidor e escreve um
+    resultado por quadro processado. Cada fonte é um "cliente" próprio para o
+    rastreamento de QR codes, o rastreamento de objetos e o cache.
+    """
+    source = grabber.source
+    latencies = []
+    processed = 0
+    cached = 0
+    start = time.perf_counter()
+
+    main.sessions.open(sid)
+    grabber.start()
+    if args.duration:
+        asyncio.get_running_loop().call_later(args.duration, grabber.stop)
+    main.logger.info(f"Processando {source} ({grabber.fps or '?'} FPS)")
+    try:
+        while args.max_frames is None or processed < args.max_frames:
+            item = await asyncio.to_thread(grabber.get)
+            if item is None:
+                break
+
+            frame_start = time.perf_counter()
+            prepared = await main.run_blocking(main.prepare_decoded_frame, item['frame'])
+            analysis = await main.analyze_frame(sid, *prepared, use_cache=args.cache)
+            processed += 1
+            cached += bool(analysis.get('cached'))
+
+            result = {
+                'source': str(source),
+                'frame_index': item['frame_index'],
+                'timestamp': item['captured_at'],
+                **analysis,
+                'processing_time': time.perf_counter() - frame_start
+            }
+            if item['position_ms'] is not None:
+                result['position_ms'] = round(item['position_ms'], 1)
+            latency = time.time() - item['captured_at']
+            latencies.append(latency)
+            write(result)
+    finally:
+        grabber.stop()
+        main.sessions.close(sid)
+
+    elapsed = time.perf_counter() - start
+    summary = {
+        'source': str(source),
+        'source_fps': grabber.fps,
+        'frames_read': grabber.frames_read,
+        'frames_skipped': grabber.frames_skipped,
+        'frames_dropped': grabber.frames_dropped,
+        'frames_processed': processed,
+        'cache_hits': cached,
+        'elapsed_seconds': round(elapsed, 3),
+        'processed_fps': round(processed / elapsed, 2) if elapsed > 0 else 0.0
+    }
+    if latencies:
+        # Latência da captura do quadro até o resultado, incluindo a espera na fila
+        summary['latency_p50_ms'] = round(statistics.median(latencies) * 1000, 1)
+        summary['latency_p95_ms'] = round((statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]) * 1000, 1)
+    write({'summary': summary})
+    return summary
+
+async def run_ingestion(args):
+    # Abre as fontes antes de carregar o modelo, para falhar logo se alguma não existir
+    try:
+        grabbers = [FrameGrabber(source, args.queue_size, args.skip_frames, not args.no_realtime) for source in args.sources]
+    except RuntimeError as e:
+        sys.exit(str(e))
+
+    await main.start_inference()
+    if main.server_state != "ok":
+        sys.exit("Não foi possível carregar o modelo")
+
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+
+    def write(result):
+        out.write(json.dumps(result, ensure_ascii=False) + "\n")
+        out.flush()
+
+    try:
+        # Várias fontes (ex.: as câmeras de um terminal) compartilham os lotes do YOLO
+        summaries = await asyncio.gather(*(ingest_source(f"video:{position}", grabber, args, write) for position, grabber in enumerate(grabbers)))
+
+        for summary in summaries:
+            print(
+                f"{summary['source']}: {summary['frames_processed']} quadros processados de "
+                f"{summary['frames_read']} lidos ({summary['processed_fps']} quadros/s, "
+                f"{summary['frames_dropped']} descartados, {summary['frames_skipped']} pulados)",
+                file=sys.stderr
+            )
+    finally:
+        for grabber in grabbers:
+            grabber.stop()
+        if args.output:
+            out.close()
+        main.executor.shutdown(wait=False, cancel_futures=True)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Processa câmeras, vídeos ou streams (YOLO + QR) sem interface e gera JSON Lines")
+    parser.add_argument("sources", nargs="*", type=parse_source, default=[0], help="Índice da câmera, arquivo de vídeo ou URL de stream (padrão: câmera 0)")
+    parser.add_argument("--output", help="Arquivo JSON Lines de saída (padrão: saída padrão)")
+    parser.add_argument("--skip-frames", type=int, default=0, help="Quadros pulados entre dois processados")
+    parser.add_argument("--queue-size", type=int, default=INGEST_QUEUE_SIZE, help="Quadros guardados entre a captura e o processamento")
+    parser.add_argument("--no-realtime", action="store_true", help="Arquivos de vídeo: lê o mais rápido possível e processa todos os quadros, sem descartar")
+    parser.add_argument("--cache", action="store_true", help="Reaproveita resultados de quadros quase idênticos (CACHE_*); em câmeras fixas o fundo parado pode esconder objetos pequenos que entram na cena")
+    parser.add_argument("--max-frames", type=int, help="Para depois de processar N quadros de cada fonte")
+    parser.add_argument("--duration", type=float, help="Para depois de N segundos")
+    args = parser.parse_args()
+    asyncio.run(run_ingestion(args))
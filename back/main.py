@@ -1,63 +1,159 @@
+import argparse
+import asyncio
 import base64
+import contextvars
 import cv2
 import numpy as np
+import os
 import socketio
+import threading
 import uvicorn
 import time
-import hashlib
 import logging
 import json
-from fastapi import FastAPI
+import multiprocessing
+import shutil
+import statistics
+import zipfile
+from itertools import count
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from ultralytics import YOLO
 from collections import defaultdict
-from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from zoneinfo import ZoneInfo
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 from pyzbar import pyzbar
-from PIL import Image
+
+from bus_lines import BusLineStore, parse_departure
+from caching import ResultCache
+from capture import CaptureAdvisor
+from delta import DeltaEncoder
+from imaging import choose_decode_mode
+from metrics import PrometheusText, StageMetrics
+from scheduling import DeadlineExpired, LaneScheduler
+from sessions import SessionRegistry
+from tracking import ObjectTracker, QrTracker, box_iou, propagate_boxes
 
 # --- CONFIGURAÇÃO INICIAL ---
 # Configurar logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Dados das linhas de ônibus da UFMG
-BUS_LINES_DATA = {
-    "1": {
-        "numero": "1",
-        "nome": "Antônio Carlos - Fafich",
-        "empresa": "UFMG - Interno",
-        "tarifa": 0,
-        "horarios": ["06:30", "06:35", "06:40", "06:50", "07:10", "07:30", "07:35", "07:40", "07:50"],
-        "pontos_principais": ["Escola de Música", "Belas Artes", "CAD 2", "Letras", "Ciência da Informação", "FAFICH", "FACE", "Reitoria", "Praça de Serviços", "Biblioteca Universitária"]
-    },
-    "2": {
-        "numero": "2",
-        "nome": "Antônio Carlos - FACE",
-        "empresa": "UFMG - Interno",
-        "tarifa": 0,
-        "horarios": ["06:55", "07:30", "08:10", "08:05", "08:20", "08:30", "08:50"],
-        "pontos_principais": ["Escola de Música", "Belas Artes", "CAD 2", "Letras", "Ciência da Informação", "FAFICH", "FACE", "Reitoria", "Praça de Serviços", "Biblioteca Universitária", "EEFFTO"]
-    },
-    "3": {
-        "numero": "3",
-        "nome": "Carlos Luz - Fafich",
-        "empresa": "UFMG - Interno",
-        "tarifa": 0,
-        "horarios": ["06:40", "07:20", "08:00", "08:20", "08:20", "09:00", "09:20"],
-        "pontos_principais": ["Escola de Música", "Belas Artes", "Creche", "Centro Pedagógico", "FAE", "Setorial I", "Geociências", "Engenharia", "Praça de Serviços", "FAFICH"]
-    },
-    "4": {
-        "numero": "4",
-        "nome": "BH Tec",
-        "empresa": "UFMG - Interno",
-        "tarifa": 0,
-        "horarios": ["07:00", "07:20", "08:05", "09:00", "09:40", "09:50", "10:40"],
-        "pontos_principais": ["Escola de Música", "Belas Artes", "Creche", "Centro Pedagógico", "FAE", "Engenharia", "Reitoria", "BH Tec", "EEFFTO", "McDonald's"]
-    }
+def parse_startup_args():
+    """
+    Flags de inicialização para `python main.py`. Com `uvicorn main:app`
+    as mesmas opções são lidas das variáveis de ambiente.
+    """
+    parser = argparse.ArgumentParser(description="Servidor de detecção Visão Assistida")
+    parser.add_argument("--int8", action="store_true", help="Serve o modelo quantizado INT8 (ONNX Runtime)")
+    parser.add_argument("--calibration-dir", help="Pasta de quadros para calibrar o modelo INT8 na primeira execução")
+    parser.add_argument("--workers", type=int, help="Serve com N processos de inferência compartilhando os pesos do modelo")
+    parser.add_argument("--warmup-runs", type=int, help="Inferências de aquecimento por worker antes de aceitar tráfego")
+    args, _ = parser.parse_known_args()
+    return args
+
+startup_args = parse_startup_args() if __name__ == "__main__" else None
+
+# Base de linhas de ônibus: arquivo JSON ou CSV local, recarregado quando muda.
+# As consultas são feitas no processo principal (também com --workers), que é
+# onde a recarga acontece
+BUS_LINES_FILE = os.getenv("BUS_LINES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "bus_lines.json"))
+BUS_LINES_RELOAD_INTERVAL = float(os.getenv("BUS_LINES_RELOAD_INTERVAL", "2.0"))  # segundos
+BUS_TIMEZONE = os.getenv("BUS_TIMEZONE", "America/Sao_Paulo")  # fuso dos quadros de horários
+NEXT_DEPARTURES_COUNT = 3  # próximas partidas enviadas junto com o resultado de um QR code
+bus_lines = BusLineStore(BUS_LINES_FILE, ZoneInfo(BUS_TIMEZONE))
+bus_lines.load()
+
+# Maior lado da imagem usada no processamento em tempo real
+REALTIME_MAX_SIZE = 640
+
+# Backend de inferência: "torch" (PyTorch eager), "onnxruntime" ou "openvino".
+# Os backends exportados são gerados a partir dos pesos na primeira execução
+# e reaproveitados de MODEL_CACHE_DIR nas seguintes.
+INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+MODEL_WEIGHTS = os.getenv("MODEL_WEIGHTS", "yolov8n.pt")
+MODEL_CACHE_DIR = os.getenv("MODEL_CACHE_DIR", "model_cache")
+# Precisão do modelo: "fp32" ou "int8" (quantização estática, só com onnxruntime)
+MODEL_PRECISION = "int8" if startup_args and startup_args.int8 else os.getenv("MODEL_PRECISION", "fp32")
+CALIBRATION_DIR = (startup_args and startup_args.calibration_dir) or os.getenv("CALIBRATION_DIR")
+EXPORT_FORMATS = {
+    "onnxruntime": ("onnx", ".onnx"),
+    "openvino": ("openvino", "_openvino_model"),
 }
 
-# Carrega o modelo YOLO
-model = YOLO('yolov8n.pt')
-class_names = model.names
+def resolve_model_path(backend, precision="fp32"):
+    """
+    Retorna o caminho do modelo para o backend escolhido, exportando os
+    pesos PyTorch e guardando o artefato no cache se ele ainda não existir.
+    """
+    if precision == "int8":
+        return resolve_int8_model_path(backend)
+    
+    if backend == "torch":
+        return MODEL_WEIGHTS
+    
+    if backend not in EXPORT_FORMATS:
+        raise ValueError(f"Backend de inferência desconhecido: {backend}")
+    
+    export_format, suffix = EXPORT_FORMATS[backend]
+    stem = os.path.splitext(os.path.basename(MODEL_WEIGHTS))[0]
+    artifact_path = os.path.join(MODEL_CACHE_DIR, stem + suffix)
+    
+    if not os.path.exists(artifact_path):
+        logger.info(f"Exportando {MODEL_WEIGHTS} para {backend} (primeira execução)...")
+        # dynamic=True mantém o batch e o tamanho de entrada variáveis (batching dinâmico)
+        exported_path = YOLO(MODEL_WEIGHTS).export(
+            format=export_format,
+            imgsz=REALTIME_MAX_SIZE,
+            dynamic=True
+        )
+        os.makedirs(MODEL_CACHE_DIR, exist_ok=True)
+        shutil.move(str(exported_path), artifact_path)
+        logger.info(f"Modelo exportado para {artifact_path}")
+    
+    return artifact_path
+
+def resolve_int8_model_path(backend):
+    """
+    Retorna o modelo INT8, quantizando o ONNX FP32 com os quadros de
+    CALIBRATION_DIR se ele ainda não estiver no cache.
+    """
+    if backend != "onnxruntime":
+        raise ValueError("O modelo INT8 só é suportado com INFERENCE_BACKEND=onnxruntime")
+    
+    fp32_path = resolve_model_path(backend)
+    int8_path = os.path.splitext(fp32_path)[0] + "_int8.onnx"
+    
+    if not os.path.exists(int8_path):
+        if not CALIBRATION_DIR:
+            raise ValueError(f"{int8_path} não existe: informe CALIBRATION_DIR (ou --calibration-dir) para gerá-lo")
+        
+        # Import tardio: a quantização só é necessária ao gerar o modelo INT8
+        from quantize_model import quantize_int8
+        quantize_int8(fp32_path, int8_path, CALIBRATION_DIR)
+    
+    return int8_path
+
+# O modelo YOLO é carregado e aquecido no startup do servidor (ver start_inference)
+MODEL_PATH = None
+model = None
+class_names = {}
+# Inferências de aquecimento por worker, na resolução servida, antes de o /health ficar "ok"
+WARMUP_RUNS = (
+    startup_args.warmup_runs
+    if startup_args and startup_args.warmup_runs is not None
+    else int(os.getenv("WARMUP_RUNS", "3"))
+)
+# Estados: starting -> loading -> warming -> ok (ou error)
+server_state = "starting"
+model_loaded = asyncio.Event()
+model_ready = asyncio.Event()
+model_failed = asyncio.Event()
+
+class ModelUnavailable(Exception):
+    """O modelo não pôde ser carregado ou aquecido (server_state "error")"""
+
 classes_de_interesse = {
     # Categorias de Veículos
     1, 2, 3, 4, 5, 6, 7, 8,
@@ -79,17 +175,207 @@ classes_de_interesse = {
     0, 73, 74, 75, 76, 77, 78, 79
 }
 
-# Rate limiting e cache
-client_last_request = defaultdict(float)
-MIN_REQUEST_INTERVAL = 1.0  # 1 segundo mínimo entre requests
-result_cache = {}
+# Filtros repassados ao próprio modelo, para o NMS já descartar os demais candidatos
+CONFIDENCE_THRESHOLD = 0.5
+CLASSES_DE_INTERESSE_IDS = sorted(classes_de_interesse)
+# Tabela classe -> interesse, para filtrar todas as caixas de uma vez (montada em load_model)
+classes_de_interesse_mask = None
+
+# Sessões: o estado de cada cliente (caixa de entrada com o quadro mais
+# recente, rastreamentos, cache, protocolo delta...) é criado no connect e
+# liberado no disconnect. Sessões sem atividade há SESSION_IDLE_TIMEOUT
+# segundos são encerradas por uma varredura periódica e, com MAX_SESSIONS
+# sessões abertas, a menos ativa é encerrada para abrir espaço
+SESSION_IDLE_TIMEOUT = float(os.getenv("SESSION_IDLE_TIMEOUT", "300"))
+MAX_SESSIONS = int(os.getenv("MAX_SESSIONS", "1000"))
+SESSION_SWEEP_INTERVAL = 30.0  # segundos entre duas varreduras
+frames_superseded = 0
+frames_processed = 0
+# Imagens descartadas antes da inferência, pelo motivo enviado ao cliente:
+# server_busy (fila de QR cheia ou modelo indisponível), deadline_expired
+# (prazo vencido esperando vaga) e superseded (quadro substituído por um mais novo)
+frames_dropped = {"server_busy": 0, "deadline_expired": 0, "superseded": 0}
+frame_errors = 0
+
+# Pré-filtro de QR: o pyzbar só roda em volta dos padrões de localização
+# (os três quadrados dos cantos) achados por limiarização e contornos;
+# quadros sem candidatos não passam pela decodificação
+QR_PREFILTER = os.getenv("QR_PREFILTER", "1") == "1"
+QR_ROI_MARGIN = 0.2  # margem em volta do candidato, proporcional ao seu tamanho
+QR_CANDIDATE_MAX_SIZE = 1920  # acima disso a busca roda em uma cópia reduzida; abaixo, na resolução do quadro
+QR_FINDER_MIN_SIZE = 6  # lado mínimo, em px, de um padrão de localização
+QR_THRESHOLD_BLOCK = 31  # vizinhança da limiarização adaptativa
+qr_scan_stats = {
+    "frames_scanned": 0,
+    "full_decode_skipped": 0,
+    "frames_without_candidates": 0,
+    "roi_fallbacks": 0,
+    "tracked_frames": 0
+}
+
+# Rastreamento de QR codes por cliente: a caixa de um código já lido é
+# conferida primeiro no quadro seguinte, e as informações da linha só são
+# enviadas quando o código aparece
+QR_TRACK_MAX_MISSES = int(os.getenv("QR_TRACK_MAX_MISSES", "2"))  # quadros sem o código até ele sumir
+QR_TRACK_RESCAN_FRAMES = int(os.getenv("QR_TRACK_RESCAN_FRAMES", "10"))  # varredura completa periódica
+
+# Modo de rastreamento de objetos: o YOLO roda a cada TRACK_DETECT_INTERVAL
+# quadros (ou quando a cena muda) e, entre eles, as caixas são propagadas por
+# fluxo óptico, com IDs estáveis por cliente
+OBJECT_TRACKING = os.getenv("OBJECT_TRACKING", "0") == "1"
+TRACK_DETECT_INTERVAL = int(os.getenv("TRACK_DETECT_INTERVAL", "5"))
+TRACK_SCENE_CHANGE_HAMMING = int(os.getenv("TRACK_SCENE_CHANGE_HAMMING", "12"))  # bits de dHash em relação ao último quadro detectado
+TRACK_IOU_THRESHOLD = 0.3  # IoU mínimo para associar uma detecção a um objeto rastreado
+TRACK_MAX_MISSES = 1  # detecções seguidas em que um objeto pode faltar antes de ser descartado
+TRACK_FLOW_MAX_SIZE = 320  # o fluxo óptico roda em uma cópia reduzida do quadro
+
+# Protocolo delta (opcional, por cliente): em vez de 'detection_results', o
+# cliente recebe 'detection_delta' só com as detecções adicionadas, removidas
+# e alteradas, com um quadro-chave completo a cada DELTA_KEYFRAME_INTERVAL mensagens
+DELTA_KEYFRAME_INTERVAL = int(os.getenv("DELTA_KEYFRAME_INTERVAL", "30"))
+DELTA_BOX_TOLERANCE = int(os.getenv("DELTA_BOX_TOLERANCE", "4"))  # pixels de deslocamento ignorados
+DELTA_CONFIDENCE_TOLERANCE = 0.05
+
+# Captura adaptativa: o servidor recomenda a cada cliente o intervalo entre
+# capturas, a resolução máxima e a qualidade JPEG conforme a carga
+# ('capture_hint' e campo capture_hint de detection_results)
+ADAPTIVE_CAPTURE = os.getenv("ADAPTIVE_CAPTURE", "1") == "1"
+CAPTURE_MIN_INTERVAL_MS = int(os.getenv("CAPTURE_MIN_INTERVAL_MS", "250"))
+CAPTURE_MAX_INTERVAL_MS = int(os.getenv("CAPTURE_MAX_INTERVAL_MS", "3000"))
+CAPTURE_DEFAULT_SERVICE_TIME = 0.5  # segundos por quadro antes de haver medições
+CAPTURE_HINT_PUSH_INTERVAL = 1.0  # segundos mínimos entre dois 'capture_hint' para o mesmo cliente
+CAPTURE_RECOVERY_FRAMES = 5  # quadros seguidos com carga menor até o cliente poder acelerar
+
+# Cache de resultados
 CACHE_SIZE = 100
+CACHE_ENTRIES_PER_CLIENT = int(os.getenv("CACHE_ENTRIES_PER_CLIENT", "8"))
+# Quadros seguidos quase idênticos (até 2 dos 64 bits do dHash diferentes, ruído
+# do sensor ou da compressão) reaproveitam o resultado, mas só por meio segundo:
+# com tolerância ou validade maiores, clientes ao vivo recebem detecções de uma
+# cena que já mudou. CACHE_MAX_HAMMING=0 só aceita o mesmo dHash
+CACHE_TTL = float(os.getenv("CACHE_TTL", "0.5"))  # segundos
+CACHE_MAX_HAMMING = int(os.getenv("CACHE_MAX_HAMMING", "2"))  # bits de diferença tolerados no dHash
+
+# Pool de inferência: decodificação, YOLO e QR rodam fora do event loop
+INFERENCE_POOL = os.getenv("INFERENCE_POOL", "thread")  # "thread" ou "process"
+INFERENCE_WORKERS = int(os.getenv("INFERENCE_WORKERS", "4"))
+if startup_args and startup_args.workers:
+    # --workers N: N processos de inferência atrás de um único processo Socket.IO
+    INFERENCE_POOL = "process"
+    INFERENCE_WORKERS = startup_args.workers
+# Backpressure: máximo de quadros em processamento ou aguardando o pool
+MAX_PENDING_INFERENCES = int(os.getenv("MAX_PENDING_INFERENCES", str(INFERENCE_WORKERS * 2)))
+
+# Escalonador das vagas do pool: leituras de QR code (process_qrcode e
+# /process-qrcode, só o pyzbar) e quadros completos (process_frame, YOLO + QR)
+# ficam em filas separadas, com pesos, e QR_RESERVED_SLOTS vagas só para QR.
+# As leituras rodam em QR_WORKERS threads próprias, sem esperar atrás do YOLO.
+# Prazos (deadline_ms do cliente ou os padrões abaixo, 0 = sem prazo)
+# descartam pedidos que ficaram velhos esperando, antes da inferência
+QR_WORKERS = int(os.getenv("QR_WORKERS", "1"))
+QR_LANE_WEIGHT = int(os.getenv("QR_LANE_WEIGHT", "4"))
+FRAME_LANE_WEIGHT = int(os.getenv("FRAME_LANE_WEIGHT", "1"))
+QR_RESERVED_SLOTS = int(os.getenv("QR_RESERVED_SLOTS", "1"))
+FRAME_DEADLINE_MS = float(os.getenv("FRAME_DEADLINE_MS", "0"))
+QR_DEADLINE_MS = float(os.getenv("QR_DEADLINE_MS", "0"))
+
+# Processamento em lote (back-office): imagens em processamento ao mesmo tempo
+# por lote, e a pasta do servidor de onde um lote pode ler imagens ou zips
+# (sem ela, o endpoint só aceita uploads)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", str(INFERENCE_WORKERS * 2)))
+BATCH_INPUT_DIR = os.getenv("BATCH_INPUT_DIR")
+BATCH_MAX_FILES = 100000  # arquivos por upload multipart
+BATCH_IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+# Os lotes disputam as vagas do pool na fila "batch", com no máximo
+# BATCH_MAX_SLOTS vagas: um lote grande não tira o pool dos clientes ao vivo
+BATCH_LANE_WEIGHT = int(os.getenv("BATCH_LANE_WEIGHT", "1"))
+BATCH_MAX_SLOTS = int(os.getenv("BATCH_MAX_SLOTS", str(max(1, MAX_PENDING_INFERENCES // 4))))
+
+# Métricas: latência de cada etapa do pipeline (histogramas do /metrics) e,
+# com FRAME_TIMINGS=1, o detalhamento por etapa em cada detection_results
+STAGE_METRICS = os.getenv("STAGE_METRICS", "1") == "1"
+FRAME_TIMINGS = os.getenv("FRAME_TIMINGS", "0") == "1"
+COLLECT_STAGE_TIMINGS = STAGE_METRICS or FRAME_TIMINGS
+stage_metrics = StageMetrics(STAGE_METRICS)
+# Etapas do quadro em processamento na tarefa atual (só com FRAME_TIMINGS)
+frame_timings = contextvars.ContextVar("frame_timings", default=None)
+
+# Cada thread do pool usa sua própria instância do modelo
+# (o predictor do ultralytics não é thread-safe)
+_thread_state = threading.local()
+
+def init_inference_process(num_threads):
+    """
+    Inicializa um processo do pool de inferência. Com fork, o processo herda o
+    modelo já carregado pelo processo principal e usa os mesmos pesos
+    (copy-on-write) em vez de carregar outra cópia.
+    """
+    import torch
+    # Divide os núcleos entre os processos para não haver disputa de threads.
+    # Precisa vir antes da primeira operação: o processo principal não roda
+    # inferência antes do fork, então o pool de threads do PyTorch e do OpenCV
+    # ainda não existe e é criado aqui já com o tamanho certo
+    os.environ["OMP_NUM_THREADS"] = str(num_threads)
+    torch.set_num_threads(num_threads)
+    cv2.setNumThreads(num_threads)
+    
+    if model is None:
+        # spawn (Windows/macOS) ou pool iniciado antes do startup: carrega o próprio modelo
+        load_model(validate=False)
+    
+    # Os backends exportados (ONNX Runtime/OpenVINO) não são seguros após fork:
+    # cada processo abre sua própria sessão a partir do arquivo em cache
+    if INFERENCE_BACKEND == "torch":
+        _thread_state.model = model
 
-# Pool de threads para processamento CPU-intensivo
-executor = ThreadPoolExecutor(max_workers=4)
+if INFERENCE_POOL == "process":
+    start_method = "fork" if "fork" in multiprocessing.get_all_start_methods() else None
+    executor = ProcessPoolExecutor(
+        max_workers=INFERENCE_WORKERS,
+        mp_context=multiprocessing.get_context(start_method),
+        initializer=init_inference_process,
+        initargs=(max(1, (os.cpu_count() or 1) // INFERENCE_WORKERS),)
+    )
+else:
+    executor = ThreadPoolExecutor(max_workers=INFERENCE_WORKERS, thread_name_prefix="inference")
+# Fila de QR: o pyzbar e o OpenCV liberam o GIL, então threads bastam também com INFERENCE_POOL=process
+qr_executor = ThreadPoolExecutor(max_workers=QR_WORKERS, thread_name_prefix="qr")
+
+scheduler = LaneScheduler(
+    MAX_PENDING_INFERENCES,
+    {"qr": QR_LANE_WEIGHT, "frame": FRAME_LANE_WEIGHT, "batch": BATCH_LANE_WEIGHT},
+    {
+        "frame": max(1, MAX_PENDING_INFERENCES - QR_RESERVED_SLOTS),
+        "batch": max(1, min(BATCH_MAX_SLOTS, MAX_PENDING_INFERENCES - QR_RESERVED_SLOTS))
+    },
+    # Só as leituras de QR são recusadas com a fila cheia: quadros completos
+    # ficam na caixa de entrada do cliente e lotes esperam a vez
+    {"qr": MAX_PENDING_INFERENCES}
+)
+
+# Carga por worker do pool (tarefas e tempo ocupado), exibida no /config
+worker_stats = {}
+pool_started_at = time.time()
+
+# Batching dinâmico: quadros de vários clientes viram uma única chamada do YOLO
+BATCH_MAX_SIZE = int(os.getenv("BATCH_MAX_SIZE", "8"))
+BATCH_WAIT_MS = float(os.getenv("BATCH_WAIT_MS", "10"))
 
 # Cria a aplicação FastAPI
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app):
+    """Ciclo de vida do servidor: carrega e aquece o modelo em segundo plano"""
+    startup_task = asyncio.create_task(start_inference())
+    bus_lines_task = asyncio.create_task(bus_lines.watch(BUS_LINES_RELOAD_INTERVAL))
+    sweep_task = asyncio.create_task(sweep_idle_sessions(SESSION_SWEEP_INTERVAL))
+    yield
+    startup_task.cancel()
+    bus_lines_task.cancel()
+    sweep_task.cancel()
+    executor.shutdown(wait=False, cancel_futures=True)
+    qr_executor.shutdown(wait=False, cancel_futures=True)
+
+app = FastAPI(lifespan=lifespan)
 
 # Cria o servidor Socket.IO e o anexa ao FastAPI
 sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', max_http_buffer_size=10000000)
@@ -100,91 +386,640 @@ socket_app = socketio.ASGIApp(sio)
 # Endpoint de health check para verificar se o servidor está rodando
 @app.get("/health")
 async def health_check():
-    return {
-        "status": "ok", 
-        "message": "Servidor está rodando",
+    # Enquanto o modelo não estiver aquecido responde 503, para o balanceador
+    # de carga só encaminhar tráfego a instâncias prontas
+    content = {
+        "status": server_state, 
+        "message": "Servidor está rodando" if server_state == "ok" else "Servidor iniciando o modelo",
         "timestamp": time.time(),
         "model_loaded": model is not None,
-        "cache_size": len(result_cache)
+        "cache_size": len(result_cache),
+        "cache": result_cache.stats(),
+        "pending_inferences": scheduler.in_use,
+        "sessions": sessions.stats()
     }
+    return JSONResponse(status_code=200 if server_state == "ok" else 503, content=content)
 
 # Endpoint para configurar parâmetros de tempo real
 @app.get("/config")
 async def get_config():
+    activity = sessions.activity()
     return {
-        "min_request_interval": MIN_REQUEST_INTERVAL,
+        "clients_processing": activity["processing"],
+        "clients_with_pending_frame": activity["with_pending_frame"],
+        "frames_superseded": frames_superseded,
         "cache_size": CACHE_SIZE,
-        "max_workers": executor._max_workers,
-        "current_cache_entries": len(result_cache)
+        "cache_entries_per_client": CACHE_ENTRIES_PER_CLIENT,
+        "cache_ttl": CACHE_TTL,
+        "cache_max_hamming": CACHE_MAX_HAMMING,
+        "inference_backend": INFERENCE_BACKEND,
+        "model_precision": MODEL_PRECISION,
+        "model_path": MODEL_PATH,
+        "inference_pool": INFERENCE_POOL,
+        "max_workers": INFERENCE_WORKERS,
+        "max_pending_inferences": MAX_PENDING_INFERENCES,
+        "pending_inferences": scheduler.in_use,
+        "scheduler": scheduler.stats(),
+        "current_cache_entries": len(result_cache),
+        "batching": yolo_batcher.stats(),
+        "qr_prefilter": {"enabled": QR_PREFILTER, **qr_scan_stats},
+        "qr_tracking": qr_tracker.stats(),
+        "object_tracking": {"enabled": OBJECT_TRACKING, "detect_interval": TRACK_DETECT_INTERVAL, **object_tracker.stats()},
+        "bus_lines": bus_lines.stats(),
+        "delta_protocol": {"keyframe_interval": DELTA_KEYFRAME_INTERVAL, **delta_encoder.stats()},
+        "adaptive_capture": {
+            "enabled": ADAPTIVE_CAPTURE,
+            "min_interval_ms": CAPTURE_MIN_INTERVAL_MS,
+            "max_interval_ms": CAPTURE_MAX_INTERVAL_MS,
+            **capture_advisor.stats()
+        },
+        "stage_latency": {"enabled": STAGE_METRICS, "frame_timings": FRAME_TIMINGS, "stages": stage_metrics.summary()},
+        "workers": get_worker_load()
     }
 
+# Métricas no formato texto do Prometheus
+@app.get("/metrics")
+async def get_metrics():
+    out = PrometheusText()
+    out.gauge("visao_ready", "1 quando o modelo está carregado e aquecido", server_state == "ok")
+    activity = sessions.activity()
+    out.gauge("visao_connected_clients", "Clientes Socket.IO conectados", len(sessions))
+    out.gauge("visao_clients_processing", "Clientes com um quadro em processamento", activity["processing"])
+    out.gauge("visao_pending_frames", "Clientes com um quadro aguardando na caixa de entrada", activity["with_pending_frame"])
+    out.gauge("visao_session_bytes", "Memória aproximada do estado das sessões, em bytes (medida na varredura das sessões)", sessions.approx_bytes)
+    out.header("visao_sessions_closed_total", "counter", "Sessões encerradas pelo servidor")
+    out.sample("visao_sessions_closed_total", sessions.closed_idle, {"reason": "idle"})
+    out.sample("visao_sessions_closed_total", sessions.closed_full, {"reason": "max_sessions"})
+    out.gauge("visao_pending_inferences", "Pedidos com uma vaga no pool de inferência", scheduler.in_use)
+    out.gauge("visao_max_pending_inferences", "Vagas do pool de inferência", MAX_PENDING_INFERENCES)
+    out.gauge("visao_yolo_queued_frames", "Quadros aguardando o próximo lote do YOLO", len(yolo_batcher._queue))
+    out.counter("visao_yolo_batches_total", "Lotes executados pelo YOLO", yolo_batcher.batches_run)
+    out.counter("visao_yolo_batch_frames_total", "Quadros processados nos lotes do YOLO", yolo_batcher.frames_processed)
+    out.counter("visao_frames_processed_total", "Quadros de process_frame com resultado enviado", frames_processed)
+    out.counter("visao_frames_superseded_total", "Quadros substituídos por um mais novo do mesmo cliente", frames_superseded)
+    out.header("visao_frames_dropped_total", "counter", "Imagens descartadas antes da inferência, por motivo")
+    for reason, dropped in frames_dropped.items():
+        out.sample("visao_frames_dropped_total", dropped, {"reason": reason})
+    out.counter("visao_frame_errors_total", "Quadros que terminaram em detection_error", frame_errors)
+    
+    cache_lookups = result_cache.hits + result_cache.misses
+    out.counter("visao_cache_hits_total", "Acertos do cache de resultados", result_cache.hits)
+    out.counter("visao_cache_misses_total", "Faltas do cache de resultados", result_cache.misses)
+    out.gauge("visao_cache_hit_ratio", "Taxa de acerto do cache de resultados", result_cache.hits / cache_lookups if cache_lookups else 0.0)
+    out.gauge("visao_cache_entries", "Entradas no cache de resultados", len(result_cache))
+    
+    out.header("visao_worker_jobs_total", "counter", "Tarefas executadas por worker do pool de inferência")
+    for worker, stats in worker_stats.items():
+        out.sample("visao_worker_jobs_total", stats["jobs"], {"worker": worker})
+    out.header("visao_worker_busy_seconds_total", "counter", "Tempo ocupado de cada worker do pool de inferência")
+    for worker, stats in worker_stats.items():
+        out.sample("visao_worker_busy_seconds_total", stats["busy_seconds"], {"worker": worker})
+    
+    out.counter("visao_capture_hints_pushed_total", "Eventos capture_hint enviados aos clientes", capture_advisor.hints_pushed)
+    
+    scheduler.write_prometheus(out)
+    stage_metrics.write_prometheus(out, "visao_stage_duration_seconds")
+    return PlainTextResponse(out.render(), media_type="text/plain; version=0.0.4")
+
+# Consulta da base de linhas de ônibus
+@app.get("/bus-lines/{numero}")
+async def get_bus_line(numero: str):
+    line = bus_lines.get(numero)
+    if line is None:
+        return JSONResponse(status_code=404, content={"error": f"Linha {numero} não encontrada"})
+    return line
+
+@app.get("/bus-lines/{numero}/next-departures")
+async def get_next_departures(numero: str, n: int = NEXT_DEPARTURES_COUNT, agora: str = None):
+    """Próximas n partidas da linha (a partir de agora ou do horário "HH:MM" em agora)"""
+    if bus_lines.get(numero) is None:
+        return JSONResponse(status_code=404, content={"error": f"Linha {numero} não encontrada"})
+    now = parse_departure(agora) if agora else None
+    if agora and now is None:
+        return JSONResponse(status_code=400, content={"error": "Horário inválido, use HH:MM"})
+    return {"numero": numero, "proximas_partidas": bus_lines.next_departures(numero, now, n)}
+
+@app.get("/next-departures")
+async def get_next_departures_at_stop(parada: str, n: int = 5, agora: str = None):
+    """Próximas n partidas de todas as linhas que passam pela parada"""
+    now = parse_departure(agora) if agora else None
+    if agora and now is None:
+        return JSONResponse(status_code=400, content={"error": "Horário inválido, use HH:MM"})
+    return {"parada": parada, "proximas_partidas": bus_lines.next_departures_at_stop(parada, now, n)}
+
+@app.get("/bus-lines")
+async def search_bus_lines(parada: str = None, empresa: str = None):
+    """Busca as linhas que passam por uma parada e/ou são de uma empresa"""
+    if parada is None and empresa is None:
+        return bus_lines.stats()
+    
+    results = bus_lines.lines_at_stop(parada) if parada is not None else bus_lines.lines_by_company(empresa)
+    if parada is not None and empresa is not None:
+        numbers = {line["numero"] for line in bus_lines.lines_by_company(empresa)}
+        results = [line for line in results if line["numero"] in numbers]
+    return {"total": len(results), "linhas": results}
+
 # Endpoint para limpar cache manualmente
 @app.post("/clear-cache")
 async def clear_cache():
-    global result_cache
     result_cache.clear()
     logger.info("Cache limpo manualmente")
     return {"status": "ok", "message": "Cache limpo com sucesso"}
 
 # Endpoint para processar QR codes
 @app.post("/process-qrcode")
-async def process_qrcode_endpoint(data: dict):
+async def process_qrcode_endpoint(request: Request):
     """
-    Endpoint REST para processar QR codes de imagens
+    Endpoint REST para processar QR codes de imagens.
+    Aceita JSON {"image": "<base64>"}, o arquivo binário no corpo
+    (application/octet-stream ou image/*) ou upload multipart (campo "image").
+    O header X-Deadline-Ms define o prazo para a leitura começar.
     """
+    received_at = time.time()
+    if inference_pool_saturated("qr"):
+        frames_dropped["server_busy"] += 1
+        return JSONResponse(status_code=503, content={"error": "Servidor ocupado, tente novamente"})
+
     try:
-        # Decodifica a imagem base64
-        image_data = base64.b64decode(data['image'])
-        nparr = np.frombuffer(image_data, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        image_data = await read_image_from_request(request)
+        if image_data is None:
+            return {"error": "Nenhuma imagem enviada"}
+        
+        client = f"rest:{request.client.host}" if request.client else "rest"
+        deadline = request_deadline(received_at, request.headers.get("x-deadline-ms"), QR_DEADLINE_MS)
+        try:
+            qr_codes = await run_in_inference_pool(run_qrcode_pipeline, image_data, lane="qr", sid=client, deadline=deadline)
+        except DeadlineExpired:
+            frames_dropped["deadline_expired"] += 1
+            return JSONResponse(status_code=503, content={"error": "Prazo esgotado antes da leitura, tente novamente"})
         
-        if frame is None:
+        if qr_codes is None:
             return {"error": "Não foi possível decodificar a imagem"}
         
-        # Processa QR codes
-        qr_results = decode_qr_codes(frame)
+        result = attach_bus_info(qr_codes)
         
-        if not qr_results:
+        if not result:
             return {
                 "qr_codes_found": False,
                 "message": "Nenhum QR code encontrado na imagem"
             }
         
-        # Processa informações das linhas de ônibus
-        bus_info_results = []
-        for qr_result in qr_results:
-            bus_info = get_bus_line_info(qr_result['data'])
-            bus_info_results.append({
-                "qr_data": qr_result['data'],
-                "bus_info": bus_info,
-                "onibusInfo": bus_info,  # Atributo adicional para facilitar acesso
-                "bbox": qr_result['bbox']
-            })
-        
         return {
             "qr_codes_found": True,
-            "total_qr_codes": len(qr_results),
-            "results": bus_info_results
+            "total_qr_codes": len(result),
+            "results": result
         }
         
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Erro no processamento de QR code: {e}")
         return {"error": f"Erro no processamento: {str(e)}"}
 
+async def read_image_from_request(request):
+    """
+    Extrai a imagem de uma requisição REST conforme o Content-Type.
+    Retorna bytes (binário/multipart) ou a string base64 (JSON).
+    """
+    content_type = request.headers.get("content-type", "")
+    
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form()
+        upload = form.get("image")
+        if upload is None:
+            # Aceita o primeiro arquivo enviado, qualquer que seja o nome do campo
+            upload = next((value for value in form.values() if hasattr(value, "read")), None)
+        if upload is None:
+            return None
+        if isinstance(upload, str):
+            return upload
+        return await upload.read()
+    
+    if content_type.startswith("application/octet-stream") or content_type.startswith("image/"):
+        return await request.body()
+    
+    try:
+        data = await request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Corpo JSON inválido")
+    if not isinstance(data, dict):
+        raise HTTPException(status_code=400, detail="Envie {\"image\": \"<base64>\"}")
+    return data.get('image')
+
+# Endpoint de processamento em lote (YOLO + QR), com resultados em NDJSON
+@app.post("/batch/process")
+async def process_batch_endpoint(request: Request):
+    """
+    Processa muitas imagens de uma vez. Aceita upload multipart (vários
+    arquivos, em qualquer campo) ou JSON {"path": "<pasta ou zip>"} com um
+    caminho dentro de BATCH_INPUT_DIR. Os resultados saem em NDJSON, na
+    ordem em que ficam prontos, e a última linha traz o resumo do lote.
+    """
+    content_type = request.headers.get("content-type", "")
+    
+    if content_type.startswith("multipart/form-data"):
+        form = await request.form(max_files=BATCH_MAX_FILES)
+        uploads = [value for _, value in form.multi_items() if hasattr(value, "read")]
+        if not uploads:
+            return JSONResponse(status_code=400, content={"error": "Nenhuma imagem enviada"})
+        sources = iter_uploaded_images(uploads)
+    else:
+        try:
+            data = await request.json()
+        except ValueError:
+            return JSONResponse(status_code=400, content={"error": "Corpo JSON inválido"})
+        path = data.get("path") if isinstance(data, dict) else None
+        if not path:
+            return JSONResponse(status_code=400, content={"error": "Envie as imagens (multipart) ou {\"path\": ...}"})
+        if not BATCH_INPUT_DIR:
+            return JSONResponse(status_code=403, content={"error": "Leitura de caminhos do servidor desativada (BATCH_INPUT_DIR)"})
+        
+        base_dir = os.path.realpath(BATCH_INPUT_DIR)
+        full_path = os.path.realpath(os.path.join(base_dir, path))
+        if os.path.commonpath([base_dir, full_path]) != base_dir:
+            return JSONResponse(status_code=403, content={"error": "Caminho fora de BATCH_INPUT_DIR"})
+        if not os.path.exists(full_path):
+            return JSONResponse(status_code=404, content={"error": f"{path} não encontrado"})
+        sources = iter_in_thread(iter_batch_path(full_path))
+    
+    # Espera o modelo antes de abrir o stream, para uma falha virar 503 e não um NDJSON truncado
+    try:
+        await wait_for_model()
+    except ModelUnavailable:
+        return JSONResponse(status_code=503, content={"error": "Modelo indisponível"})
+    
+    async def ndjson_lines():
+        async for result in run_image_batch(sources):
+            yield json.dumps(result, ensure_ascii=False) + "\n"
+    
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson")
+
 # Monta o Socket.IO depois dos endpoints REST
 app.mount("/", socket_app)
 
 # --- FUNÇÕES AUXILIARES ---
 
-def get_image_hash(base64_data):
-    """Gera hash para cache de imagens"""
-    # Usa apenas os primeiros 1000 caracteres para performance
-    return hashlib.md5(base64_data[:1000].encode()).hexdigest()
+def load_model(validate=True):
+    """
+    Carrega o modelo do backend configurado (exportando/quantizando na
+    primeira execução). Com validate=False nenhuma inferência roda aqui:
+    é o caso do processo principal com INFERENCE_POOL=process, que faz o
+    fork dos workers logo depois e deixa a validação para um deles.
+    """
+    global MODEL_PATH, model, class_names, classes_de_interesse_mask
+    MODEL_PATH = resolve_model_path(INFERENCE_BACKEND, MODEL_PRECISION)
+    model = YOLO(MODEL_PATH, task='detect')
+    class_names = model.names
+    if INFERENCE_BACKEND == "torch":
+        # Funde Conv+BN antes do fork (sem rodar o modelo): senão cada worker
+        # faria a fusão na primeira inferência e teria sua própria cópia dos pesos
+        model.fuse(verbose=False)
+    
+    classes_de_interesse_mask = np.zeros(len(class_names), dtype=bool)
+    classes_de_interesse_mask[CLASSES_DE_INTERESSE_IDS] = True
+    
+    if validate:
+        validate_backend_output(model)
+    return model
+
+def start_inference_processes():
+    """
+    Cria (fork) os processos do pool de uma vez, logo após o carregamento:
+    o processo principal ainda não rodou nenhuma inferência e as threads de
+    QR ainda não começaram (run_blocking espera model_loaded), então nenhum
+    lock do PyTorch/OpenMP ou do OpenCV é copiado travado para os filhos.
+    """
+    # Com fork, o primeiro submit cria todos os processos antes da thread de gerenciamento do pool
+    executor.submit(os.getpid)
+
+def warmup_worker(runs):
+    """
+    Aquece o modelo do worker atual do pool: força a configuração do grafo,
+    o layout dos pesos e o alocador com quadros na resolução servida
+    (retrato e paisagem). Retorna a identificação do worker.
+    """
+    portrait = np.zeros((REALTIME_MAX_SIZE, REALTIME_MAX_SIZE * 3 // 4, 3), dtype=np.uint8)
+    landscape = np.zeros((REALTIME_MAX_SIZE * 3 // 4, REALTIME_MAX_SIZE, 3), dtype=np.uint8)
+    for _ in range(runs):
+        process_yolo_batch([portrait])
+        process_yolo_batch([landscape])
+    return os.getpid(), threading.get_ident()
+
+async def warm_up_workers(runs):
+    """Executa o aquecimento até cada worker do pool ter carregado e aquecido seu modelo"""
+    loop = asyncio.get_running_loop()
+    warmed_workers = set()
+    
+    # O pool escolhe qual worker pega cada tarefa; repete algumas rodadas
+    # até todos terem sido aquecidos
+    for _ in range(3):
+        jobs = [loop.run_in_executor(executor, warmup_worker, runs) for _ in range(INFERENCE_WORKERS)]
+        warmed_workers.update(await asyncio.gather(*jobs))
+        if len(warmed_workers) >= INFERENCE_WORKERS:
+            break
+    
+    return len(warmed_workers)
+
+async def start_inference():
+    """Carrega o modelo e aquece os workers; só então o servidor passa a "ok" """
+    global server_state
+    try:
+        server_state = "loading"
+        start_time = time.time()
+        try:
+            if INFERENCE_POOL == "process":
+                await asyncio.to_thread(load_model, False)
+                start_inference_processes()
+            else:
+                await asyncio.to_thread(load_model)
+        finally:
+            model_loaded.set()
+        
+        if INFERENCE_POOL == "process":
+            # A validação roda em um worker, já com o número de threads dele
+            await run_blocking(validate_backend_output)
+        
+        server_state = "warming"
+        workers = await warm_up_workers(WARMUP_RUNS) if WARMUP_RUNS > 0 else 0
+        
+        server_state = "ok"
+        model_ready.set()
+        logger.info(f"Modelo pronto em {time.time() - start_time:.2f}s ({workers} workers aquecidos)")
+    except Exception as e:
+        server_state = "error"
+        # Libera quem esperava o modelo (wait_for_model levanta ModelUnavailable)
+        model_failed.set()
+        logger.exception(f"Erro ao iniciar o modelo: {e}")
+
+async def wait_for_model():
+    """
+    Espera o modelo ficar pronto. Levanta ModelUnavailable se o carregamento
+    ou o aquecimento falhou, em vez de deixar o pedido preso para sempre.
+    """
+    if model_ready.is_set():
+        return
+    if not model_failed.is_set():
+        waiters = [asyncio.create_task(model_ready.wait()), asyncio.create_task(model_failed.wait())]
+        try:
+            await asyncio.wait(waiters, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for waiter in waiters:
+                waiter.cancel()
+    if not model_ready.is_set():
+        raise ModelUnavailable("Modelo indisponível")
+
+def get_model():
+    """Retorna a instância do modelo YOLO da thread atual do pool"""
+    thread_model = getattr(_thread_state, 'model', None)
+    if thread_model is None:
+        thread_model = YOLO(MODEL_PATH, task='detect')
+        _thread_state.model = thread_model
+    return thread_model
+
+def inference_pool_saturated(lane):
+    """Indica se a fila do pool de inferência está cheia (sem vaga nem espaço para esperar)"""
+    return scheduler.is_full(lane)
+
+@asynccontextmanager
+async def inference_slot(lane, sid, deadline=None):
+    """
+    Reserva uma vaga no pool de inferência (backpressure) durante todo o
+    pipeline, na fila da lane. Levanta DeadlineExpired se o prazo vencer antes.
+    """
+    await scheduler.acquire(lane, sid, deadline)
+    try:
+        yield
+    finally:
+        scheduler.release(lane)
+
+def request_deadline(received_at, deadline_ms, default_ms):
+    """Prazo absoluto (time.time()) do pedido: deadline_ms do cliente ou o padrão da fila"""
+    try:
+        budget = float(deadline_ms) if deadline_ms is not None else default_ms
+    except (TypeError, ValueError):
+        budget = default_ms
+    return received_at + budget / 1000 if budget > 0 else None
+
+def mark_stage(stage, start):
+    """Registra a duração de uma etapa executada no pool (desde start, de time.perf_counter)"""
+    if not COLLECT_STAGE_TIMINGS:
+        return
+    timings = getattr(_thread_state, 'stage_timings', None)
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + time.perf_counter() - start
+
+def observe_stage(stage, seconds):
+    """Registra a duração de uma etapa no histograma e no detalhamento do quadro atual"""
+    stage_metrics.observe(stage, seconds)
+    timings = frame_timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+def run_timed(func, *args):
+    """
+    Executa func no worker do pool e devolve também qual worker executou,
+    quanto tempo levou e as etapas marcadas com mark_stage (ou None)
+    """
+    _thread_state.stage_timings = {} if COLLECT_STAGE_TIMINGS else None
+    start = time.perf_counter()
+    try:
+        result = func(*args)
+    finally:
+        timings = _thread_state.stage_timings
+        _thread_state.stage_timings = None
+    # Processos de inferência são identificados pelo pid; threads (inclusive as de QR), pelo nome
+    worker = os.getpid() if multiprocessing.parent_process() is not None else threading.current_thread().name
+    return result, worker, time.perf_counter() - start, timings
+
+async def run_blocking(func, *args, pool=None):
+    """Executa uma etapa CPU-intensiva no pool de inferência (ou em pool), liberando o event loop"""
+    loop = asyncio.get_running_loop()
+    if INFERENCE_POOL == "process":
+        # Os processos só podem ser criados (fork) depois que o modelo foi carregado,
+        # para herdarem os pesos. Nenhuma etapa roda antes disso, nem as de QR nas
+        # threads do processo principal, para não haver threads ocupadas no fork
+        await model_loaded.wait()
+    result, worker, elapsed, timings = await loop.run_in_executor(pool or executor, run_timed, func, *args)
+    
+    stats = worker_stats.get(worker)
+    if stats is None:
+        stats = worker_stats[worker] = {"jobs": 0, "busy_seconds": 0.0}
+    stats["jobs"] += 1
+    stats["busy_seconds"] += elapsed
+    if timings:
+        for stage, seconds in timings.items():
+            observe_stage(stage, seconds)
+    return result
+
+def read_process_memory(pid):
+    """
+    Memória de um processo em MB, via /proc (Linux): RSS, PSS (RSS dividindo as
+    páginas compartilhadas entre os processos) e quanto é compartilhado, o que
+    inclui os pesos herdados do processo principal por copy-on-write.
+    """
+    fields = {}
+    try:
+        with open(f"/proc/{pid}/smaps_rollup") as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[2] == "kB":
+                    fields[parts[0].rstrip(":")] = int(parts[1])
+    except OSError:
+        return None
+    return {
+        "rss_mb": round(fields.get("Rss", 0) / 1024, 1),
+        "pss_mb": round(fields.get("Pss", 0) / 1024, 1),
+        "shared_mb": round((fields.get("Shared_Clean", 0) + fields.get("Shared_Dirty", 0)) / 1024, 1)
+    }
+
+def get_worker_load():
+    """Carga de cada worker do pool de inferência para o /config"""
+    uptime = max(time.time() - pool_started_at, 1e-9)
+    workers = []
+    for worker, stats in sorted(worker_stats.items(), key=lambda item: str(item[0])):
+        entry = {
+            "worker": worker,
+            "jobs": stats["jobs"],
+            "busy_seconds": round(stats["busy_seconds"], 2),
+            "utilization": round(stats["busy_seconds"] / uptime, 3)
+        }
+        if isinstance(worker, int):
+            entry["memory"] = read_process_memory(worker)
+        workers.append(entry)
+    return workers
+
+async def run_in_inference_pool(func, *args, lane, sid, deadline=None):
+    """Executa uma etapa no pool ocupando uma vaga de backpressure da fila (a de QR tem threads próprias)"""
+    async with inference_slot(lane, sid, deadline):
+        return await run_blocking(func, *args, pool=qr_executor if lane == "qr" else None)
+
+class YoloBatcher:
+    """
+    Agrupa quadros de vários clientes em uma única chamada batched do YOLO.
+    Um lote é disparado quando atinge max_batch_size quadros ou quando o
+    primeiro quadro da fila espera max_wait segundos.
+    """
+
+    def __init__(self, max_batch_size, max_wait):
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait
+        self._queue = []
+        self._flush_handle = None
+        self._running = set()
+        self.batches_run = 0
+        self.frames_processed = 0
+        self.last_batch_size = 0
+
+    async def detect(self, frame):
+        """Enfileira um quadro e aguarda as detecções do lote em que ele entrar"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._queue.append((frame, future))
+        
+        if len(self._queue) >= self.max_batch_size:
+            self._flush()
+        elif self._flush_handle is None:
+            self._flush_handle = loop.call_later(self.max_wait, self._flush)
+        
+        return await future
+
+    def _flush(self):
+        if self._flush_handle is not None:
+            self._flush_handle.cancel()
+            self._flush_handle = None
+        
+        while self._queue:
+            batch = self._queue[:self.max_batch_size]
+            self._queue = self._queue[self.max_batch_size:]
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._running.add(task)
+            task.add_done_callback(self._running.discard)
+
+    async def _run_batch(self, batch):
+        # O lote é de vários quadros: a etapa yolo_batch não entra no
+        # detalhamento do quadro que disparou o lote (cada quadro mede a
+        # sua espera pelo lote na etapa yolo)
+        frame_timings.set(None)
+        frames = [frame for frame, _ in batch]
+        self.batches_run += 1
+        self.frames_processed += len(frames)
+        self.last_batch_size = len(frames)
+        
+        try:
+            results = await run_blocking(process_yolo_batch, frames)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        
+        for (_, future), detections in zip(batch, results):
+            if not future.done():
+                future.set_result(detections)
+
+    def stats(self):
+        """Estatísticas de ocupação dos lotes para o /config"""
+        avg_batch_size = self.frames_processed / self.batches_run if self.batches_run else 0.0
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000,
+            "batches_run": self.batches_run,
+            "frames_processed": self.frames_processed,
+            "avg_batch_size": round(avg_batch_size, 2),
+            "avg_occupancy": round(avg_batch_size / self.max_batch_size, 3),
+            "last_batch_size": self.last_batch_size,
+            "queued_frames": len(self._queue)
+        }
+
+def decode_image_payload(data, max_size=None):
+    """
+    Decodifica a imagem recebida para OpenCV. Aceita bytes (anexo binário do
+    Socket.IO ou corpo da requisição), uma string base64 (com ou sem header
+    data:image/...) ou um dict com a imagem na chave 'image'.
+    Com max_size, JPEGs grandes são decodificados já em resolução reduzida.
+    """
+    if isinstance(data, dict):
+        data = data.get('image')
+    
+    if isinstance(data, str):
+        # Verifica se há header (data:image/jpeg;base64,) ou se é apenas base64
+        if "," in data:
+            header, encoded = data.split(",", 1)
+            logger.debug(f"Header encontrado: {header[:50]}...")
+        else:
+            # Se não há vírgula, assume que é apenas a string base64
+            encoded = data
+            logger.debug("Sem header, usando dados direto como base64")
+        
+        start = time.perf_counter()
+        data = base64.b64decode(encoded)
+        mark_stage("base64", start)
+    
+    if not isinstance(data, (bytes, bytearray, memoryview)):
+        return None
+    
+    # Decodifica direto do buffer recebido, sem cópias intermediárias
+    start = time.perf_counter()
+    nparr = np.frombuffer(data, np.uint8)
+    frame = cv2.imdecode(nparr, choose_decode_mode(data, max_size))
+    mark_stage("imdecode", start)
+    return frame
+
+def compute_frame_hash(frame):
+    """
+    Gera um hash perceptual (dHash de 64 bits) do quadro: miniatura 9x8 em
+    tons de cinza, comparando cada pixel com o vizinho da direita.
+    Quadros quase idênticos geram hashes com pequena distância de Hamming.
+    """
+    gray = to_grayscale(frame)
+    thumbnail = cv2.resize(gray, (9, 8), interpolation=cv2.INTER_AREA)
+    bits = thumbnail[:, 1:] > thumbnail[:, :-1]
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
 
 def preprocess_image_for_realtime(frame):
     """Otimiza imagem para processamento em tempo real"""
     height, width = frame.shape[:2]
-    max_size = 640  # Reduzir para processamento mais rápido
+    max_size = REALTIME_MAX_SIZE  # Reduzir para processamento mais rápido
     
     if max(height, width) > max_size:
         if height > width:
@@ -194,58 +1029,271 @@ def preprocess_image_for_realtime(frame):
             new_width = max_size
             new_height = int(height * (max_size / width))
         
-        frame = cv2.resize(frame, (new_width, new_height))
+        # INTER_AREA evita aliasing na redução e é mais rápido que reamostrar
+        frame = cv2.resize(frame, (new_width, new_height), interpolation=cv2.INTER_AREA)
     
     return frame
 
 def process_yolo_detection(frame):
     """Processa detecção YOLO de forma otimizada"""
-    results = model(frame)
-    detections = []
-    
-    for r in results:
-        boxes = r.boxes
-        if boxes is not None:
-            for box in boxes:
-                cls_id = int(box.cls[0])
-                if cls_id in classes_de_interesse:
-                    confidence = float(box.conf[0])
-                    if confidence > 0.5:
-                        x1, y1, x2, y2 = map(int, box.xyxy[0])
-                        label = class_names[cls_id]
-                        
-                        detections.append({
-                            'label': label,
-                            'confidence': confidence,
-                            'box': [x1, y1, x2, y2]
-                        })
-    
+    return process_yolo_batch([frame])[0]
+
+def process_yolo_batch(frames):
+    """Processa detecção YOLO de vários quadros em uma única chamada do modelo"""
+    start = time.perf_counter()
+    results = get_model()(
+        frames,
+        classes=CLASSES_DE_INTERESSE_IDS,
+        conf=CONFIDENCE_THRESHOLD,
+        verbose=False
+    )
+    detections = [extract_detections(r.boxes) for r in results]
+    mark_stage("yolo_batch", start)
     return detections
 
-def manage_cache(image_hash, results):
-    """Gerencia cache com limite de tamanho"""
-    # Manter cache limitado
-    if len(result_cache) >= CACHE_SIZE:
-        # Remove o item mais antigo
-        oldest_key = next(iter(result_cache))
-        del result_cache[oldest_key]
+# Validação do backend: as imagens de exemplo do ultralytics (ônibus, pessoas,
+# gravata) passam pelo backend ativo e pelo PyTorch, e as detecções precisam
+# coincidir em classe, caixa (IoU) e confiança. O INT8 tem tolerância maior
+VALIDATION_IMAGES = ("bus.jpg", "zidane.jpg")
+VALIDATION_TOLERANCE = {
+    "fp32": {"min_iou": 0.9, "max_confidence_diff": 0.05},
+    "int8": {"min_iou": 0.7, "max_confidence_diff": 0.15},
+}
+
+def compare_detections(reference, detections, min_iou, max_confidence_diff):
+    """
+    Divergências entre as detecções do PyTorch (reference) e as do backend.
+    Cada detecção de referência é associada à de mesma classe com maior IoU.
+    Objetos que sobram de um dos lados só contam se a confiança estiver longe
+    do limiar (perto dele, qualquer arredondamento muda o resultado).
+    """
+    problems = []
+    unmatched = list(detections)
+    for expected in reference:
+        candidates = [d for d in unmatched if d['label'] == expected['label']]
+        match = max(candidates, key=lambda d: box_iou(d['box'], expected['box']), default=None)
+        if match is None or box_iou(match['box'], expected['box']) < min_iou:
+            if expected['confidence'] >= CONFIDENCE_THRESHOLD + max_confidence_diff:
+                problems.append(f"{expected['label']} {expected['box']} ({expected['confidence']:.2f}) não detectado")
+            continue
+        unmatched.remove(match)
+        if abs(match['confidence'] - expected['confidence']) > max_confidence_diff:
+            problems.append(f"{expected['label']} com confiança {match['confidence']:.2f} (PyTorch: {expected['confidence']:.2f})")
+    for extra in unmatched:
+        if extra['confidence'] >= CONFIDENCE_THRESHOLD + max_confidence_diff:
+            problems.append(f"{extra['label']} {extra['box']} ({extra['confidence']:.2f}) a mais")
+    return problems
+
+def validate_backend_output(detector=None):
+    """
+    Confere se o backend ativo produz as mesmas detecções do PyTorch nas
+    imagens de exemplo do ultralytics: nomes das classes COCO, formato das
+    detecções e, com um backend exportado, classes, caixas e confianças
+    dentro da tolerância da precisão. As imagens têm tamanhos diferentes e
+    vão no mesmo lote, o que exercita o batching. Sem detector, usa o
+    modelo do worker atual do pool.
+    """
+    from ultralytics.utils import ASSETS
+    
+    if detector is None:
+        detector = get_model()
+    if max(CLASSES_DE_INTERESSE_IDS) >= len(class_names):
+        raise RuntimeError(f"Backend {INFERENCE_BACKEND} retornou {len(class_names)} classes")
+    
+    frames = [cv2.imread(str(ASSETS / name), cv2.IMREAD_COLOR) for name in VALIDATION_IMAGES]
+    results = detector(frames, classes=CLASSES_DE_INTERESSE_IDS, conf=CONFIDENCE_THRESHOLD, verbose=False)
+    batch_detections = [extract_detections(r.boxes) for r in results]
+    
+    if len(batch_detections) != len(frames):
+        raise RuntimeError(f"Backend {INFERENCE_BACKEND} retornou {len(batch_detections)} resultados para {len(frames)} quadros")
+    
+    for detections in batch_detections:
+        for detection in detections:
+            valid = (
+                isinstance(detection['label'], str)
+                and isinstance(detection['confidence'], float)
+                and len(detection['box']) == 4
+                and all(isinstance(v, int) for v in detection['box'])
+            )
+            if not valid:
+                raise RuntimeError(f"Formato de detecção inválido no backend {INFERENCE_BACKEND}: {detection}")
+    
+    # Cada imagem de exemplo tem objetos conhecidos: um backend que não detecta nada está quebrado
+    for name, detections in zip(VALIDATION_IMAGES, batch_detections):
+        if not detections:
+            raise RuntimeError(f"Backend {INFERENCE_BACKEND} não detectou nenhum objeto em {name}")
+    
+    if INFERENCE_BACKEND != "torch":
+        reference_model = YOLO(MODEL_WEIGHTS, task='detect')
+        reference_results = reference_model(frames, classes=CLASSES_DE_INTERESSE_IDS, conf=CONFIDENCE_THRESHOLD, verbose=False)
+        tolerance = VALIDATION_TOLERANCE[MODEL_PRECISION]
+        for name, result, detections in zip(VALIDATION_IMAGES, reference_results, batch_detections):
+            problems = compare_detections(extract_detections(result.boxes), detections, **tolerance)
+            if problems:
+                raise RuntimeError(f"Backend {INFERENCE_BACKEND} ({MODEL_PRECISION}) diverge do PyTorch em {name}: {'; '.join(problems)}")
     
-    result_cache[image_hash] = results
+    logger.info(f"Backend de inferência {INFERENCE_BACKEND} validado ({MODEL_PATH})")
 
-def decode_qr_codes(image_array):
+def extract_detections(boxes):
     """
-    Decodifica QR codes de uma imagem
+    Converte as caixas de um resultado do YOLO em detecções. O filtro por
+    classe e confiança é feito com máscaras sobre o array inteiro, com uma
+    única cópia dos dados para o host e uma única conversão para listas.
+    """
+    if boxes is None or len(boxes) == 0:
+        return []
+    
+    # Colunas de boxes.data: x1, y1, x2, y2, [track_id,] confiança, classe
+    data = boxes.cpu().numpy().data
+    confidences = data[:, -2]
+    cls_ids = data[:, -1].astype(int)
+    
+    mask = (confidences > CONFIDENCE_THRESHOLD) & classes_de_interesse_mask[cls_ids]
+    
+    boxes_list = data[mask, :4].astype(int).tolist()
+    confidence_list = confidences[mask].tolist()
+    cls_list = cls_ids[mask].tolist()
+    
+    return [
+        {
+            'label': class_names[cls_id],
+            'confidence': confidence,
+            'box': box
+        }
+        for cls_id, confidence, box in zip(cls_list, confidence_list, boxes_list)
+    ]
+
+def to_grayscale(image_array):
+    """Converte o quadro para tons de cinza (uma única vez por quadro)"""
+    if image_array.ndim == 3:
+        return cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
+    return image_array
+
+def find_finder_patterns(gray):
+    """
+    Padrões de localização de QR code no quadro: contornos aproximadamente
+    quadrados com dois níveis de contornos dentro (borda escura, anel claro e
+    centro escuro), com a área do centro entre 1/20 e 1/3 da do quadrado.
+    Retorna as caixas (x, y, w, h).
+    """
+    binary = cv2.adaptiveThreshold(gray, 255, cv2.ADAPTIVE_THRESH_MEAN_C, cv2.THRESH_BINARY_INV, QR_THRESHOLD_BLOCK, 10)
+    contours, hierarchy = cv2.findContours(binary, cv2.RETR_TREE, cv2.CHAIN_APPROX_SIMPLE)
+    if hierarchy is None:
+        return []
+    
+    hierarchy = hierarchy[0]
+    patterns = []
+    for index, (_, _, child, _) in enumerate(hierarchy):
+        if child < 0 or hierarchy[child][2] < 0:
+            continue
+        x, y, w, h = cv2.boundingRect(contours[index])
+        if min(w, h) < QR_FINDER_MIN_SIZE or not 0.6 < w / h < 1.66:
+            continue
+        _, _, inner_w, inner_h = cv2.boundingRect(contours[hierarchy[child][2]])
+        if inner_w and inner_h and 3 < (w * h) / (inner_w * inner_h) < 20:
+            patterns.append((x, y, w, h))
+    return patterns
+
+def group_finder_patterns(patterns):
+    """
+    Agrupa os padrões de localização que podem ser do mesmo QR code: tamanhos
+    parecidos e centros a até 9 lados de distância (QR codes até a versão 10).
+    Padrões isolados são descartados. Retorna as caixas [x1, y1, x2, y2] de
+    cada grupo; com só dois padrões, a caixa cresce a distância entre eles
+    para todos os lados, já que o terceiro canto pode estar em qualquer um.
+    """
+    centers = [(x + w / 2, y + h / 2, max(w, h)) for x, y, w, h in patterns]
+    group_of = list(range(len(patterns)))
+    
+    def root(index):
+        while group_of[index] != index:
+            group_of[index] = group_of[group_of[index]]
+            index = group_of[index]
+        return index
+    
+    for i, (xi, yi, si) in enumerate(centers):
+        for j in range(i + 1, len(centers)):
+            xj, yj, sj = centers[j]
+            if 0.5 < sj / si < 2 and np.hypot(xj - xi, yj - yi) < 9 * max(si, sj):
+                group_of[root(j)] = root(i)
+    
+    groups = defaultdict(list)
+    for index in range(len(patterns)):
+        groups[root(index)].append(index)
+    
+    boxes = []
+    for members in groups.values():
+        if len(members) < 2:
+            continue
+        x1 = min(patterns[i][0] for i in members)
+        y1 = min(patterns[i][1] for i in members)
+        x2 = max(patterns[i][0] + patterns[i][2] for i in members)
+        y2 = max(patterns[i][1] + patterns[i][3] for i in members)
+        if len(members) == 2:
+            reach = max(x2 - x1, y2 - y1)
+            x1, y1, x2, y2 = x1 - reach, y1 - reach, x2 + reach, y2 + reach
+        boxes.append([x1, y1, x2, y2])
+    return boxes
+
+def find_qr_candidates(gray):
+    """
+    Localiza regiões candidatas a QR code (padrões de localização) sem
+    decodificá-las. A busca roda na resolução do quadro (até
+    QR_CANDIDATE_MAX_SIZE), para não perder códigos pequenos. Retorna as
+    regiões [x1, y1, x2, y2] com margem, já limitadas ao tamanho do quadro.
+    """
+    height, width = gray.shape[:2]
+    scale = min(1.0, QR_CANDIDATE_MAX_SIZE / max(height, width))
+    if scale < 1:
+        small = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+    else:
+        small = gray
+    
+    candidates = []
+    for x1, y1, x2, y2 in group_finder_patterns(find_finder_patterns(small)):
+        candidates.append(expand_qr_box([x1 / scale, y1 / scale, x2 / scale, y2 / scale], gray.shape))
+    return candidates
+
+def expand_qr_box(box, shape):
+    """Aplica a margem QR_ROI_MARGIN a uma caixa, limitada ao tamanho do quadro"""
+    x1, y1, x2, y2 = box
+    height, width = shape[:2]
+    margin_x = (x2 - x1) * QR_ROI_MARGIN
+    margin_y = (y2 - y1) * QR_ROI_MARGIN
+    return [
+        max(0, int(x1 - margin_x)),
+        max(0, int(y1 - margin_y)),
+        min(width, int(x2 + margin_x) + 1),
+        min(height, int(y2 + margin_y) + 1)
+    ]
+
+def decode_qr_regions(gray, regions):
+    """Decodifica os QR codes dentro de cada região, sem repetir o mesmo conteúdo"""
+    qr_codes = []
+    seen_data = set()
+    for x1, y1, x2, y2 in regions:
+        for qr_code in decode_qr_codes(gray[y1:y2, x1:x2], offset=(x1, y1)):
+            if qr_code['data'] not in seen_data:
+                seen_data.add(qr_code['data'])
+                qr_codes.append(qr_code)
+    return qr_codes
+
+def decode_qr_codes(image_array, offset=(0, 0)):
+    """
+    Decodifica QR codes de uma imagem. Com offset, a imagem é um recorte e
+    as caixas são devolvidas nas coordenadas do quadro original.
     """
     try:
-        # Converte para PIL Image se necessário
+        # O pyzbar trabalha em tons de cinza; imagens PIL são repassadas direto
         if isinstance(image_array, np.ndarray):
-            image = Image.fromarray(image_array)
+            image = to_grayscale(image_array)
         else:
             image = image_array
             
         # Decodifica QR codes
         qr_codes = pyzbar.decode(image)
         
+        offset_x, offset_y = offset
         results = []
         for qr_code in qr_codes:
             # Decodifica os dados do QR code
@@ -269,7 +1317,7 @@ def decode_qr_codes(image_array):
             results.append({
                 'data': qr_data,
                 'type': qr_type,
-                'bbox': bbox,
+                'bbox': [bbox[0] + offset_x, bbox[1] + offset_y, bbox[2] + offset_x, bbox[3] + offset_y],
                 'confidence': 1.0  # QR codes têm alta confiança quando detectados
             })
             
@@ -278,52 +1326,36 @@ def decode_qr_codes(image_array):
         logger.error(f"Erro ao decodificar QR codes: {e}")
         return []
 
+def scan_qr_codes(frame):
+    """
+    Decodifica os QR codes de um quadro de tempo real usando o pré-filtro:
+    converte para cinza uma vez, procura candidatos e roda o pyzbar apenas
+    nos recortes. Retorna (qr_codes, modo), onde modo é "skipped" (nenhum
+    candidato), "roi" (só recortes) ou "full" (quadro inteiro).
+    """
+    gray = to_grayscale(frame)
+    
+    if not QR_PREFILTER:
+        return decode_qr_codes(gray), "full"
+    
+    candidates = find_qr_candidates(gray)
+    if not candidates:
+        return [], "skipped"
+    
+    qr_codes = decode_qr_regions(gray, candidates)
+    if qr_codes:
+        return qr_codes, "roi"
+    
+    # O detector viu um candidato que o pyzbar não leu no recorte: tenta o quadro inteiro
+    return decode_qr_codes(gray), "full"
+
 def get_bus_line_info(qr_data):
     """
     Busca informações da linha de ônibus baseado nos dados do QR code
+    (número puro, JSON ou URL; ver bus_lines.parse_qr_payload)
     """
     try:
-        # Tenta diferentes formatos de QR code
-        bus_number = None
-        
-        # Formato 1: Apenas o número da linha
-        if qr_data.isdigit() or qr_data.replace('-', '').replace('_', '').isalnum():
-            bus_number = qr_data.upper()
-        
-        # Formato 2: JSON com informações da linha
-        elif qr_data.startswith('{'):
-            try:
-                qr_json = json.loads(qr_data)
-                bus_number = qr_json.get('linha', qr_json.get('numero', qr_json.get('line')))
-            except json.JSONDecodeError:
-                pass
-        
-        # Formato 3: URL com parâmetros
-        elif 'linha=' in qr_data or 'bus=' in qr_data:
-            # Extrai número da linha de uma URL
-            for param in qr_data.split('&'):
-                if 'linha=' in param:
-                    bus_number = param.split('=')[1]
-                    break
-                elif 'bus=' in param:
-                    bus_number = param.split('=')[1]
-                    break
-        
-        # Busca nos dados das linhas
-        if bus_number and bus_number in BUS_LINES_DATA:
-            return BUS_LINES_DATA[bus_number]
-        
-        # Se não encontrou nos dados, retorna informação básica
-        return {
-            "numero": bus_number or qr_data,
-            "nome": "Linha não encontrada na base de dados",
-            "empresa": "Consulte a empresa de transporte",
-            "tarifa": "Consulte valor atual",
-            "horarios": ["Consulte horários"],
-            "pontos_principais": ["Informações não disponíveis"],
-            "qr_data_original": qr_data
-        }
-        
+        return bus_lines.resolve_qr_payload(qr_data)
     except Exception as e:
         logger.error(f"Erro ao processar dados da linha: {e}")
         return {
@@ -331,89 +1363,523 @@ def get_bus_line_info(qr_data):
             "qr_data_original": qr_data
         }
 
+def describe_qr_code(qr_data):
+    """Campos enviados quando um QR code aparece: a linha e as próximas partidas"""
+    bus_info = get_bus_line_info(qr_data)
+    return {
+        'onibusInfo': bus_info,
+        'proximas_partidas': bus_lines.next_departures(bus_info.get('numero', ''), count=NEXT_DEPARTURES_COUNT)
+    }
+
+def prepare_frame(data):
+    """
+    Decodifica e pré-processa um quadro (executado no pool de inferência).
+    Retorna (quadro, hash perceptual, quadro reduzido em cinza para o fluxo
+    óptico ou None fora do modo de rastreamento), ou None se a imagem não
+    puder ser decodificada.
+    """
+    frame = decode_image_payload(data, max_size=REALTIME_MAX_SIZE)
+    if frame is None:
+        return None
+    return prepare_decoded_frame(frame)
+
+def prepare_decoded_frame(frame):
+    """Pré-processa um quadro já decodificado (ex.: lido de um vídeo), como prepare_frame"""
+    start = time.perf_counter()
+    # Otimizar imagem para tempo real
+    frame = preprocess_image_for_realtime(frame)
+    gray = to_grayscale(frame)
+    flow_gray = make_flow_frame(gray) if OBJECT_TRACKING else None
+    frame_hash = compute_frame_hash(gray)
+    mark_stage("preprocess", start)
+    return frame, frame_hash, flow_gray
+
+def process_qr_detections(frame, tracked_boxes=None, full_scan=True):
+    """
+    Decodifica os QR codes de um quadro de tempo real. As caixas dos códigos
+    já rastreados para o cliente (tracked_boxes: dados -> caixa) são conferidas
+    primeiro; se todos forem encontrados de novo e full_scan for False, a
+    varredura do quadro é pulada.
+    Retorna (qr_codes, modo da varredura).
+    """
+    start = time.perf_counter()
+    tracked_boxes = tracked_boxes or {}
+    gray = to_grayscale(frame)
+    
+    qr_codes = []
+    scan_mode = "tracked"
+    if tracked_boxes:
+        regions = [expand_qr_box(box, gray.shape) for box in tracked_boxes.values()]
+        qr_codes = decode_qr_regions(gray, regions)
+    
+    found_data = {qr_code['data'] for qr_code in qr_codes}
+    if full_scan or not tracked_boxes or not found_data.issuperset(tracked_boxes):
+        scanned_codes, scan_mode = scan_qr_codes(gray)
+        qr_codes.extend(qr_code for qr_code in scanned_codes if qr_code['data'] not in found_data)
+    
+    mark_stage("qr", start)
+    return qr_codes, scan_mode
+
+def record_qr_scan(scan_mode):
+    """Atualiza os contadores do pré-filtro de QR (no event loop)"""
+    if scan_mode == "tracked":
+        qr_scan_stats["tracked_frames"] += 1
+        return
+    
+    qr_scan_stats["frames_scanned"] += 1
+    if scan_mode == "skipped":
+        qr_scan_stats["frames_without_candidates"] += 1
+    if scan_mode in ("skipped", "roi"):
+        qr_scan_stats["full_decode_skipped"] += 1
+    elif QR_PREFILTER:
+        qr_scan_stats["roi_fallbacks"] += 1
+
+def make_flow_frame(gray):
+    """Reduz o quadro em cinza para o fluxo óptico (no máximo TRACK_FLOW_MAX_SIZE)"""
+    height, width = gray.shape[:2]
+    scale = TRACK_FLOW_MAX_SIZE / max(height, width)
+    if scale >= 1:
+        return gray
+    return cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+
+async def detect_objects(sid, frame, frame_hash, flow_gray):
+    """
+    Detecção de objetos de um quadro. No modo de rastreamento, o YOLO só roda
+    quando o rastreador pede e, nos outros quadros, as caixas são propagadas
+    no pool. Retorna (detecções, campos extras do resultado).
+    """
+    start = time.perf_counter()
+    if not OBJECT_TRACKING:
+        detections = await yolo_batcher.detect(frame)
+        observe_stage("yolo", time.perf_counter() - start)
+        return detections, {}
+    
+    if object_tracker.needs_detection(sid, frame_hash):
+        detections = await yolo_batcher.detect(frame)
+        observe_stage("yolo", time.perf_counter() - start)
+        detections, lost = object_tracker.update_detections(sid, detections, frame_hash, flow_gray)
+        mode = "detect"
+    else:
+        prev_gray, boxes = object_tracker.flow_state(sid)
+        scale = flow_gray.shape[1] / frame.shape[1]
+        propagated = await run_blocking(propagate_boxes, prev_gray, flow_gray, boxes, scale)
+        observe_stage("flow", time.perf_counter() - start)
+        detections, lost = object_tracker.update_propagated(sid, propagated, flow_gray)
+        mode = "track"
+    
+    return detections, {'objects_lost': lost, 'detection_mode': mode}
+
+async def run_frame_pipeline(sid, frame, frame_hash, flow_gray):
+    """
+    Pipeline de detecção de um quadro já decodificado: YOLO no lote
+    compartilhado entre clientes (ou rastreamento) e QR codes no pool, em
+    paralelo. Retorna (detecções, campos extras do resultado).
+    """
+    # Quadros recebidos durante o aquecimento esperam o modelo ficar pronto
+    await wait_for_model()
+    
+    (detections, extra), (qr_codes, scan_mode) = await asyncio.gather(
+        detect_objects(sid, frame, frame_hash, flow_gray),
+        run_blocking(process_qr_detections, frame, qr_tracker.tracked_boxes(sid), qr_tracker.needs_full_scan(sid))
+    )
+    record_qr_scan(scan_mode)
+    qr_detections, qr_lost = qr_tracker.update(sid, qr_codes, scan_mode)
+    
+    return detections + qr_detections, {**extra, 'qr_lost': qr_lost}
+
+async def analyze_frame(sid, frame, frame_hash, flow_gray, use_cache=True):
+    """
+    Detecções de um quadro já preparado, reaproveitando o cache de resultados
+    do cliente quando um quadro quase idêntico já foi processado. No modo de
+    rastreamento o cache não é usado: os quadros entre detecções já são
+    baratos e os track_ids precisam seguir o rastreador.
+    Retorna os campos do resultado (detections, qr_lost, os extras do
+    rastreamento e cached nos acertos do cache).
+    """
+    use_cache = use_cache and not OBJECT_TRACKING
+    cached_results = result_cache.get(sid, frame_hash) if use_cache else None
+    if cached_results is not None:
+        logger.info(f"Cache hit para cliente {sid}")
+        detections, qr_lost = replay_cached_detections(sid, cached_results['detections'])
+        return {**cached_results, 'detections': detections, 'qr_lost': qr_lost, 'cached': True}
+    
+    detections, extra = await run_frame_pipeline(sid, frame, frame_hash, flow_gray)
+    results = {'detections': detections, **extra}
+    if use_cache:
+        result_cache.put(sid, frame_hash, results)
+    return results
+
+def replay_cached_detections(sid, cached_detections):
+    """
+    Reaproveita as detecções de um resultado em cache passando os QR codes
+    pelo rastreador, para que o estado do cliente (códigos que aparecem e
+    somem) continue coerente com os quadros recebidos.
+    """
+    detections = [detection for detection in cached_detections if 'qr_data' not in detection]
+    qr_codes = [
+        {'data': detection['qr_data'], 'bbox': detection['box'], 'confidence': detection['confidence']}
+        for detection in cached_detections if 'qr_data' in detection
+    ]
+    qr_detections, qr_lost = qr_tracker.update(sid, qr_codes, "cached")
+    return detections + qr_detections, qr_lost
+
+def run_qrcode_pipeline(data):
+    """
+    Pipeline de QR codes (executado no pool de inferência).
+    Retorna None se a imagem não puder ser decodificada, ou a lista de
+    QR codes encontrados (as informações das linhas são buscadas depois,
+    no processo principal, por attach_bus_info).
+    """
+    frame = decode_image_payload(data)
+    if frame is None:
+        return None
+    start = time.perf_counter()
+    qr_codes = decode_qr_codes(frame)
+    mark_stage("qr", start)
+    return qr_codes
+
+def attach_bus_info(qr_codes):
+    """Monta os resultados de QR code com as informações das linhas de ônibus"""
+    bus_info_results = []
+    for qr_code in qr_codes:
+        bus_info = get_bus_line_info(qr_code['data'])
+        bus_info_results.append({
+            'qr_data': qr_code['data'],
+            'bus_info': bus_info,
+            'onibusInfo': bus_info,  # Atributo adicional para facilitar acesso
+            'proximas_partidas': bus_lines.next_departures(bus_info.get('numero', ''), count=NEXT_DEPARTURES_COUNT),
+            'bbox': qr_code['bbox']
+        })
+    
+    return bus_info_results
+
+def iter_batch_path(path):
+    """Gera (nome, bytes) das imagens de uma pasta (em ordem alfabética) ou de um arquivo zip"""
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as archive:
+            for info in archive.infolist():
+                if not info.is_dir() and info.filename.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+                    yield info.filename, archive.read(info)
+        return
+    
+    for name in sorted(os.listdir(path)):
+        file_path = os.path.join(path, name)
+        if os.path.isfile(file_path) and name.lower().endswith(BATCH_IMAGE_EXTENSIONS):
+            with open(file_path, "rb") as f:
+                yield name, f.read()
+
+async def iter_in_thread(iterator):
+    """Consome um iterador de leitura de arquivos em uma thread, sem bloquear o event loop"""
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
+async def iter_uploaded_images(uploads):
+    """Gera (nome, bytes) dos arquivos de um upload multipart"""
+    for index, upload in enumerate(uploads):
+        yield upload.filename or f"imagem_{index}", await upload.read()
+
+def prepare_batch_image(data):
+    """
+    Etapa de uma imagem do lote no pool de inferência: decodifica em
+    resolução total, procura QR codes (placas impressas podem ser pequenas
+    na foto) e reduz o quadro para o YOLO.
+    """
+    frame = decode_image_payload(data)
+    if frame is None:
+        return None
+    qr_codes, _ = scan_qr_codes(frame)
+    return preprocess_image_for_realtime(frame), qr_codes
+
+async def process_batch_image(batch_id, name, data):
+    """
+    Processa uma imagem do lote: pool para decodificação e QR, YOLO no lote
+    compartilhado. A imagem ocupa uma vaga da fila "batch" durante o pipeline.
+    """
+    start = time.perf_counter()
+    try:
+        async with inference_slot("batch", batch_id):
+            prepared = await run_blocking(prepare_batch_image, data)
+            if prepared is None:
+                return {'image': name, 'error': 'Não foi possível decodificar a imagem'}
+            
+            frame, qr_codes = prepared
+            detections = await yolo_batcher.detect(frame)
+        return {
+            'image': name,
+            'detections': detections,
+            'qr_codes': attach_bus_info(qr_codes),
+            'processing_time': time.perf_counter() - start
+        }
+    except Exception as e:
+        logger.error(f"Erro ao processar a imagem {name} do lote: {e}")
+        return {'image': name, 'error': str(e)}
+
+batch_ids = count(1)
+
+async def run_image_batch(sources):
+    """
+    Processa as imagens de sources (iterador assíncrono de (nome, bytes)) com
+    até BATCH_CONCURRENCY imagens em andamento, para que o YOLO receba lotes
+    cheios e o pool fique ocupado. Gera os resultados na ordem em que ficam
+    prontos e, no fim, um resumo com a vazão do lote.
+    Levanta ModelUnavailable se o modelo não pôde ser iniciado.
+    """
+    await wait_for_model()
+    
+    # Cada lote é um "cliente" da fila batch: lotes simultâneos são atendidos em rodízio
+    batch_id = f"batch:{next(batch_ids)}"
+    start = time.perf_counter()
+    pending = set()
+    latencies = []
+    totals = {'images': 0, 'errors': 0, 'detections': 0, 'qr_codes': 0}
+    sources = aiter(sources)
+    exhausted = False
+    
+    try:
+        while pending or not exhausted:
+            while not exhausted and len(pending) < BATCH_CONCURRENCY:
+                item = await anext(sources, None)
+                if item is None:
+                    exhausted = True
+                    break
+                pending.add(asyncio.create_task(process_batch_image(batch_id, *item)))
+            if not pending:
+                break
+            
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                result = task.result()
+                totals['images'] += 1
+                if 'error' in result:
+                    totals['errors'] += 1
+                else:
+                    totals['detections'] += len(result['detections'])
+                    totals['qr_codes'] += len(result['qr_codes'])
+                    latencies.append(result['processing_time'])
+                yield result
+    finally:
+        # O cliente desconectou no meio do lote: não processa o resto
+        for task in pending:
+            task.cancel()
+    
+    elapsed = time.perf_counter() - start
+    summary = {
+        **totals,
+        'elapsed_seconds': round(elapsed, 3),
+        'images_per_second': round(totals['images'] / elapsed, 2) if elapsed > 0 else 0.0
+    }
+    if latencies:
+        summary['latency_p50_ms'] = round(statistics.median(latencies) * 1000, 1)
+        summary['latency_p95_ms'] = round((statistics.quantiles(latencies, n=20)[-1] if len(latencies) > 1 else latencies[0]) * 1000, 1)
+    yield {'summary': summary}
+
+# Nível de carga -> (folga sobre o tempo de processamento do cliente,
+# qualidade JPEG, maior lado da imagem). Acima de REALTIME_MAX_SIZE a imagem
+# é reduzida no servidor de qualquer forma
+CAPTURE_LEVELS = {
+    "idle": (1.1, 0.6, REALTIME_MAX_SIZE),
+    "normal": (1.25, 0.5, REALTIME_MAX_SIZE),
+    "busy": (1.75, 0.4, REALTIME_MAX_SIZE),
+    "saturated": (3.0, 0.3, 480),
+}
+
+def inference_pool_pressure():
+    """Ocupação do pool de inferência, de 0 (ocioso) a 1 (limite de quadros pendentes)"""
+    return scheduler.in_use / MAX_PENDING_INFERENCES if MAX_PENDING_INFERENCES else 0.0
+
+def current_capture_hint(sid):
+    """Recomendação de captura para o cliente"""
+    fallback_service = None
+    if not capture_advisor.has_service_time(sid):
+        # Cliente sem quadros processados: usa o tempo recente dos outros clientes
+        fallback_service = stage_metrics.recent_median("total")
+    return capture_advisor.hint(sid, fallback_service)
+
+async def push_capture_hint(sid, hint):
+    """Envia 'capture_hint' se a recomendação mudou desde a última enviada"""
+    if capture_advisor.should_push(sid, hint):
+        await sio.emit('capture_hint', hint, to=sid)
+
+async def emit_detection_results(sid, results):
+    """Envia os resultados de um quadro no formato escolhido pelo cliente (completo ou delta)"""
+    if delta_encoder.is_enabled(sid):
+        await sio.emit('detection_delta', delta_encoder.encode(sid, results), to=sid)
+    else:
+        await sio.emit('detection_results', results, to=sid)
+
+yolo_batcher = YoloBatcher(BATCH_MAX_SIZE, BATCH_WAIT_MS / 1000)
+result_cache = ResultCache(CACHE_SIZE, CACHE_ENTRIES_PER_CLIENT, CACHE_TTL, CACHE_MAX_HAMMING)
+qr_tracker = QrTracker(QR_TRACK_MAX_MISSES, QR_TRACK_RESCAN_FRAMES, describe_qr_code)
+object_tracker = ObjectTracker(TRACK_DETECT_INTERVAL, TRACK_SCENE_CHANGE_HAMMING, TRACK_IOU_THRESHOLD, TRACK_MAX_MISSES)
+delta_encoder = DeltaEncoder(DELTA_KEYFRAME_INTERVAL, DELTA_BOX_TOLERANCE, DELTA_CONFIDENCE_TOLERANCE, TRACK_IOU_THRESHOLD)
+capture_advisor = CaptureAdvisor(
+    CAPTURE_LEVELS, CAPTURE_MIN_INTERVAL_MS, CAPTURE_MAX_INTERVAL_MS, CAPTURE_HINT_PUSH_INTERVAL,
+    CAPTURE_RECOVERY_FRAMES, CAPTURE_DEFAULT_SERVICE_TIME
+)
+
+sessions = SessionRegistry((result_cache, qr_tracker, object_tracker, delta_encoder, capture_advisor), SESSION_IDLE_TIMEOUT, MAX_SESSIONS)
+
+async def sweep_idle_sessions(interval):
+    """
+    Encerra periodicamente as sessões paradas (ex.: app em segundo plano com
+    o socket aberto) e atualiza a estimativa de memória das sessões
+    """
+    while True:
+        sessions.refresh_memory()
+        await asyncio.sleep(interval)
+        for sid in sessions.close_idle():
+            logger.info(f"Sessão {sid} sem atividade há {SESSION_IDLE_TIMEOUT:.0f}s, desconectando")
+            await sio.disconnect(sid)
+
 # --- LÓGICA DO WEBSOCKET ---
 
 # Evento de conexão: é acionado quando um cliente (o app) se conecta.
 @sio.event
 async def connect(sid, environ):
+    _, evicted = sessions.open(sid)
+    if evicted is not None:
+        logger.info(f"Limite de {MAX_SESSIONS} sessões atingido, desconectando o cliente menos ativo {evicted}")
+        await sio.disconnect(evicted)
     print(f"Cliente conectado: {sid}")
 
-# Evento de desconexão
+# Evento de desconexão: libera todo o estado do cliente
 @sio.event
 async def disconnect(sid):
+    sessions.close(sid)
     print(f"Cliente desconectado: {sid}")
 
+# Ativa ou desativa o protocolo delta para o cliente
+@sio.event
+async def set_delta_mode(sid, data=None):
+    """
+    Recebe {"enabled": true|false}. Com o protocolo ativo, os resultados de
+    process_frame chegam em 'detection_delta' e o primeiro é um quadro-chave.
+    """
+    enabled = bool(data.get('enabled', True)) if isinstance(data, dict) else bool(data)
+    sessions.touch(sid)
+    if enabled:
+        delta_encoder.enable(sid)
+    else:
+        delta_encoder.disable(sid)
+    logger.info(f"Protocolo delta {'ativado' if enabled else 'desativado'} para cliente {sid}")
+    return {'enabled': enabled, 'keyframe_interval': DELTA_KEYFRAME_INTERVAL}
+
+# Pede um quadro-chave completo no próximo resultado (ex.: o app perdeu uma mensagem)
+@sio.event
+async def request_keyframe(sid, data=None):
+    delta_encoder.request_keyframe(sid)
+
 # Evento principal: recebe o quadro do cliente
 @sio.event
 async def process_frame(sid, data):
-    # O cliente envia a imagem como uma string Base64.
+    """
+    Coloca o quadro na caixa de entrada do cliente. Se já havia um quadro
+    aguardando, ele é substituído (o cliente recebe 'frame_superseded') e
+    apenas o mais recente é processado quando a inferência anterior terminar.
+    Com {"image": ..., "deadline_ms": N}, o quadro é descartado se não
+    conseguir vaga no pool em N ms ('frame_dropped' com deadline_expired).
+    """
+    global frames_superseded
+    current_time = time.time()
+    session = sessions.touch(sid)
+    # Sem modelo o quadro não teria como ser processado: descarta sem ocupar vaga no pool
+    if server_state == "error":
+        frames_dropped["server_busy"] += 1
+        await sio.emit('frame_dropped', {'reason': 'server_busy', 'timestamp': current_time}, to=sid)
+        return
+    
+    session.frame_seq += 1
+    frame_seq = session.frame_seq
+    deadline = request_deadline(current_time, data.get('deadline_ms') if isinstance(data, dict) else None, FRAME_DEADLINE_MS)
+    
+    superseded = session.pending_frame
+    sessions.set_pending_frame(session, (data, current_time, frame_seq, deadline))
+    # O pedido de vaga do cliente passa a valer para o quadro novo
+    scheduler.set_deadline("frame", sid, deadline)
+    
+    if superseded is not None:
+        frames_superseded += 1
+        frames_dropped["superseded"] += 1
+        logger.info(f"Frame {superseded[2]} do cliente {sid} substituído pelo frame {frame_seq}")
+        await sio.emit('frame_superseded', {
+            'frame_seq': superseded[2],
+            'replaced_by': frame_seq,
+            'timestamp': superseded[1]
+        }, to=sid)
+        # O cliente está enviando mais rápido do que é atendido: pede para desacelerar
+        if ADAPTIVE_CAPTURE:
+            capture_advisor.observe_superseded(sid, inference_pool_pressure())
+            await push_capture_hint(sid, current_capture_hint(sid))
+    
+    # Já existe um worker processando este cliente: ele vai pegar o quadro novo
+    if session.processing:
+        return
+    
+    sessions.set_processing(session, True)
+    try:
+        while session.pending_frame is not None:
+            try:
+                # Espera vaga no pool antes de retirar o quadro, para processar sempre o mais recente
+                async with inference_slot("frame", sid, session.pending_frame[3]):
+                    if session.pending_frame is None:
+                        break
+                    data, received_at, frame_seq, _ = session.pending_frame
+                    sessions.set_pending_frame(session, None)
+                    await handle_frame(sid, data, received_at, frame_seq)
+            except DeadlineExpired:
+                # O quadro ficou velho esperando vaga: é descartado antes da inferência
+                # (a não ser que um quadro novo, ainda no prazo, já o tenha substituído)
+                expired = session.pending_frame
+                if expired is None or expired[3] is None or time.time() < expired[3]:
+                    continue
+                sessions.set_pending_frame(session, None)
+                frames_dropped["deadline_expired"] += 1
+                logger.info(f"Frame {expired[2]} do cliente {sid} descartado: prazo esgotado")
+                await sio.emit('frame_dropped', {
+                    'reason': 'deadline_expired',
+                    'frame_seq': expired[2],
+                    'timestamp': expired[1]
+                }, to=sid)
+    finally:
+        sessions.set_processing(session, False)
+        # O cliente desconectou durante o processamento: o quadro recriou o
+        # estado dele nos rastreamentos e no cache, que é liberado aqui
+        if session.closed:
+            sessions.release(sid)
+
+async def handle_frame(sid, data, received_at, frame_seq):
+    """Processa um quadro do cliente e envia os resultados (chamado com uma vaga do pool reservada)"""
+    # O cliente envia a imagem como anexo binário ou como string Base64.
     # Precisamos decodificá-la para que o OpenCV possa usá-la.
+    global frames_processed, frame_errors
     try:
-        current_time = time.time()
-        
-        # Verificar rate limiting
-        if current_time - client_last_request[sid] < MIN_REQUEST_INTERVAL:
-            logger.info(f"Rate limiting aplicado para cliente {sid}")
-            return
-        
-        client_last_request[sid] = current_time
-        
-        # Gerar hash para cache
-        image_hash = get_image_hash(data)
-        
-        # Verificar cache
-        if image_hash in result_cache:
-            logger.info(f"Cache hit para cliente {sid}")
-            await sio.emit('detection_results', result_cache[image_hash], to=sid)
-            return
-        
         start_time = time.time()
-        logger.info(f"Processando frame para cliente {sid}")
-        
-        # Extrai os dados da imagem da string base64
-        # Verifica se há header (data:image/jpeg;base64,) ou se é apenas base64
-        if "," in data:
-            header, encoded = data.split(",", 1)
-            logger.debug(f"Header encontrado: {header[:50]}...")
-        else:
-            # Se não há vírgula, assume que é apenas a string base64
-            encoded = data
-            logger.debug("Sem header, usando dados direto como base64")
-        
-        img_bytes = base64.b64decode(encoded)
+        logger.info(f"Processando frame {frame_seq} para cliente {sid}")
         
-        # Converte os bytes em um array numpy
-        nparr = np.frombuffer(img_bytes, np.uint8)
+        # Detalhamento por etapa deste quadro (a tarefa de cada cliente tem o seu contexto)
+        timings = {} if FRAME_TIMINGS else None
+        frame_timings.set(timings)
+        # Tempo na caixa de entrada do cliente e esperando vaga no pool
+        queue_wait = max(0.0, start_time - received_at)
+        observe_stage("queue_wait", queue_wait)
         
-        # Decodifica o array numpy em uma imagem OpenCV
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        # Decodificação e inferência rodam no pool, o event loop só faz I/O
+        prepared = await run_blocking(prepare_frame, data)
         
         # Verifica se a imagem foi decodificada corretamente
-        if frame is None:
+        if prepared is None:
             logger.error("Erro: Não foi possível decodificar a imagem")
+            frame_errors += 1
             await sio.emit('detection_error', {'error': 'Não foi possível decodificar a imagem'}, to=sid)
             return
-
-        # Otimizar imagem para tempo real
-        frame = preprocess_image_for_realtime(frame)
-        
-        # Executar detecção YOLO
-        detections = process_yolo_detection(frame)
-        
-        # Decodificar QR codes
-        qr_codes = decode_qr_codes(frame)
         
-        # Buscar informações das linhas de ônibus para cada QR code detectado
-        for qr_code in qr_codes:
-            qr_data = qr_code['data']
-            bus_line_info = get_bus_line_info(qr_data)
-            
-            # Adicionar informações da linha de ônibus às detecções
-            detections.append({
-                'onibusInfo': bus_line_info,
-                'confidence': 1.0,
-                'box': qr_code['bbox']
-            })
+        # Quadros quase idênticos reaproveitam o último resultado do cache
+        analysis = await analyze_frame(sid, *prepared)
+        detections = analysis['detections']
         
         processing_time = time.time() - start_time
         logger.info(f"Frame processado em {processing_time:.2f}s para cliente {sid}")
@@ -423,19 +1889,33 @@ async def process_frame(sid, data):
             logger.warning(f"Processamento lento detectado: {processing_time:.2f}s")
         
         results = {
-            'detections': detections,
+            **analysis,
             'processing_time': processing_time,
-            'timestamp': current_time
+            'timestamp': received_at,
+            'frame_seq': frame_seq
         }
-        
-        # Adicionar ao cache
-        manage_cache(image_hash, results)
+        if timings is not None:
+            results['stage_timings'] = {stage: round(seconds * 1000, 2) for stage, seconds in timings.items()}
+        if ADAPTIVE_CAPTURE:
+            capture_advisor.observe_frame(sid, processing_time, queue_wait, inference_pool_pressure())
+            capture_hint = results['capture_hint'] = current_capture_hint(sid)
         
         # Envia os resultados de volta para o cliente através do WebSocket
-        await sio.emit('detection_results', results, to=sid)
+        emit_start = time.perf_counter()
+        await emit_detection_results(sid, results)
+        observe_stage("emit", time.perf_counter() - emit_start)
+        observe_stage("total", time.time() - start_time)
+        frames_processed += 1
+        if ADAPTIVE_CAPTURE:
+            await push_capture_hint(sid, capture_hint)
         logger.info(f"Resultados enviados para cliente {sid}: {len(detections)} detecções")
     
+    except ModelUnavailable:
+        # O modelo falhou enquanto o quadro esperava o aquecimento
+        frames_dropped["server_busy"] += 1
+        await sio.emit('frame_dropped', {'reason': 'server_busy', 'frame_seq': frame_seq, 'timestamp': received_at}, to=sid)
     except Exception as e:
+        frame_errors += 1
         logger.error(f"Erro ao processar o quadro: {e}")
         await sio.emit('detection_error', {'error': str(e)}, to=sid)
 
@@ -443,56 +1923,52 @@ async def process_frame(sid, data):
 @sio.event
 async def process_qrcode(sid, data):
     """
-    Evento específico para processar QR codes via WebSocket
+    Evento específico para processar QR codes via WebSocket. As leituras têm
+    fila própria no pool, na frente dos quadros completos de process_frame.
     """
     try:
         current_time = time.time()
-        logger.info(f"Processando QR code para cliente {sid}")
+        sessions.touch(sid)
         
-        # Extrai os dados da imagem da string base64
-        if "," in data:
-            header, encoded = data.split(",", 1)
-        else:
-            encoded = data
+        if inference_pool_saturated("qr"):
+            logger.info(f"Pool de inferência saturado, descartando QR code do cliente {sid}")
+            frames_dropped["server_busy"] += 1
+            await sio.emit('frame_dropped', {'reason': 'server_busy', 'timestamp': current_time}, to=sid)
+            return
         
-        img_bytes = base64.b64decode(encoded)
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        frame = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        logger.info(f"Processando QR code para cliente {sid}")
         
-        if frame is None:
+        deadline = request_deadline(current_time, data.get('deadline_ms') if isinstance(data, dict) else None, QR_DEADLINE_MS)
+        try:
+            qr_codes = await run_in_inference_pool(run_qrcode_pipeline, data, lane="qr", sid=sid, deadline=deadline)
+        except DeadlineExpired:
+            logger.info(f"QR code do cliente {sid} descartado: prazo esgotado")
+            frames_dropped["deadline_expired"] += 1
+            await sio.emit('frame_dropped', {'reason': 'deadline_expired', 'timestamp': current_time}, to=sid)
+            return
+        
+        if qr_codes is None:
             await sio.emit('qrcode_error', {'error': 'Não foi possível decodificar a imagem'}, to=sid)
             return
         
-        # Processar QR codes
-        qr_codes = decode_qr_codes(frame)
+        bus_info_results = attach_bus_info(qr_codes)
         
-        if not qr_codes:
+        if not bus_info_results:
             await sio.emit('qrcode_results', {
                 'qr_codes_found': False,
                 'message': 'Nenhum QR code encontrado na imagem'
             }, to=sid)
             return
         
-        # Processar informações das linhas de ônibus
-        bus_info_results = []
-        for qr_code in qr_codes:
-            bus_info = get_bus_line_info(qr_code['data'])
-            bus_info_results.append({
-                'qr_data': qr_code['data'],
-                'bus_info': bus_info,
-                'onibusInfo': bus_info,  # Atributo adicional para facilitar acesso
-                'bbox': qr_code['bbox']
-            })
-        
         results = {
             'qr_codes_found': True,
-            'total_qr_codes': len(qr_codes),
+            'total_qr_codes': len(bus_info_results),
             'results': bus_info_results,
             'timestamp': current_time
         }
         
         await sio.emit('qrcode_results', results, to=sid)
-        logger.info(f"QR codes processados para cliente {sid}: {len(qr_codes)} códigos encontrados")
+        logger.info(f"QR codes processados para cliente {sid}: {len(bus_info_results)} códigos encontrados")
         
     except Exception as e:
         logger.error(f"Erro no processamento de QR code: {e}")
@@ -0,0 +1,161 @@
+import bisect
+import sys
+from collections import deque
+
+# Limites (em segundos) dos buckets dos histogramas de latência por etapa
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+# Amostras recentes guardadas por etapa para os percentis do /metrics
+RECENT_SAMPLES = 1024
+QUANTILES = (0.5, 0.95, 0.99)
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{key}="{escape_label(value)}"' for key, value in labels.items()) + "}"
+
+def format_value(value):
+    if value is None:
+        return "NaN"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+def approx_size(obj, max_depth=8, seen=None):
+    """
+    Tamanho aproximado, em bytes, de um objeto e do que ele referencia
+    (dicts, listas, tuplas, conjuntos, deques e objetos com __slots__).
+    Objetos compartilhados são contados uma vez; arrays do NumPy contam o buffer.
+    Passando o mesmo seen em várias chamadas, o que for compartilhado entre
+    os objetos também só é contado uma vez.
+    """
+    seen = set() if seen is None else seen
+    total = 0
+    stack = [(obj, 0)]
+    while stack:
+        item, depth = stack.pop()
+        if item is None or id(item) in seen:
+            continue
+        seen.add(id(item))
+        total += sys.getsizeof(item)
+        if depth >= max_depth:
+            continue
+        if isinstance(item, dict):
+            children = [*item.keys(), *item.values()]
+        elif isinstance(item, (list, tuple, set, frozenset, deque)):
+            children = item
+        elif hasattr(type(item), "__slots__"):
+            children = [getattr(item, name, None) for name in type(item).__slots__]
+        else:
+            continue
+        stack.extend((child, depth + 1) for child in children)
+    return total
+
+class PrometheusText:
+    """Monta a resposta do /metrics no formato texto do Prometheus (versão 0.0.4)"""
+
+    def __init__(self):
+        self.lines = []
+
+    def header(self, name, kind, help_text):
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def sample(self, name, value, labels=None):
+        self.lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+
+    def gauge(self, name, help_text, value, labels=None):
+        self.header(name, "gauge", help_text)
+        self.sample(name, value, labels)
+
+    def counter(self, name, help_text, value, labels=None):
+        self.header(name, "counter", help_text)
+        self.sample(name, value, labels)
+
+    def render(self):
+        return "\n".join(self.lines) + "\n"
+
+class LatencyHistogram:
+    """
+    Histograma de durações com buckets fixos (agregável entre instâncias no
+    Prometheus) e uma janela das últimas amostras para p50/p95/p99 locais.
+    Registrar uma amostra é uma busca binária e três atualizações.
+    """
+
+    __slots__ = ("buckets", "counts", "sum", "count", "recent")
+
+    def __init__(self, buckets=LATENCY_BUCKETS, window=RECENT_SAMPLES):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # o último é o bucket +Inf
+        self.sum = 0.0
+        self.count = 0
+        self.recent = deque(maxlen=window)
+
+    def observe(self, seconds):
+        self.counts[bisect.bisect_left(self.buckets, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.recent.append(seconds)
+
+    def quantiles(self):
+        samples = sorted(self.recent)
+        if not samples:
+            return {}
+        return {q: samples[min(len(samples) - 1, int(q * len(samples)))] for q in QUANTILES}
+
+class StageMetrics:
+    """
+    Latência de cada etapa do pipeline (decodificação, pré-processamento,
+    YOLO, QR codes, envio...). Desligado, observe retorna na hora.
+    """
+
+    def __init__(self, enabled=True):
+        self.enabled = enabled
+        self.stages = {}
+
+    def observe(self, stage, seconds):
+        if not self.enabled:
+            return
+        histogram = self.stages.get(stage)
+        if histogram is None:
+            histogram = self.stages[stage] = LatencyHistogram()
+        histogram.observe(seconds)
+
+    def observe_many(self, timings):
+        for stage, seconds in timings.items():
+            self.observe(stage, seconds)
+
+    def recent_median(self, stage):
+        """Mediana recente da etapa, em segundos (None sem amostras)"""
+        histogram = self.stages.get(stage)
+        return histogram.quantiles().get(0.5) if histogram is not None else None
+
+    def summary(self):
+        """p50/p95/p99 recentes de cada etapa, em milissegundos"""
+        return {
+            stage: {
+                "count": histogram.count,
+                **{f"p{round(q * 100)}_ms": round(value * 1000, 2) for q, value in histogram.quantiles().items()}
+            }
+            for stage, histogram in sorted(self.stages.items())
+        }
+
+    def write_prometheus(self, out, name, label="stage", help_text="Duração de cada etapa do pipeline, em segundos"):
+        out.header(name, "histogram", help_text)
+        for stage, histogram in sorted(self.stages.items()):
+            cumulative = 0
+            for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                cumulative += count
+                out.sample(f"{name}_bucket", cumulative, {label: stage, "le": format_value(float(bound))})
+            out.sample(f"{name}_sum", histogram.sum, {label: stage})
+            out.sample(f"{name}_count", histogram.count, {label: stage})
+
+        recent_name = f"{name}_recent"
+        out.header(recent_name, "gauge", f"Percentis das últimas {RECENT_SAMPLES} amostras de {name}, em segundos")
+        for stage, histogram in sorted(self.stages.items()):
+            for q, value in histogram.quantiles().items():
+                out.sample(recent_name, value, {label: stage, "quantile": q})
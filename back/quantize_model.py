@@ -0,0 +1,127 @@
+import argparse
+import glob
+import os
+import re
+
+import cv2
+import numpy as np
+import onnx
+from onnxruntime.quantization import (
+    CalibrationDataReader,
+    CalibrationMethod,
+    QuantFormat,
+    QuantType,
+    quantize_static,
+)
+
+IMAGE_EXTENSIONS = ("*.jpg", "*.jpeg", "*.png", "*.bmp")
+INPUT_SIZE = 640
+
+def list_images(folder):
+    """Lista as imagens de uma pasta (jpg, png, bmp), em ordem alfabética"""
+    paths = []
+    for pattern in IMAGE_EXTENSIONS:
+        paths.extend(glob.glob(os.path.join(folder, pattern)))
+        paths.extend(glob.glob(os.path.join(folder, pattern.upper())))
+    return sorted(set(paths))
+
+def letterbox(image, size=INPUT_SIZE):
+    """
+    Prepara o quadro como o ultralytics faz antes da inferência: redimensiona
+    mantendo a proporção, completa com cinza (114) até size x size e converte
+    para tensor RGB float32 NCHW normalizado em [0, 1].
+    """
+    height, width = image.shape[:2]
+    scale = min(size / height, size / width)
+    new_width, new_height = int(round(width * scale)), int(round(height * scale))
+    resized = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_LINEAR)
+
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top = (size - new_height) // 2
+    left = (size - new_width) // 2
+    canvas[top:top + new_height, left:left + new_width] = resized
+
+    tensor = canvas[:, :, ::-1].transpose(2, 0, 1).astype(np.float32) / 255.0
+    return tensor[None]
+
+class FrameCalibrationReader(CalibrationDataReader):
+    """Fornece os quadros da pasta de calibração para a quantização estática"""
+
+    def __init__(self, image_paths, input_name):
+        self.image_paths = image_paths
+        self.input_name = input_name
+        self._iterator = iter(image_paths)
+
+    def get_next(self):
+        for path in self._iterator:
+            image = cv2.imread(path, cv2.IMREAD_COLOR)
+            if image is None:
+                print(f"⚠️ Ignorando imagem ilegível: {path}")
+                continue
+            return {self.input_name: letterbox(image)}
+        return None
+
+    def rewind(self):
+        self._iterator = iter(self.image_paths)
+
+def find_head_nodes_to_exclude(model):
+    """
+    Mantém em float a decodificação das caixas na cabeça Detect (DFL, âncoras,
+    concatenações), que é sensível à quantização. As convoluções da cabeça
+    (cv2/cv3) continuam quantizadas.
+    """
+    module_ids = [int(m.group(1)) for node in model.graph.node if (m := re.match(r"/model\.(\d+)/", node.name))]
+    if not module_ids:
+        return []
+
+    head_prefix = f"/model.{max(module_ids)}/"
+    return [
+        node.name for node in model.graph.node
+        if node.name.startswith(head_prefix) and "/cv2." not in node.name and "/cv3." not in node.name
+    ]
+
+def quantize_int8(fp32_path, int8_path, calibration_dir, max_images=200):
+    """
+    Gera a versão INT8 (quantização estática QDQ) de um modelo ONNX do YOLO,
+    calibrada com os quadros de calibration_dir. Os metadados do ultralytics
+    (nomes das classes, stride, tamanho de entrada) são copiados do modelo FP32.
+    """
+    image_paths = list_images(calibration_dir)[:max_images]
+    if not image_paths:
+        raise ValueError(f"Nenhuma imagem de calibração encontrada em {calibration_dir}")
+
+    fp32_model = onnx.load(fp32_path)
+    input_name = fp32_model.graph.input[0].name
+    print(f"Calibrando com {len(image_paths)} imagens de {calibration_dir}...")
+
+    quantize_static(
+        fp32_path,
+        int8_path,
+        FrameCalibrationReader(image_paths, input_name),
+        quant_format=QuantFormat.QDQ,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        per_channel=True,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=find_head_nodes_to_exclude(fp32_model),
+    )
+
+    int8_model = onnx.load(int8_path)
+    del int8_model.metadata_props[:]
+    int8_model.metadata_props.extend(fp32_model.metadata_props)
+    onnx.save(int8_model, int8_path)
+
+    fp32_size = os.path.getsize(fp32_path) / 1024 / 1024
+    int8_size = os.path.getsize(int8_path) / 1024 / 1024
+    print(f"✓ Modelo INT8 salvo em {int8_path} ({fp32_size:.1f} MB -> {int8_size:.1f} MB)")
+    return int8_path
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Gera o modelo YOLO INT8 calibrado com quadros locais")
+    parser.add_argument("calibration_dir", help="Pasta com quadros representativos (jpg/png)")
+    parser.add_argument("--fp32", default=os.path.join("model_cache", "yolov8n.onnx"), help="Modelo ONNX FP32 de origem")
+    parser.add_argument("--output", default=os.path.join("model_cache", "yolov8n_int8.onnx"), help="Caminho do modelo INT8")
+    parser.add_argument("--max-images", type=int, default=200, help="Máximo de imagens usadas na calibração")
+    args = parser.parse_args()
+
+    quantize_int8(args.fp32, args.output, args.calibration_dir, args.max_images)
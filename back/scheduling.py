@@ -0,0 +1,201 @@
+import asyncio
+import time
+from collections import OrderedDict, deque
+
+from metrics import StageMetrics
+
+class DeadlineExpired(Exception):
+    """O prazo do pedido venceu antes de ele conseguir uma vaga no pool"""
+
+class LaneWaiter:
+    __slots__ = ("future", "sid", "enqueued_at", "deadline", "timer")
+
+    def __init__(self, future, sid, enqueued_at, deadline):
+        self.future = future
+        self.sid = sid
+        self.enqueued_at = enqueued_at
+        self.deadline = deadline
+        self.timer = None  # rejeição agendada para o prazo
+
+class LaneScheduler:
+    """
+    Distribui as vagas do pool de inferência entre filas (lanes) com pesos.
+    Quando uma vaga abre, a fila é escolhida por round-robin ponderado suave
+    entre as que têm pedidos esperando e, dentro dela, os clientes são
+    atendidos em rodízio (um cliente com vários pedidos não passa na frente
+    dos outros). Cada fila pode ocupar no máximo limits[lane] vagas, o que
+    reserva o restante para as outras. Pedidos com prazo vencido são
+    descartados com DeadlineExpired em vez de ocuparem uma vaga, no próprio
+    prazo (mesmo que nenhuma vaga seja liberada até lá).
+    """
+
+    def __init__(self, capacity, weights, limits, max_waiting):
+        self.capacity = capacity
+        # Pedidos esperando antes de recusar, só nas filas que recusam (is_full);
+        # nas demais os pedidos sempre esperam (ou vencem o prazo)
+        self.max_waiting = max_waiting
+        self.in_use = 0
+        self._lanes = {
+            lane: {
+                'weight': weight,
+                'limit': limits.get(lane, capacity),
+                'queues': OrderedDict(),  # sid -> deque de LaneWaiter, em rodízio
+                'waiting': 0,
+                'in_use': 0,
+                'current': 0,  # crédito do round-robin ponderado
+                'admitted': 0,
+                'expired': 0
+            }
+            for lane, weight in weights.items()
+        }
+        self.wait_metrics = StageMetrics()
+
+    def is_full(self, lane):
+        """Indica se a fila não tem vaga livre nem espaço para esperar (sempre False nas filas sem max_waiting)"""
+        state = self._lanes[lane]
+        max_waiting = self.max_waiting.get(lane)
+        return max_waiting is not None and not self._has_slot(state) and state['waiting'] >= max_waiting
+
+    def _has_slot(self, state):
+        return self.in_use < self.capacity and state['in_use'] < state['limit']
+
+    def _grant(self, lane, state, waited):
+        self.in_use += 1
+        state['in_use'] += 1
+        state['admitted'] += 1
+        self.wait_metrics.observe(lane, waited)
+
+    async def acquire(self, lane, sid, deadline=None):
+        state = self._lanes[lane]
+        now = time.time()
+        if deadline is not None and now >= deadline:
+            state['expired'] += 1
+            raise DeadlineExpired()
+        if not state['waiting'] and self._has_slot(state):
+            self._grant(lane, state, 0.0)
+            return
+
+        waiter = LaneWaiter(asyncio.get_running_loop().create_future(), sid, now, deadline)
+        queue = state['queues'].get(sid)
+        if queue is None:
+            queue = state['queues'][sid] = deque()
+        queue.append(waiter)
+        state['waiting'] += 1
+        self._schedule_expiry(lane, waiter)
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled() and waiter.future.exception() is None:
+                # A vaga foi concedida junto com o cancelamento: devolve
+                self.release(lane)
+            else:
+                self._discard(state, waiter)
+            raise
+        finally:
+            if waiter.timer is not None:
+                waiter.timer.cancel()
+
+    def _schedule_expiry(self, lane, waiter):
+        """Agenda a rejeição do pedido para o prazo (ou a remarca, se o prazo mudou)"""
+        if waiter.timer is not None:
+            waiter.timer.cancel()
+            waiter.timer = None
+        if waiter.deadline is not None:
+            loop = waiter.future.get_loop()
+            delay = max(0.0, waiter.deadline - time.time())
+            waiter.timer = loop.call_at(loop.time() + delay, self._expire, lane, waiter)
+
+    def _expire(self, lane, waiter):
+        """Prazo do pedido vencido ainda na fila: sai da fila com DeadlineExpired"""
+        waiter.timer = None
+        if waiter.future.done():
+            return
+        state = self._lanes[lane]
+        self._discard(state, waiter)
+        state['expired'] += 1
+        waiter.future.set_exception(DeadlineExpired())
+
+    def _discard(self, state, waiter):
+        queue = state['queues'].get(waiter.sid)
+        if queue is not None and waiter in queue:
+            queue.remove(waiter)
+            state['waiting'] -= 1
+            if not queue:
+                del state['queues'][waiter.sid]
+
+    def set_deadline(self, lane, sid, deadline):
+        """Atualiza o prazo dos pedidos do cliente (ex.: o quadro esperando foi substituído)"""
+        for waiter in self._lanes[lane]['queues'].get(sid, ()):
+            waiter.deadline = deadline
+            self._schedule_expiry(lane, waiter)
+
+    def release(self, lane):
+        self.in_use -= 1
+        self._lanes[lane]['in_use'] -= 1
+        self._dispatch()
+
+    def _next_waiter(self, state):
+        """Próximo pedido da fila, com os clientes em rodízio"""
+        sid, queue = next(iter(state['queues'].items()))
+        waiter = queue.popleft()
+        state['waiting'] -= 1
+        if queue:
+            state['queues'].move_to_end(sid)
+        else:
+            del state['queues'][sid]
+        return waiter
+
+    def _dispatch(self):
+        while self.in_use < self.capacity:
+            eligible = [(lane, state) for lane, state in self._lanes.items() if state['waiting'] and state['in_use'] < state['limit']]
+            if not eligible:
+                return
+            # Round-robin ponderado suave: cada fila acumula seu peso e a de
+            # maior crédito é atendida, pagando a soma dos pesos
+            for _, state in eligible:
+                state['current'] += state['weight']
+            lane, state = max(eligible, key=lambda item: item[1]['current'])
+            state['current'] -= sum(candidate['weight'] for _, candidate in eligible)
+
+            waiter = self._next_waiter(state)
+            if waiter.future.done():
+                continue
+            now = time.time()
+            if waiter.deadline is not None and now >= waiter.deadline:
+                state['expired'] += 1
+                waiter.future.set_exception(DeadlineExpired())
+                continue
+            self._grant(lane, state, now - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def stats(self):
+        wait = self.wait_metrics.summary()
+        return {
+            "capacity": self.capacity,
+            "in_use": self.in_use,
+            "lanes": {
+                lane: {
+                    "weight": state['weight'],
+                    "slot_limit": state['limit'],
+                    "max_waiting": self.max_waiting.get(lane),
+                    "in_use": state['in_use'],
+                    "waiting": state['waiting'],
+                    "admitted": state['admitted'],
+                    "expired": state['expired'],
+                    "wait": wait.get(lane, {})
+                }
+                for lane, state in self._lanes.items()
+            }
+        }
+
+    def write_prometheus(self, out):
+        for name, key, kind, help_text in (
+            ("visao_lane_in_use", "in_use", "gauge", "Vagas do pool ocupadas por fila"),
+            ("visao_lane_waiting", "waiting", "gauge", "Pedidos esperando vaga no pool, por fila"),
+            ("visao_lane_admitted_total", "admitted", "counter", "Pedidos que receberam vaga no pool, por fila"),
+            ("visao_lane_expired_total", "expired", "counter", "Pedidos descartados com o prazo vencido antes da inferência, por fila")
+        ):
+            out.header(name, kind, help_text)
+            for lane, state in self._lanes.items():
+                out.sample(name, state[key], {"lane": lane})
+        self.wait_metrics.write_prometheus(out, "visao_lane_wait_seconds", label="lane", help_text="Espera por uma vaga no pool de inferência, por fila")
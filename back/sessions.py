@@ -0,0 +1,154 @@
+import time
+from collections import OrderedDict
+
+from metrics import approx_size
+
+class Session:
+    """Estado de um cliente conectado"""
+
+    __slots__ = ("sid", "connected_at", "last_seen", "frame_seq", "pending_frame", "processing", "closed")
+
+    def __init__(self, sid, now):
+        self.sid = sid
+        self.connected_at = now
+        self.last_seen = now  # última mensagem do cliente
+        self.frame_seq = 0
+        self.pending_frame = None  # (dados, recebido_em, seq) do quadro mais recente
+        self.processing = False  # um quadro do cliente está no pool
+        self.closed = False
+
+class SessionRegistry:
+    """
+    Sessões abertas, em ordem de atividade (a menos recente primeiro). Ao
+    encerrar uma sessão, libera também o estado do cliente em cada um dos
+    stores (rastreamentos, cache, protocolo delta, captura adaptativa).
+    Os contadores de atividade são mantidos a cada mudança e a memória é
+    estimada na varredura periódica (refresh_memory), então stats() não
+    percorre as sessões.
+    """
+
+    def __init__(self, stores, idle_timeout, max_sessions):
+        self.stores = stores
+        self.idle_timeout = idle_timeout
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # sid -> Session
+        self.opened = 0
+        self.closed_idle = 0
+        self.closed_full = 0
+        self.processing = 0  # sessões com quadro no pool
+        self.with_pending_frame = 0  # sessões com quadro na caixa de entrada
+        self.approx_bytes = 0
+        self.approx_bytes_at = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def __contains__(self, sid):
+        return sid in self._sessions
+
+    def open(self, sid):
+        """
+        Sessão do cliente, criada se ainda não existir. Devolve também a
+        sessão encerrada para abrir espaço, se o limite foi atingido.
+        """
+        session = self._sessions.get(sid)
+        if session is not None:
+            return session, None
+        evicted = None
+        if len(self._sessions) >= self.max_sessions:
+            evicted = self._least_active()
+            if evicted is not None:
+                self.closed_full += 1
+                self.close(evicted)
+        session = self._sessions[sid] = Session(sid, time.time())
+        self.opened += 1
+        return session, evicted
+
+    def touch(self, sid):
+        """Registra atividade do cliente (abrindo a sessão, se preciso)"""
+        session, _ = self.open(sid)
+        session.last_seen = time.time()
+        self._sessions.move_to_end(sid)
+        return session
+
+    def close(self, sid):
+        """Encerra a sessão e libera todo o estado do cliente"""
+        session = self._sessions.pop(sid, None)
+        if session is not None:
+            session.closed = True
+            self.set_pending_frame(session, None)
+        self.release(sid)
+        return session
+
+    def set_pending_frame(self, session, frame):
+        """Troca o quadro da caixa de entrada da sessão (None esvazia)"""
+        self.with_pending_frame += (frame is not None) - (session.pending_frame is not None)
+        session.pending_frame = frame
+
+    def set_processing(self, session, processing):
+        """Marca se a sessão tem um quadro no pool"""
+        self.processing += processing - session.processing
+        session.processing = processing
+
+    def release(self, sid):
+        for store in self.stores:
+            store.drop_client(sid)
+
+    def _least_active(self):
+        # Sessões com quadro no pool terminam o quadro antes de poderem sair
+        for sid, session in self._sessions.items():
+            if not session.processing:
+                return sid
+        return None
+
+    def idle_sessions(self, now=None):
+        """Sessões sem atividade há mais de idle_timeout segundos"""
+        now = now or time.time()
+        idle = []
+        for sid, session in self._sessions.items():
+            if now - session.last_seen < self.idle_timeout:
+                break
+            if not session.processing:
+                idle.append(sid)
+        return idle
+
+    def close_idle(self, now=None):
+        """Encerra as sessões paradas (ver idle_sessions) e retorna seus sids"""
+        idle = self.idle_sessions(now)
+        for sid in idle:
+            self.closed_idle += 1
+            self.close(sid)
+        return idle
+
+    def refresh_memory(self):
+        """
+        Estima a memória do estado de todas as sessões, em bytes. Percorre
+        tudo, então só roda na varredura periódica. Objetos compartilhados
+        entre sessões (ex.: o onibusInfo de uma linha) são contados uma vez.
+        """
+        seen = set()
+        total = 0
+        for sid, session in list(self._sessions.items()):
+            total += approx_size(session, seen=seen)
+            for store in self.stores:
+                total += approx_size(store.client_state(sid), seen=seen)
+        self.approx_bytes = total
+        self.approx_bytes_at = time.time()
+        return total
+
+    def activity(self):
+        """Sessões com quadro no pool e com quadro aguardando na caixa de entrada"""
+        return {"processing": self.processing, "with_pending_frame": self.with_pending_frame}
+
+    def stats(self):
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "idle_timeout": self.idle_timeout,
+            **self.activity(),
+            "approx_bytes": self.approx_bytes,
+            "approx_bytes_at": self.approx_bytes_at,
+            "opened": self.opened,
+            "closed_idle": self.closed_idle,
+            "closed_full": self.closed_full
+        }
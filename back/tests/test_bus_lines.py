@@ -0,0 +1,55 @@
+import json
+
+from bus_lines import BusLineStore, parse_qr_payload
+
+def test_parse_qr_payload_formats():
+    assert parse_qr_payload("5102") == "5102"
+    assert parse_qr_payload(" 9105-a ") == "9105-A"
+    assert parse_qr_payload('{"linha": "5102"}') == "5102"
+    assert parse_qr_payload('{"numero": 9105}') == "9105"
+    assert parse_qr_payload("https://exemplo.com/onibus?linha=5102") == "5102"
+    assert parse_qr_payload("linha=sc01a") == "SC01A"
+
+def test_parse_qr_payload_rejects_invalid():
+    assert parse_qr_payload("") is None
+    assert parse_qr_payload("não é uma linha!") is None
+    assert parse_qr_payload('{"outra": "5102"}') is None
+
+def test_resolve_qr_payload_is_memoized(tmp_path):
+    store = write_store(tmp_path, ["06:00"])
+    line = store.resolve_qr_payload('{"linha": "5102"}')
+    assert line["nome"] == "Teste"
+    assert store.resolve_qr_payload('{"linha": "5102"}') is line
+    assert (store.qr_memo_hits, store.qr_memo_misses) == (1, 1)
+    # Linha fora da base: informação básica com o número lido
+    assert store.resolve_qr_payload("linha=9999")["numero"] == "9999"
+
+def write_store(tmp_path, departures):
+    path = tmp_path / "linhas.json"
+    path.write_text(json.dumps([{"numero": "5102", "nome": "Teste", "horarios": departures}]))
+    store = BusLineStore(str(path))
+    store.load()
+    return store
+
+def test_next_departures_same_day(tmp_path):
+    store = write_store(tmp_path, ["06:00", "12:30", "18:00"])
+    departures = store.next_departures("5102", now=12 * 60, count=2)
+    assert departures == [{"horario": "12:30", "minutos": 30}, {"horario": "18:00", "minutos": 360}]
+
+def test_next_departures_wraps_to_next_day(tmp_path):
+    store = write_store(tmp_path, ["06:00", "12:30", "23:50"])
+    departures = store.next_departures("5102", now=23 * 60 + 40, count=3)
+    assert departures == [
+        {"horario": "23:50", "minutos": 10},
+        {"horario": "06:00", "minutos": 6 * 60 + 20},
+        {"horario": "12:30", "minutos": 12 * 60 + 50},
+    ]
+
+def test_next_departures_unknown_line_or_empty_schedule(tmp_path):
+    store = write_store(tmp_path, [])
+    assert store.next_departures("5102", now=0) == []
+    assert store.next_departures("9999", now=0) == []
+
+def test_next_departures_stops_after_one_full_day(tmp_path):
+    store = write_store(tmp_path, ["08:00"])
+    assert store.next_departures("5102", now=9 * 60, count=5) == [{"horario": "08:00", "minutos": 23 * 60}]
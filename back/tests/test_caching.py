@@ -0,0 +1,60 @@
+from caching import ResultCache
+
+def test_entries_are_scoped_per_client():
+    cache = ResultCache(100, 8, ttl=60, max_distance=0)
+    cache.put("a", 0b1010, {"detections": ["a"]})
+    assert cache.get("a", 0b1010) == {"detections": ["a"]}
+    assert cache.get("b", 0b1010) is None
+
+    cache.drop_client("a")
+    assert cache.get("a", 0b1010) is None
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 2
+
+def test_lru_eviction_per_client():
+    cache = ResultCache(100, 2, ttl=60, max_distance=0)
+    cache.put("a", 1, "um")
+    cache.put("a", 2, "dois")
+    # Usar a entrada 1 faz da 2 a menos usada
+    assert cache.get("a", 1) == "um"
+    cache.put("a", 4, "quatro")
+    assert cache.get("a", 2) is None
+    assert cache.get("a", 1) == "um"
+    assert cache.get("a", 4) == "quatro"
+    # O limite é por cliente
+    cache.put("b", 2, "dois")
+    assert len(cache) == 3
+    assert cache.stats()["evictions"] == 1
+
+def test_global_limit_evicts_oldest_entry():
+    cache = ResultCache(2, 8, ttl=60, max_distance=0)
+    cache.put("a", 1, "um")
+    cache.put("b", 2, "dois")
+    cache.put("c", 4, "quatro")
+    assert cache.get("a", 1) is None
+    assert len(cache) == 2
+
+def test_ttl_expiry(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("caching.time.time", lambda: now[0])
+    cache = ResultCache(100, 8, ttl=0.5, max_distance=2)
+    cache.put("a", 0, "resultado")
+    now[0] += 0.4
+    assert cache.get("a", 0) == "resultado"
+    now[0] += 0.2
+    assert cache.get("a", 0) is None
+    assert cache.stats()["expirations"] == 1
+    assert len(cache) == 0
+
+def test_hamming_tolerance():
+    tolerant = ResultCache(100, 8, ttl=60, max_distance=2)
+    exact = ResultCache(100, 8, ttl=60, max_distance=0)
+    for cache in (tolerant, exact):
+        cache.put("a", 0xFFFF_0000_0000, "longe")
+        cache.put("a", 0b1111_0000, "perto")
+
+    # 2 bits de diferença de 0b1111_0000: acerta só com tolerância
+    assert tolerant.get("a", 0b1100_0000) == "perto"
+    assert exact.get("a", 0b1100_0000) is None
+    # Acima da tolerância: falta nos dois
+    assert tolerant.get("a", 0b0111_1111) is None
+    assert exact.get("a", 0b1111_0000) == "perto"
@@ -0,0 +1,97 @@
+from capture import CaptureAdvisor
+
+LEVELS = {
+    "idle": (1.1, 0.6, 640),
+    "normal": (1.25, 0.5, 640),
+    "busy": (1.75, 0.4, 640),
+    "saturated": (3.0, 0.3, 480),
+}
+
+def make_advisor(recovery_frames=3):
+    return CaptureAdvisor(LEVELS, 100, 2000, 1.0, recovery_frames, 0.5, smoothing=1.0)
+
+def level(advisor, sid="sid"):
+    return advisor.hint(sid)["level"]
+
+def test_load_level_thresholds():
+    def state(service=0.1, wait=0.0, superseded=0):
+        return {"service": service, "wait": wait, "superseded": superseded}
+
+    assert CaptureAdvisor.load_level(state(), 0.1) == "idle"
+    assert CaptureAdvisor.load_level(state(), 0.3) == "normal"
+    assert CaptureAdvisor.load_level(state(service=None), 0.1) == "normal"
+    assert CaptureAdvisor.load_level(state(), 0.6) == "busy"
+    assert CaptureAdvisor.load_level(state(superseded=1), 0.1) == "busy"
+    assert CaptureAdvisor.load_level(state(wait=0.06), 0.1) == "busy"
+    assert CaptureAdvisor.load_level(state(), 0.9) == "saturated"
+    assert CaptureAdvisor.load_level(state(wait=0.25), 0.1) == "saturated"
+
+def test_level_rises_at_once_and_recovers_after_recovery_frames():
+    advisor = make_advisor(recovery_frames=3)
+    advisor.observe_frame("sid", 0.1, 0.0, 0.95)
+    assert level(advisor) == "saturated"
+
+    # Carga baixa: só desce depois de recovery_frames quadros seguidos
+    advisor.observe_frame("sid", 0.1, 0.0, 0.1)
+    advisor.observe_frame("sid", 0.1, 0.0, 0.1)
+    assert level(advisor) == "saturated"
+    advisor.observe_frame("sid", 0.1, 0.0, 0.1)
+    assert level(advisor) == "idle"
+
+def test_recovery_restarts_when_load_returns():
+    advisor = make_advisor(recovery_frames=2)
+    advisor.observe_frame("sid", 0.1, 0.0, 0.7)
+    assert level(advisor) == "busy"
+    advisor.observe_frame("sid", 0.1, 0.0, 0.1)
+    # Um quadro no mesmo nível zera a contagem
+    advisor.observe_frame("sid", 0.1, 0.0, 0.7)
+    advisor.observe_frame("sid", 0.1, 0.0, 0.1)
+    assert level(advisor) == "busy"
+    advisor.observe_frame("sid", 0.1, 0.0, 0.1)
+    assert level(advisor) == "idle"
+
+def test_superseded_frames_raise_the_level_until_compensated():
+    advisor = make_advisor(recovery_frames=1)
+    advisor.observe_frame("sid", 0.1, 0.0, 0.3)
+    assert level(advisor) == "normal"
+    advisor.observe_superseded("sid", 0.3)
+    advisor.observe_superseded("sid", 0.3)
+    assert level(advisor) == "busy"
+    # Cada quadro processado compensa uma substituição
+    advisor.observe_frame("sid", 0.1, 0.0, 0.3)
+    assert level(advisor) == "busy"
+    advisor.observe_frame("sid", 0.1, 0.0, 0.3)
+    assert level(advisor) == "normal"
+
+def test_hint_values():
+    advisor = make_advisor()
+    # Antes de medições: tempo padrão (ou o fallback) com a folga do nível
+    assert advisor.hint("sid") == {"interval_ms": 625, "max_size": 640, "jpeg_quality": 0.5, "level": "normal"}
+    assert advisor.hint("sid", fallback_service=0.2)["interval_ms"] == 250
+
+    advisor.observe_frame("sid", 0.4, 0.0, 0.95)
+    assert advisor.hint("sid") == {"interval_ms": 1200, "max_size": 480, "jpeg_quality": 0.3, "level": "saturated"}
+    # Limites de intervalo
+    advisor.observe_frame("sid", 5.0, 0.0, 0.95)
+    assert advisor.hint("sid")["interval_ms"] == 2000
+    advisor.observe_frame("other", 0.01, 0.0, 0.1)
+    assert advisor.hint("other")["interval_ms"] == 100
+
+def test_should_push_on_level_or_interval_change(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("capture.time.monotonic", lambda: now[0])
+    advisor = make_advisor()
+    hint = {"interval_ms": 1000, "max_size": 640, "jpeg_quality": 0.5, "level": "normal"}
+    assert advisor.should_push("sid", hint)
+    # Só mudança de nível ou de mais de 25% no intervalo, no máximo uma por push_interval
+    now[0] += 5
+    assert not advisor.should_push("sid", {**hint, "interval_ms": 1200})
+    assert advisor.should_push("sid", {**hint, "interval_ms": 1300})
+    now[0] += 0.5
+    assert not advisor.should_push("sid", {**hint, "level": "busy"})
+    now[0] += 1
+    assert advisor.should_push("sid", {**hint, "level": "busy"})
+    now[0] += 0.1
+    # A piora para "saturated" é enviada na hora
+    assert advisor.should_push("sid", {**hint, "level": "saturated"})
+    assert advisor.stats() == {"clients": 1, "hints_pushed": 4, "clients_by_level": {"saturated": 1}}
@@ -0,0 +1,56 @@
+from delta import DeltaEncoder
+
+def make_encoder(keyframe_interval=3):
+    encoder = DeltaEncoder(keyframe_interval, box_tolerance=2, confidence_tolerance=0.05, iou_threshold=0.3)
+    encoder.enable("sid")
+    return encoder
+
+def person(box, confidence=0.9):
+    return {"label": "person", "box": box, "confidence": confidence}
+
+def test_first_message_is_keyframe():
+    encoder = make_encoder()
+    message = encoder.encode("sid", {"detections": [person([0, 0, 10, 10])], "frame_id": 1})
+    assert message["keyframe"] is True
+    assert message["delta_seq"] == 1
+    assert message["frame_id"] == 1
+    assert message["detections"] == [{"id": "det:1", **person([0, 0, 10, 10])}]
+
+def test_delta_sends_only_changes():
+    encoder = make_encoder()
+    encoder.encode("sid", {"detections": [person([0, 0, 10, 10]), person([100, 100, 120, 130])]})
+
+    # Primeira caixa dentro da tolerância, segunda com confiança alterada, uma nova
+    message = encoder.encode("sid", {"detections": [
+        person([1, 0, 11, 10]),
+        person([100, 100, 120, 130], confidence=0.5),
+        {"label": "car", "box": [300, 300, 400, 380], "confidence": 0.8},
+    ]})
+    assert message["keyframe"] is False
+    assert "detections" not in message
+    assert message["changed"] == [{"id": "det:2", "confidence": 0.5}]
+    assert message["added"] == [{"id": "det:3", "label": "car", "box": [300, 300, 400, 380], "confidence": 0.8}]
+    assert message["removed"] == []
+
+    message = encoder.encode("sid", {"detections": [person([1, 0, 11, 10])]})
+    assert message["keyframe"] is False
+    assert message["removed"] == ["det:2", "det:3"]
+
+    # Depois de keyframe_interval - 1 deltas, volta a enviar o quadro completo
+    message = encoder.encode("sid", {"detections": [person([1, 0, 11, 10])]})
+    assert message["keyframe"] is True
+    assert [detection["id"] for detection in message["detections"]] == ["det:1"]
+
+def test_removed_and_forced_keyframe():
+    encoder = make_encoder(keyframe_interval=10)
+    encoder.encode("sid", {"detections": [{"qr_data": "5102", "label": "qr", "box": [0, 0, 50, 50]}]})
+
+    message = encoder.encode("sid", {"detections": []})
+    assert message["removed"] == ["qr:5102"]
+    assert message["added"] == [] and message["changed"] == []
+
+    encoder.request_keyframe("sid")
+    message = encoder.encode("sid", {"detections": []})
+    assert message["keyframe"] is True
+    assert message["detections"] == []
+    assert encoder.stats() == {"clients": 1, "keyframes_sent": 2, "deltas_sent": 1}
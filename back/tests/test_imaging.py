@@ -0,0 +1,26 @@
+import cv2
+import numpy as np
+
+from imaging import choose_decode_mode, read_jpeg_size
+
+def encode(width, height, ext=".jpg"):
+    ok, buffer = cv2.imencode(ext, np.zeros((height, width, 3), dtype=np.uint8))
+    assert ok
+    return buffer.tobytes()
+
+def test_read_jpeg_size():
+    assert read_jpeg_size(encode(320, 240)) == (320, 240)
+    assert read_jpeg_size(encode(17, 1031)) == (17, 1031)
+
+def test_read_jpeg_size_rejects_other_buffers():
+    assert read_jpeg_size(encode(64, 64, ".png")) is None
+    assert read_jpeg_size(b"") is None
+    # Header cortado antes do marcador SOF
+    assert read_jpeg_size(encode(64, 64)[:20]) is None
+
+def test_choose_decode_mode():
+    assert choose_decode_mode(encode(2000, 1000), 640) == cv2.IMREAD_REDUCED_COLOR_2
+    assert choose_decode_mode(encode(5200, 2000), 640) == cv2.IMREAD_REDUCED_COLOR_8
+    assert choose_decode_mode(encode(1000, 600), 640) == cv2.IMREAD_COLOR
+    assert choose_decode_mode(encode(2000, 1000), None) == cv2.IMREAD_COLOR
+    assert choose_decode_mode(encode(2000, 1000, ".png"), 640) == cv2.IMREAD_COLOR
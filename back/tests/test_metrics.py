@@ -0,0 +1,80 @@
+import re
+
+import pytest
+
+from metrics import LATENCY_BUCKETS, PrometheusText, StageMetrics, format_labels
+
+SAMPLE = re.compile(r'^(?P<name>[a-z_]+)(?:\{(?P<labels>.*)\})? (?P<value>\S+)$')
+
+def parse_samples(text):
+    """Amostras do texto do Prometheus: (nome, rótulos) -> valor"""
+    samples = {}
+    for line in text.splitlines():
+        if line.startswith("#"):
+            continue
+        match = SAMPLE.match(line)
+        assert match, line
+        labels = tuple(re.findall(r'(\w+)="((?:[^"\\]|\\.)*)"', match["labels"] or ""))
+        samples[(match["name"], labels)] = float(match["value"])
+    return samples
+
+def test_histogram_rendering():
+    metrics = StageMetrics()
+    for seconds in (0.0005, 0.001, 0.003, 0.3, 10.0):
+        metrics.observe("yolo", seconds)
+    out = PrometheusText()
+    metrics.write_prometheus(out, "visao_stage_seconds")
+    text = out.render()
+
+    assert "# TYPE visao_stage_seconds histogram" in text.splitlines()
+    samples = parse_samples(text)
+    buckets = {
+        float(labels[1][1]): value
+        for (name, labels), value in samples.items()
+        if name == "visao_stage_seconds_bucket"
+    }
+    assert list(buckets) == [*LATENCY_BUCKETS, float("inf")]
+    # Contagens acumuladas; um valor igual ao limite entra no bucket (le = "menor ou igual")
+    assert buckets[0.001] == 2
+    assert buckets[0.0025] == 2
+    assert buckets[0.005] == 3
+    assert buckets[0.25] == 3
+    assert buckets[0.5] == 4
+    assert buckets[5.0] == 4
+    assert buckets[float("inf")] == 5
+    assert list(buckets.values()) == sorted(buckets.values())
+    assert samples[("visao_stage_seconds_count", (("stage", "yolo"),))] == 5
+    assert samples[("visao_stage_seconds_sum", (("stage", "yolo"),))] == pytest.approx(10.3045)
+    assert samples[("visao_stage_seconds_recent", (("stage", "yolo"), ("quantile", "0.5")))] == 0.003
+    assert 'le="+Inf"' in text
+
+def test_stages_are_rendered_separately():
+    metrics = StageMetrics()
+    metrics.observe_many({"decode": 0.002, "qr": 0.02})
+    metrics.observe("decode", 0.004)
+    out = PrometheusText()
+    metrics.write_prometheus(out, "visao_stage_seconds")
+    samples = parse_samples(out.render())
+    assert samples[("visao_stage_seconds_count", (("stage", "decode"),))] == 2
+    assert samples[("visao_stage_seconds_count", (("stage", "qr"),))] == 1
+    assert samples[("visao_stage_seconds_bucket", (("stage", "qr"), ("le", "0.01")))] == 0
+    assert samples[("visao_stage_seconds_bucket", (("stage", "qr"), ("le", "0.025")))] == 1
+
+def test_disabled_metrics_record_nothing():
+    metrics = StageMetrics(enabled=False)
+    metrics.observe("yolo", 0.1)
+    assert metrics.summary() == {}
+
+def test_counters_gauges_and_label_escaping():
+    out = PrometheusText()
+    out.counter("visao_frames_total", "Quadros", 3, {"reason": 'a"b\\c'})
+    out.gauge("visao_ready", "Pronto", True)
+    assert out.render().splitlines() == [
+        "# HELP visao_frames_total Quadros",
+        "# TYPE visao_frames_total counter",
+        'visao_frames_total{reason="a\\"b\\\\c"} 3',
+        "# HELP visao_ready Pronto",
+        "# TYPE visao_ready gauge",
+        "visao_ready 1",
+    ]
+    assert format_labels(None) == ""
@@ -0,0 +1,114 @@
+import asyncio
+import time
+
+import pytest
+
+from scheduling import DeadlineExpired, LaneScheduler
+
+def test_weighted_round_robin_between_lanes():
+    async def scenario():
+        scheduler = LaneScheduler(1, {"qr": 3, "frame": 1}, {}, {})
+        await scheduler.acquire("frame", "ocupa")
+        order = []
+
+        async def request(lane, sid):
+            await scheduler.acquire(lane, sid)
+            order.append(lane)
+            scheduler.release(lane)
+
+        tasks = [asyncio.create_task(request("qr", f"q{i}")) for i in range(6)]
+        tasks += [asyncio.create_task(request("frame", f"f{i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        scheduler.release("frame")
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["qr", "qr", "frame", "qr", "qr", "qr", "frame", "qr"]
+
+def test_clients_take_turns_within_a_lane():
+    async def scenario():
+        scheduler = LaneScheduler(1, {"frame": 1}, {}, {})
+        await scheduler.acquire("frame", "ocupa")
+        order = []
+
+        async def request(sid):
+            await scheduler.acquire("frame", sid)
+            order.append(sid)
+            scheduler.release("frame")
+
+        tasks = [asyncio.create_task(request(sid)) for sid in ("a", "a", "a", "b")]
+        await asyncio.sleep(0)
+        scheduler.release("frame")
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["a", "b", "a", "a"]
+
+def test_lane_limit_and_max_waiting():
+    async def scenario():
+        scheduler = LaneScheduler(2, {"qr": 1, "frame": 1}, {"frame": 1}, {"qr": 1})
+        await scheduler.acquire("frame", "a")
+        # A fila frame já ocupa seu limite; a segunda vaga fica para o QR
+        assert scheduler.is_full("qr") is False
+        await scheduler.acquire("qr", "b")
+        waiter = asyncio.create_task(scheduler.acquire("qr", "c"))
+        await asyncio.sleep(0)
+        assert scheduler.is_full("qr") is True
+        # Filas sem max_waiting nunca recusam
+        assert scheduler.is_full("frame") is False
+        scheduler.release("qr")
+        await waiter
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["in_use"] == 2
+    assert stats["lanes"]["qr"]["admitted"] == 2
+    assert stats["lanes"]["frame"]["max_waiting"] is None
+
+def test_deadlines_expire():
+    async def scenario():
+        scheduler = LaneScheduler(1, {"frame": 1}, {}, {})
+        with pytest.raises(DeadlineExpired):
+            await scheduler.acquire("frame", "a", deadline=time.time() - 1)
+
+        await scheduler.acquire("frame", "a")
+        late = asyncio.create_task(scheduler.acquire("frame", "b", deadline=time.time() + 0.01))
+        on_time = asyncio.create_task(scheduler.acquire("frame", "c", deadline=time.time() + 10))
+        await asyncio.sleep(0.05)
+        scheduler.release("frame")
+        with pytest.raises(DeadlineExpired):
+            await late
+        await on_time
+        return scheduler.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["lanes"]["frame"]["expired"] == 2
+    assert stats["lanes"]["frame"]["admitted"] == 2
+    assert stats["in_use"] == 1
+
+def test_deadline_expires_while_pool_is_busy():
+    async def scenario():
+        scheduler = LaneScheduler(1, {"frame": 1}, {}, {})
+        await scheduler.acquire("frame", "a")
+        started = time.monotonic()
+        # Nenhuma vaga é liberada: o pedido é rejeitado no próprio prazo
+        with pytest.raises(DeadlineExpired):
+            await scheduler.acquire("frame", "b", deadline=time.time() + 0.05)
+        elapsed = time.monotonic() - started
+
+        # Um prazo remarcado (quadro substituído) vale no lugar do anterior
+        waiter = asyncio.create_task(scheduler.acquire("frame", "c", deadline=time.time() + 0.05))
+        await asyncio.sleep(0)
+        scheduler.set_deadline("frame", "c", time.time() + 10)
+        await asyncio.sleep(0.1)
+        assert not waiter.done()
+        scheduler.set_deadline("frame", "c", time.time())
+        with pytest.raises(DeadlineExpired):
+            await waiter
+        return elapsed, scheduler.stats()
+
+    elapsed, stats = asyncio.run(scenario())
+    assert elapsed < 0.5
+    assert stats["lanes"]["frame"]["expired"] == 2
+    assert stats["lanes"]["frame"]["waiting"] == 0
+    assert stats["in_use"] == 1
@@ -0,0 +1,119 @@
+from caching import ResultCache
+from capture import CaptureAdvisor
+from sessions import SessionRegistry
+from tracking import ObjectTracker, QrTracker
+
+LEVELS = {
+    "idle": (1.1, 0.6, 640),
+    "normal": (1.25, 0.5, 640),
+    "busy": (1.75, 0.4, 640),
+    "saturated": (3.0, 0.3, 480),
+}
+
+def make_registry(idle_timeout=30, max_sessions=3):
+    stores = (
+        ResultCache(100, 8, 60, 0),
+        QrTracker(3, 10, lambda data: {}),
+        ObjectTracker(5, 10, 0.3, 2),
+        CaptureAdvisor(LEVELS, 100, 2000, 1.0, 5, 0.5),
+    )
+    return SessionRegistry(stores, idle_timeout, max_sessions), stores
+
+def test_open_touch_close():
+    registry, _ = make_registry()
+    session, evicted = registry.open("a")
+    assert evicted is None and "a" in registry
+    assert registry.open("a") == (session, None)
+    assert registry.touch("a") is session
+    assert registry.stats()["opened"] == 1
+
+    assert registry.close("a") is session
+    assert session.closed and "a" not in registry
+    assert registry.close("a") is None
+
+def test_open_evicts_least_active_when_full():
+    registry, _ = make_registry(max_sessions=2)
+    registry.open("a")
+    registry.open("b")
+    registry.touch("a")
+    _, evicted = registry.open("c")
+    assert evicted == "b"
+    assert list(registry._sessions) == ["a", "c"]
+
+    # Sessões com quadro no pool não são escolhidas
+    registry.set_processing(registry.touch("a"), True)
+    registry.touch("c")
+    _, evicted = registry.open("d")
+    assert evicted == "c"
+    assert registry.stats()["closed_full"] == 2
+
+def test_idle_sessions(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("sessions.time.time", lambda: now[0])
+    registry, _ = make_registry(idle_timeout=30)
+    registry.open("a")
+    registry.open("b")
+    registry.open("c")
+    now[0] += 20
+    registry.touch("b")
+    registry.set_processing(registry._sessions["c"], True)
+
+    now[0] += 15
+    # "b" teve atividade recente e "c" está com um quadro no pool
+    assert registry.idle_sessions() == ["a"]
+    now[0] += 20
+    assert registry.idle_sessions() == ["a", "b"]
+
+def test_close_idle_evicts_stale_sessions(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("sessions.time.time", lambda: now[0])
+    registry, (cache, *_) = make_registry(idle_timeout=30)
+    registry.open("a")
+    registry.open("b")
+    cache.put("a", 1, {"detections": []})
+    now[0] += 20
+    registry.touch("b")
+    now[0] += 15
+
+    assert registry.close_idle() == ["a"]
+    assert "a" not in registry and "b" in registry
+    assert len(cache) == 0
+    assert registry.close_idle() == []
+    assert registry.close_idle(now[0] + 30) == ["b"]
+    assert len(registry) == 0
+    assert registry.stats()["closed_idle"] == 2
+
+def test_activity_counters():
+    registry, _ = make_registry()
+    a, _ = registry.open("a")
+    b, _ = registry.open("b")
+    registry.set_pending_frame(a, b"quadro")
+    registry.set_pending_frame(a, b"outro")
+    registry.set_pending_frame(b, b"quadro")
+    registry.set_processing(a, True)
+    registry.set_processing(a, True)
+    assert registry.activity() == {"processing": 1, "with_pending_frame": 2}
+
+    registry.set_pending_frame(a, None)
+    registry.set_processing(a, False)
+    assert registry.activity() == {"processing": 0, "with_pending_frame": 1}
+    # Encerrar a sessão esvazia a caixa de entrada
+    registry.close("b")
+    assert registry.activity() == {"processing": 0, "with_pending_frame": 0}
+
+def test_close_releases_client_state():
+    registry, (cache, qr_tracker, object_tracker, capture_advisor) = make_registry()
+    registry.open("a")
+    registry.open("b")
+    for sid in ("a", "b"):
+        cache.put(sid, 1, {"detections": []})
+        qr_tracker.update(sid, [{"data": "5102", "bbox": [0, 0, 10, 10], "confidence": 1.0}], "full")
+        object_tracker.update_detections(sid, [{"label": "person", "confidence": 0.9, "box": [0, 0, 10, 10]}], 0, None)
+        capture_advisor.observe_frame(sid, 0.1, 0.0, 0.0)
+
+    assert registry.refresh_memory() > 0
+    registry.close("a")
+    for store in (cache, qr_tracker, object_tracker, capture_advisor):
+        assert not store.client_state("a")
+        assert store.client_state("b")
+    assert len(cache) == 1
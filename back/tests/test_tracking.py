@@ -0,0 +1,131 @@
+import cv2
+import numpy as np
+
+from tracking import ObjectTracker, QrTracker, propagate_boxes
+
+def textured_frame(seed=3, size=(240, 320)):
+    """Quadro com textura (cantos para o fluxo óptico) e uma faixa lisa à direita"""
+    rng = np.random.default_rng(seed)
+    frame = cv2.GaussianBlur(rng.integers(0, 256, size, dtype=np.uint8), (5, 5), 0)
+    frame[:, 260:] = 128
+    return frame
+
+def make_tracker(detect_interval=3):
+    return ObjectTracker(detect_interval, scene_change_distance=10, iou_threshold=0.3, max_misses=1)
+
+def person(box):
+    return {"label": "person", "confidence": 0.9, "box": box}
+
+def test_update_detections_keeps_track_ids():
+    tracker = make_tracker()
+    results, lost = tracker.update_detections("sid", [person([0, 0, 50, 100]), person([200, 0, 250, 100])], 0, None)
+    assert [(result["track_id"], result["tracked"]) for result in results] == [(1, False), (2, False)]
+    assert lost == []
+
+    # Mesma classe e caixa próxima: mesmo track_id; classe diferente: objeto novo
+    results, lost = tracker.update_detections("sid", [
+        person([5, 0, 55, 100]),
+        {"label": "car", "confidence": 0.8, "box": [200, 0, 250, 100]},
+    ], 0, None)
+    assert [(result["track_id"], result["tracked"]) for result in results] == [(1, True), (3, False)]
+    assert lost == []
+
+    # Um objeto some quando passa de max_misses detecções sem ser visto
+    results, lost = tracker.update_detections("sid", [person([5, 0, 55, 100])], 0, None)
+    assert lost == [2]
+    assert tracker.stats()["objects_tracked"] == 2
+    results, lost = tracker.update_detections("sid", [person([5, 0, 55, 100])], 0, None)
+    assert lost == [3]
+
+def test_needs_detection_interval_and_scene_change():
+    tracker = make_tracker(detect_interval=3)
+    assert tracker.needs_detection("sid", 0)
+    tracker.update_detections("sid", [person([0, 0, 50, 100])], 0, textured_frame())
+    assert not tracker.needs_detection("sid", 0)
+
+    tracker.update_propagated("sid", {1: [2, 0, 52, 100]}, textured_frame())
+    assert not tracker.needs_detection("sid", 0)
+    tracker.update_propagated("sid", {1: [4, 0, 54, 100]}, textured_frame())
+    # Depois de detect_interval - 1 quadros rastreados, o YOLO volta a rodar
+    assert tracker.needs_detection("sid", 0)
+
+    tracker.update_detections("sid", [person([4, 0, 54, 100])], 0, textured_frame())
+    assert not tracker.needs_detection("sid", 0b111)
+    assert tracker.needs_detection("sid", (1 << 11) - 1)
+    assert tracker.stats()["scene_changes"] == 1
+
+def test_needs_detection_when_motion_is_lost():
+    tracker = make_tracker(detect_interval=10)
+    tracker.update_detections("sid", [person([0, 0, 50, 100]), person([200, 0, 250, 100])], 0, textured_frame())
+    results, _ = tracker.update_propagated("sid", {1: [2, 0, 52, 100], 2: None}, textured_frame())
+    assert [result["track_id"] for result in results] == [1]
+    assert tracker.needs_detection("sid", 0)
+
+def test_propagate_boxes_follows_motion():
+    prev_gray = textured_frame()
+    gray = np.roll(prev_gray, (3, 5), axis=(0, 1))
+    propagated = propagate_boxes(prev_gray, gray, {1: [100, 80, 160, 140], 2: [270, 80, 310, 140]}, 1.0)
+    assert np.allclose(propagated[1], [105, 83, 165, 143], atol=1)
+    # Região lisa, sem pontos para seguir
+    assert propagated[2] is None
+
+def test_propagate_boxes_scales_back_to_frame_coordinates():
+    prev_gray = textured_frame()
+    gray = np.roll(prev_gray, (3, 5), axis=(0, 1))
+    # Quadros de fluxo reduzidos pela metade; caixas e deslocamento no quadro original
+    propagated = propagate_boxes(prev_gray, gray, {1: [200, 160, 320, 280]}, 0.5)
+    assert np.allclose(propagated[1], [210, 166, 330, 286], atol=2)
+
+def make_qr_tracker(max_misses=2, rescan_frames=3):
+    return QrTracker(max_misses, rescan_frames, lambda data: {"onibusInfo": {"numero": data}})
+
+def qr(data, bbox=(0, 0, 40, 40)):
+    return {"data": data, "bbox": list(bbox), "confidence": 1.0}
+
+def test_qr_tracker_reports_appeared_and_lost_codes():
+    tracker = make_qr_tracker(max_misses=2)
+    detections, lost = tracker.update("sid", [qr("5102")], "full")
+    assert detections == [{
+        "qr_data": "5102", "confidence": 1.0, "box": [0, 0, 40, 40], "tracked": False,
+        "onibusInfo": {"numero": "5102"}
+    }]
+    assert lost == []
+
+    # Já anunciado: sem os campos de describe_code
+    detections, lost = tracker.update("sid", [qr("5102", (2, 0, 42, 40))], "tracked")
+    assert detections == [{"qr_data": "5102", "confidence": 1.0, "box": [2, 0, 42, 40], "tracked": True}]
+    assert tracker.tracked_boxes("sid") == {"5102": [2, 0, 42, 40]}
+
+    # Uma falha não basta; some na max_misses-ésima seguida
+    assert tracker.update("sid", [], "tracked") == ([], [])
+    assert tracker.update("sid", [], "tracked") == ([], ["5102"])
+    assert tracker.client_state("sid") is None
+    assert tracker.stats() == {"clients": 0, "codes_tracked": 0, "codes_appeared": 1, "codes_lost": 1}
+
+    # Ao voltar, aparece de novo com as informações completas
+    detections, _ = tracker.update("sid", [qr("5102")], "full")
+    assert detections[0]["tracked"] is False and "onibusInfo" in detections[0]
+
+def test_qr_tracker_misses_reset_when_code_is_read_again():
+    tracker = make_qr_tracker(max_misses=2)
+    tracker.update("sid", [qr("5102"), qr("9105")], "full")
+    assert tracker.update("sid", [qr("5102")], "tracked")[1] == []
+    assert tracker.update("sid", [qr("5102"), qr("9105")], "tracked")[1] == []
+    assert tracker.update("sid", [qr("5102")], "tracked")[1] == []
+    assert tracker.update("sid", [qr("5102")], "tracked")[1] == ["9105"]
+
+def test_qr_tracker_forces_full_scan():
+    tracker = make_qr_tracker(rescan_frames=3)
+    assert not tracker.needs_full_scan("sid")
+    tracker.update("sid", [qr("5102")], "full")
+    for _ in range(2):
+        tracker.update("sid", [qr("5102")], "tracked")
+        assert not tracker.needs_full_scan("sid")
+    # Resultados do cache também contam como quadros sem varredura completa
+    tracker.update("sid", [qr("5102")], "cached")
+    assert tracker.needs_full_scan("sid")
+
+    tracker.update("sid", [qr("5102")], "roi")
+    assert not tracker.needs_full_scan("sid")
+    tracker.drop_client("sid")
+    assert tracker.client_state("sid") is None and not tracker.needs_full_scan("sid")
@@ -0,0 +1,314 @@
+from collections import defaultdict
+
+import cv2
+import numpy as np
+
+class QrTracker:
+    """
+    Acompanha os QR codes vistos por cada cliente nos últimos quadros (dados,
+    última caixa e quadros seguidos sem vê-lo). Um código aparece quando é
+    lido pela primeira vez e some depois de max_misses quadros sem ser lido.
+    describe_code(dados) devolve os campos extras da detecção de um código
+    que acabou de aparecer (ex.: informações da linha de ônibus).
+    """
+    
+    def __init__(self, max_misses, rescan_frames, describe_code):
+        self.max_misses = max_misses
+        self.rescan_frames = rescan_frames
+        self.describe_code = describe_code
+        self._clients = defaultdict(dict)  # sid -> {dados: {'box', 'misses'}}
+        self._frames_since_scan = defaultdict(int)  # sid -> quadros desde a última varredura completa
+        self.codes_appeared = 0
+        self.codes_lost = 0
+    
+    def tracked_boxes(self, sid):
+        """Últimas caixas dos códigos rastreados do cliente (dados -> caixa)"""
+        return {data: track['box'] for data, track in self._clients.get(sid, {}).items()}
+    
+    def needs_full_scan(self, sid):
+        """Indica se o próximo quadro do cliente deve ser varrido por inteiro"""
+        return self._frames_since_scan[sid] >= self.rescan_frames
+    
+    def update(self, sid, qr_codes, scan_mode):
+        """
+        Atualiza os códigos do cliente com os lidos no quadro. Retorna as
+        detecções de QR (com os campos de describe_code só para os códigos
+        que apareceram) e a lista dos dados dos códigos que sumiram.
+        """
+        if scan_mode in ("tracked", "cached"):
+            self._frames_since_scan[sid] += 1
+        else:
+            self._frames_since_scan[sid] = 0
+        
+        tracks = self._clients[sid]
+        detections = []
+        for qr_code in qr_codes:
+            data = qr_code['data']
+            is_new = data not in tracks
+            tracks[data] = {'box': qr_code['bbox'], 'misses': 0}
+            
+            detection = {
+                'qr_data': data,
+                'confidence': qr_code['confidence'],
+                'box': qr_code['bbox'],
+                'tracked': not is_new
+            }
+            if is_new:
+                self.codes_appeared += 1
+                detection.update(self.describe_code(data))
+            detections.append(detection)
+        
+        lost = []
+        seen_data = {qr_code['data'] for qr_code in qr_codes}
+        for data in list(tracks):
+            if data in seen_data:
+                continue
+            tracks[data]['misses'] += 1
+            if tracks[data]['misses'] >= self.max_misses:
+                del tracks[data]
+                lost.append(data)
+        
+        self.codes_lost += len(lost)
+        if not tracks:
+            self._clients.pop(sid, None)
+        return detections, lost
+    
+    def drop_client(self, sid):
+        self._clients.pop(sid, None)
+        self._frames_since_scan.pop(sid, None)
+    
+    def client_state(self, sid):
+        return self._clients.get(sid)
+    
+    def stats(self):
+        return {
+            "clients": len(self._clients),
+            "codes_tracked": sum(len(tracks) for tracks in self._clients.values()),
+            "codes_appeared": self.codes_appeared,
+            "codes_lost": self.codes_lost
+        }
+
+def propagate_boxes(prev_gray, gray, boxes, scale):
+    """
+    Propaga as caixas do quadro anterior para o atual por fluxo óptico
+    (Lucas-Kanade piramidal), no estilo do median flow: pontos de canto de
+    cada caixa são seguidos nos dois sentidos, os pontos inconsistentes são
+    descartados e a caixa é movida pela mediana dos deslocamentos e
+    redimensionada pela mediana da variação das distâncias entre os pontos.
+    boxes: id -> [x1, y1, x2, y2] em coordenadas do quadro original; scale é a
+    redução aplicada em prev_gray/gray. Retorna id -> caixa, ou None se o
+    objeto não pôde ser seguido.
+    """
+    height, width = gray.shape[:2]
+    points, owners = [], []
+    for track_id, box in boxes.items():
+        x1, y1, x2, y2 = (np.array(box, dtype=np.float32) * scale).astype(int)
+        x1, y1 = max(0, x1), max(0, y1)
+        x2, y2 = min(width, x2), min(height, y2)
+        if x2 - x1 < 4 or y2 - y1 < 4:
+            continue
+        corners = cv2.goodFeaturesToTrack(prev_gray[y1:y2, x1:x2], maxCorners=30, qualityLevel=0.01, minDistance=3)
+        if corners is None:
+            continue
+        points.append(corners.reshape(-1, 2) + (x1, y1))
+        owners.extend([track_id] * len(corners))
+    
+    propagated = dict.fromkeys(boxes)
+    if not points:
+        return propagated
+    
+    points = np.concatenate(points).astype(np.float32)
+    owners = np.array(owners)
+    lk_params = dict(winSize=(15, 15), maxLevel=2)
+    forward, status, _ = cv2.calcOpticalFlowPyrLK(prev_gray, gray, points, None, **lk_params)
+    backward, back_status, _ = cv2.calcOpticalFlowPyrLK(gray, prev_gray, forward, None, **lk_params)
+    valid = (status.ravel() == 1) & (back_status.ravel() == 1) & (np.linalg.norm(points - backward, axis=1) < 1.0)
+    
+    for track_id, box in boxes.items():
+        mask = valid & (owners == track_id)
+        if mask.sum() < 4:
+            continue
+        before, after = points[mask], forward[mask]
+        shift = np.median(after - before, axis=0) / scale
+        
+        # Variação de escala: razão mediana das distâncias ao centro dos pontos
+        spread_before = np.linalg.norm(before - before.mean(axis=0), axis=1)
+        spread_after = np.linalg.norm(after - after.mean(axis=0), axis=1)
+        ratios = spread_after[spread_before > 1] / spread_before[spread_before > 1]
+        box_scale = float(np.median(ratios)) if len(ratios) else 1.0
+        
+        center_x = (box[0] + box[2]) / 2 + shift[0]
+        center_y = (box[1] + box[3]) / 2 + shift[1]
+        half_width = (box[2] - box[0]) * box_scale / 2
+        half_height = (box[3] - box[1]) * box_scale / 2
+        propagated[track_id] = [
+            int(center_x - half_width), int(center_y - half_height),
+            int(center_x + half_width), int(center_y + half_height)
+        ]
+    return propagated
+
+def box_iou(box_a, box_b):
+    """IoU entre duas caixas [x1, y1, x2, y2]"""
+    inter_width = min(box_a[2], box_b[2]) - max(box_a[0], box_b[0])
+    inter_height = min(box_a[3], box_b[3]) - max(box_a[1], box_b[1])
+    if inter_width <= 0 or inter_height <= 0:
+        return 0.0
+    intersection = inter_width * inter_height
+    area_a = (box_a[2] - box_a[0]) * (box_a[3] - box_a[1])
+    area_b = (box_b[2] - box_b[0]) * (box_b[3] - box_b[1])
+    return intersection / (area_a + area_b - intersection)
+
+class ObjectTracker:
+    """
+    Rastreia os objetos detectados pelo YOLO nos quadros de cada cliente.
+    Nos quadros de detecção, as detecções são associadas aos objetos
+    rastreados por IoU (mesma classe, associação gulosa), no estilo do
+    ByteTrack; nos demais, as caixas são propagadas por fluxo óptico. Cada
+    objeto recebe um track_id estável para o cliente.
+    """
+    
+    def __init__(self, detect_interval, scene_change_distance, iou_threshold, max_misses):
+        self.detect_interval = detect_interval
+        self.scene_change_distance = scene_change_distance
+        self.iou_threshold = iou_threshold
+        self.max_misses = max_misses
+        self._clients = {}
+        self.detection_frames = 0
+        self.tracked_frames = 0
+        self.scene_changes = 0
+    
+    def _client(self, sid):
+        return self._clients.setdefault(sid, {
+            'tracks': {},  # track_id -> {'label', 'confidence', 'box', 'misses'}
+            'next_id': 1,
+            'frames_since_detection': 0,
+            'keyframe_hash': None,
+            'prev_gray': None,
+            'force_detection': True
+        })
+    
+    def needs_detection(self, sid, frame_hash):
+        """Indica se o YOLO deve rodar neste quadro (intervalo, mudança de cena ou objeto perdido)"""
+        state = self._client(sid)
+        if state['force_detection'] or state['prev_gray'] is None:
+            return True
+        if state['frames_since_detection'] + 1 >= self.detect_interval:
+            return True
+        if (state['keyframe_hash'] ^ frame_hash).bit_count() > self.scene_change_distance:
+            self.scene_changes += 1
+            return True
+        return False
+    
+    def flow_state(self, sid):
+        """Quadro anterior e caixas dos objetos visíveis, para propagate_boxes"""
+        state = self._client(sid)
+        boxes = {track_id: track['box'] for track_id, track in state['tracks'].items() if track['misses'] == 0}
+        return state['prev_gray'], boxes
+    
+    def update_detections(self, sid, detections, frame_hash, flow_gray):
+        """
+        Associa as detecções do YOLO aos objetos rastreados. Retorna as
+        detecções com track_id e tracked (False para objetos novos) e os
+        track_ids dos objetos que sumiram.
+        """
+        self.detection_frames += 1
+        state = self._client(sid)
+        tracks = state['tracks']
+        
+        pairs = sorted(
+            (
+                (box_iou(track['box'], detection['box']), track_id, index)
+                for track_id, track in tracks.items()
+                for index, detection in enumerate(detections)
+                if track['label'] == detection['label']
+            ),
+            reverse=True
+        )
+        matched_tracks, matched_detections = {}, {}
+        for iou, track_id, index in pairs:
+            if iou < self.iou_threshold:
+                break
+            if track_id in matched_tracks or index in matched_detections:
+                continue
+            matched_tracks[track_id] = index
+            matched_detections[index] = track_id
+        
+        results = []
+        for index, detection in enumerate(detections):
+            track_id = matched_detections.get(index)
+            is_new = track_id is None
+            if is_new:
+                track_id = state['next_id']
+                state['next_id'] += 1
+            tracks[track_id] = {
+                'label': detection['label'],
+                'confidence': detection['confidence'],
+                'box': detection['box'],
+                'misses': 0
+            }
+            results.append({**detection, 'track_id': track_id, 'tracked': not is_new})
+        
+        lost = []
+        seen_ids = {result['track_id'] for result in results}
+        for track_id in list(tracks):
+            if track_id in seen_ids:
+                continue
+            tracks[track_id]['misses'] += 1
+            if tracks[track_id]['misses'] > self.max_misses:
+                del tracks[track_id]
+                lost.append(track_id)
+        
+        state.update(
+            frames_since_detection=0,
+            keyframe_hash=frame_hash,
+            prev_gray=flow_gray,
+            force_detection=False
+        )
+        return results, lost
+    
+    def update_propagated(self, sid, propagated, flow_gray):
+        """
+        Atualiza as caixas com o resultado de propagate_boxes. Objetos que
+        não puderam ser seguidos deixam de ser enviados e forçam uma
+        detecção no próximo quadro.
+        """
+        self.tracked_frames += 1
+        state = self._client(sid)
+        tracks = state['tracks']
+        
+        results = []
+        for track_id, box in propagated.items():
+            track = tracks.get(track_id)
+            if track is None:
+                continue
+            if box is None:
+                track['misses'] += 1
+                state['force_detection'] = True
+                continue
+            track['box'] = box
+            results.append({
+                'label': track['label'],
+                'confidence': track['confidence'],
+                'box': box,
+                'track_id': track_id,
+                'tracked': True
+            })
+        
+        state['frames_since_detection'] += 1
+        state['prev_gray'] = flow_gray
+        return results, []
+    
+    def drop_client(self, sid):
+        self._clients.pop(sid, None)
+    
+    def client_state(self, sid):
+        return self._clients.get(sid)
+    
+    def stats(self):
+        return {
+            "clients": len(self._clients),
+            "objects_tracked": sum(len(state['tracks']) for state in self._clients.values()),
+            "detection_frames": self.detection_frames,
+            "tracked_frames": self.tracked_frames,
+            "scene_changes": self.scene_changes
+        }